@@ -1,321 +1,421 @@
-"""
-Advanced Pose & Knee Detection for ZenMed
-Integrates trained YOLO model for real-time keypoint detection
-"""
-
-import cv2
-import numpy as np
-from ultralytics import YOLO
-import os
-
-# Load trained model
-MODEL_PATH = os.path.join(os.path.dirname(__file__), "poster-", "best.pt")
-
-try:
-    pose_model = YOLO(MODEL_PATH)
-    print(f"✓ Pose model loaded: {MODEL_PATH}")
-except Exception as e:
-    print(f"✗ Error loading pose model: {e}")
-    pose_model = None
-
-# COCO Keypoint Indices (YOLOv8 Pose)
-KEYPOINTS = {
-    0: "Nose", 1: "Left Eye", 2: "Right Eye",
-    3: "Left Ear", 4: "Right Ear",
-    5: "Left Shoulder", 6: "Right Shoulder",
-    7: "Left Elbow", 8: "Right Elbow",
-    9: "Left Wrist", 10: "Right Wrist",
-    11: "Left Hip", 12: "Right Hip",
-    13: "Left Knee", 14: "Right Knee",  # KEY POINTS FOR LEG DETECTION
-    15: "Left Ankle", 16: "Right Ankle"
-}
-
-SKELETON = [
-    (0, 1), (0, 2), (1, 3), (2, 4),
-    (5, 6), (5, 7), (7, 9), (6, 8), (8, 10),
-    (5, 11), (6, 12),
-    (11, 13), (13, 15),  # Left leg
-    (12, 14), (14, 16)   # Right leg
-]
-
-def calculate_angle(point_a, point_b, point_c):
-    """
-    Calculate angle between three points
-    Used for pose quality assessment
-    """
-    try:
-        a = np.array(point_a[:2])
-        b = np.array(point_b[:2])
-        c = np.array(point_c[:2])
-        
-        ba = a - b
-        bc = c - b
-        
-        cosine = np.dot(ba, bc) / (np.linalg.norm(ba) * np.linalg.norm(bc) + 1e-6)
-        angle = np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
-        return angle
-    except:
-        return 0
-
-def detect_knees_and_pose(frame):
-    """
-    Detect knees and full pose from frame
-    Returns: annotated frame, keypoints, pose quality score
-    """
-    if pose_model is None or frame is None:
-        return frame, None, 0
-    
-    try:
-        # Run YOLO inference
-        results = pose_model(frame, conf=0.5, verbose=False)
-        
-        if not results or len(results) == 0:
-            return frame, None, 0
-        
-        result = results[0]
-        annotated_frame = result.plot()
-        
-        # Extract keypoints
-        if result.keypoints is None or len(result.keypoints.xy) == 0:
-            return annotated_frame, None, 0
-        
-        keypoints = result.keypoints.xy[0].cpu().numpy()
-        keypoints_conf = result.keypoints.conf[0].cpu().numpy() if result.keypoints.conf is not None else None
-        
-        # Calculate pose quality
-        pose_quality = calculate_pose_quality(keypoints, keypoints_conf)
-        
-        return annotated_frame, keypoints, pose_quality
-        
-    except Exception as e:
-        print(f"Error in detection: {e}")
-        return frame, None, 0
-
-def calculate_pose_quality(keypoints, confidences=None):
-    """
-    Calculate overall pose quality (0-100)
-    Based on keypoint confidence and anatomical plausibility
-    """
-    if keypoints is None or len(keypoints) == 0:
-        return 0
-    
-    # Count valid keypoints (with confidence > 0.5)
-    valid_count = 0
-    if confidences is not None:
-        valid_count = np.sum(confidences > 0.5)
-    else:
-        valid_count = np.sum(np.linalg.norm(keypoints, axis=1) > 0)
-    
-    # Base score on visible keypoints
-    base_score = (valid_count / len(keypoints)) * 100
-    
-    # Bonus for having both knees visible (leg detection)
-    left_knee = keypoints[13]
-    right_knee = keypoints[14]
-    
-    if confidences is not None:
-        left_knee_conf = confidences[13]
-        right_knee_conf = confidences[14]
-    else:
-        left_knee_conf = np.linalg.norm(left_knee) > 0
-        right_knee_conf = np.linalg.norm(right_knee) > 0
-    
-    if left_knee_conf > 0.5 and right_knee_conf > 0.5:
-        base_score = min(100, base_score + 10)
-    
-    return int(base_score)
-
-def analyze_leg_form(keypoints, keypoints_conf=None, exercise="Squats"):
-    """
-    Analyze leg form for specific exercises
-    Returns: form quality score, feedback message
-    """
-    if keypoints is None or len(keypoints) < 17:
-        return 0, "Insufficient pose detection"
-    
-    feedback = []
-    score = 100
-    
-    try:
-        left_hip = keypoints[11]
-        right_hip = keypoints[12]
-        left_knee = keypoints[13]
-        right_knee = keypoints[14]
-        left_ankle = keypoints[15]
-        right_ankle = keypoints[16]
-        
-        # Check if joints are valid
-        if keypoints_conf is not None:
-            if (keypoints_conf[13] < 0.5 or keypoints_conf[14] < 0.5):
-                return 0, "Knees not visible - adjust camera"
-        
-        if exercise == "Squats":
-            # Calculate knee angles
-            left_knee_angle = calculate_angle(left_hip, left_knee, left_ankle)
-            right_knee_angle = calculate_angle(right_hip, right_knee, right_ankle)
-            
-            # Ideal squat: 70-100 degrees at bottom, 170+ at top
-            avg_knee_angle = (left_knee_angle + right_knee_angle) / 2
-            
-            if avg_knee_angle > 150:
-                feedback.append("Stand straight")
-                score = 95
-            elif 70 <= avg_knee_angle <= 100:
-                feedback.append("Perfect squat depth!")
-                score = 100
-            elif avg_knee_angle < 70:
-                feedback.append("Too deep - reduce depth")
-                score = 80
-            else:
-                feedback.append("Partial squat - good")
-                score = 90
-            
-            # Check alignment
-            left_hip_y = left_hip[1]
-            right_hip_y = right_hip[1]
-            
-            if abs(left_hip_y - right_hip_y) > 30:  # Hip misalignment
-                feedback.append("Keep hips level")
-                score = max(60, score - 15)
-            
-        elif exercise == "Pushups":
-            # Body should form straight line
-            shoulder_hip_dist = np.linalg.norm(np.array(left_hip) - np.array([keypoints[5][0], keypoints[5][1]]))
-            if shoulder_hip_dist > 50:  # Saggy body
-                feedback.append("Keep body straight")
-                score = 70
-            else:
-                feedback.append("Good body alignment")
-                score = 95
-        
-        return score, " | ".join(feedback) if feedback else "Good form"
-        
-    except Exception as e:
-        return 50, f"Analysis error: {str(e)[:30]}"
-
-def detect_exercises(keypoints, keypoints_conf=None):
-    """
-    Detect which exercise the user is performing
-    Returns: detected exercise name, confidence
-    """
-    if keypoints is None or len(keypoints) < 17:
-        return "Unknown", 0
-    
-    try:
-        left_knee = keypoints[13]
-        right_knee = keypoints[14]
-        left_ankle = keypoints[15]
-        right_ankle = keypoints[16]
-        left_hip = keypoints[11]
-        right_hip = keypoints[12]
-        
-        # Calculate angles
-        left_knee_angle = calculate_angle(left_hip, left_knee, left_ankle)
-        right_knee_angle = calculate_angle(right_hip, right_knee, right_ankle)
-        avg_knee_angle = (left_knee_angle + right_knee_angle) / 2
-        
-        # Squat detection: varying knee angle
-        if 70 <= avg_knee_angle <= 150:
-            return "Squat", 0.9
-        
-        # Standing: straight legs
-        elif avg_knee_angle > 160:
-            return "Standing", 0.8
-        
-        # Lunges: significant knee variation
-        elif abs(left_knee_angle - right_knee_angle) > 40:
-            return "Lunge", 0.85
-        
-        else:
-            return "Exercise", 0.5
-            
-    except:
-        return "Unknown", 0
-
-def create_knee_overlay(frame, keypoints, keypoints_conf=None):
-    """
-    Draw enhanced knee and pose visualization
-    """
-    if keypoints is None or len(keypoints) < 17:
-        return frame
-    
-    frame_h, frame_w = frame.shape[:2]
-    overlay = frame.copy()
-    
-    try:
-        # Draw keypoints
-        for idx, (x, y) in enumerate(keypoints):
-            if x > 0 and y > 0:
-                conf = keypoints_conf[idx] if keypoints_conf is not None else 1.0
-                
-                if conf > 0.5:
-                    color = (0, 255, 0) if idx in [13, 14, 15, 16] else (255, 100, 0)
-                    cv2.circle(overlay, (int(x), int(y)), 6, color, -1)
-                    
-                    # Label knees
-                    if idx == 13:
-                        cv2.putText(overlay, "L-Knee", (int(x), int(y-10)), 
-                                  cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-                    elif idx == 14:
-                        cv2.putText(overlay, "R-Knee", (int(x), int(y-10)), 
-                                  cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-        
-        # Draw skeleton
-        for connection in SKELETON:
-            start_idx, end_idx = connection
-            start = keypoints[start_idx]
-            end = keypoints[end_idx]
-            
-            if start[0] > 0 and start[1] > 0 and end[0] > 0 and end[1] > 0:
-                start_conf = keypoints_conf[start_idx] if keypoints_conf is not None else 1.0
-                end_conf = keypoints_conf[end_idx] if keypoints_conf is not None else 1.0
-                
-                if start_conf > 0.5 and end_conf > 0.5:
-                    color = (0, 255, 0) if start_idx in [13, 14, 15, 16] or end_idx in [13, 14, 15, 16] else (255, 100, 0)
-                    cv2.line(overlay, (int(start[0]), int(start[1])), 
-                           (int(end[0]), int(end[1])), color, 2)
-        
-        # Blend overlay
-        result = cv2.addWeighted(frame, 0.5, overlay, 0.5, 0)
-        return result
-        
-    except Exception as e:
-        print(f"Overlay error: {e}")
-        return frame
-
-if __name__ == "__main__":
-    """Test the pose detection in real-time"""
-    from camera_handler import CameraHandler
-    
-    camera = CameraHandler()
-    if not camera.initialize_camera():
-        print("Camera not available")
-        exit()
-    
-    print("Starting live pose detection... Press Q to exit")
-    
-    while camera.is_available():
-        success, frame = camera.get_frame()
-        if not success:
-            break
-        
-        # Detect
-        annotated, keypoints, quality = detect_knees_and_pose(frame)
-        
-        # Analyze
-        if keypoints is not None:
-            exercise, exercise_conf = detect_exercises(keypoints)
-            form_score, form_feedback = analyze_leg_form(keypoints, exercise=exercise)
-            
-            cv2.putText(annotated, f"Exercise: {exercise} ({exercise_conf:.1f})", 
-                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-            cv2.putText(annotated, f"Form: {form_score}% - {form_feedback}", 
-                       (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-        
-        cv2.imshow("Pose & Knee Detection", annotated)
-        
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-    
-    camera.release()
-    cv2.destroyAllWindows()
+"""
+Advanced Pose & Knee Detection for ZenMed
+Integrates trained YOLO model for real-time keypoint detection
+"""
+
+import cv2
+import numpy as np
+import base64
+from model_registry import MODEL_PATH, get_model
+from joint_angles import joint_angles, angle_between, as_pose_batch, ANGLE_INDEX
+from pose_roi import ROI_IMGSZ, clip_roi
+from metrics import timed
+
+# Shared with posture_detector - loaded and warmed up once per process
+get_model(MODEL_PATH)
+
+# COCO Keypoint Indices (YOLOv8 Pose)
+KEYPOINTS = {
+    0: "Nose", 1: "Left Eye", 2: "Right Eye",
+    3: "Left Ear", 4: "Right Ear",
+    5: "Left Shoulder", 6: "Right Shoulder",
+    7: "Left Elbow", 8: "Right Elbow",
+    9: "Left Wrist", 10: "Right Wrist",
+    11: "Left Hip", 12: "Right Hip",
+    13: "Left Knee", 14: "Right Knee",  # KEY POINTS FOR LEG DETECTION
+    15: "Left Ankle", 16: "Right Ankle"
+}
+
+SKELETON = [
+    (0, 1), (0, 2), (1, 3), (2, 4),
+    (5, 6), (5, 7), (7, 9), (6, 8), (8, 10),
+    (5, 11), (6, 12),
+    (11, 13), (13, 15),  # Left leg
+    (12, 14), (14, 16)   # Right leg
+]
+
+LEFT_KNEE_ANGLE = ANGLE_INDEX['left_knee']
+RIGHT_KNEE_ANGLE = ANGLE_INDEX['right_knee']
+
+def calculate_angle(point_a, point_b, point_c):
+    """
+    Calculate angle between three points
+    Used for pose quality assessment
+    """
+    try:
+        return float(angle_between(point_a, point_b, point_c))
+    except:
+        return 0
+
+def detect_knees_and_pose(frame):
+    """
+    Detect knees and full pose from frame
+    Returns: annotated frame, keypoints, pose quality score
+    """
+    if frame is None:
+        return frame, None, 0
+    
+    try:
+        annotated_frame, keypoints, _, pose_quality, _, _ = infer_poses([frame])[0]
+        return annotated_frame, keypoints, pose_quality
+        
+    except Exception as e:
+        print(f"Error in detection: {e}")
+        return frame, None, 0
+
+def infer_poses(frames, render=True, rois=None):
+    """
+    Run one batched YOLO call over several frames
+    render: bool, or one bool per frame (skip result.plot() where False)
+    rois: optional (x1, y1, x2, y2) per frame - those frames are cropped to the
+          region and run at ROI_IMGSZ; keypoints come back in frame coordinates
+    Returns: list of (annotated frame, keypoints, keypoint confidences, pose quality,
+             model version, person box [x1, y1, x2, y2, conf] or None)
+    """
+    if isinstance(render, bool):
+        render = [render] * len(frames)
+    if rois is None:
+        rois = [None] * len(frames)
+    
+    model = get_model(MODEL_PATH)
+    if model is None or len(frames) == 0:
+        return [(frame, None, None, 0, None, None) for frame in frames]
+    
+    crops = [clip_roi(roi, frame.shape) for frame, roi in zip(frames, rois)]
+    outputs = [None] * len(frames)
+    
+    # Full frames and crops use different input sizes, so one model call each
+    for use_roi in (False, True):
+        indices = [i for i, crop in enumerate(crops) if (crop is not None) == use_roi]
+        if not indices:
+            continue
+        with timed('pose', 'inference_roi' if use_roi else 'inference'):
+            if use_roi:
+                images = [frames[i][crops[i][1]:crops[i][3], crops[i][0]:crops[i][2]] for i in indices]
+                results = model(images, conf=0.5, imgsz=ROI_IMGSZ, verbose=False)
+            else:
+                results = model([frames[i] for i in indices], conf=0.5, verbose=False)
+        
+        for i, result in zip(indices, results or ()):
+            annotated, keypoints, keypoints_conf, quality, box = \
+                _unpack_pose_result(result, frames[i], render[i], crops[i])
+            outputs[i] = (annotated, keypoints, keypoints_conf, quality, model.version, box)
+    
+    return [output if output is not None else (frame, None, None, 0, model.version, None)
+            for frame, output in zip(frames, outputs)]
+
+def _unpack_pose_result(result, frame, render=True, crop=None):
+    """Extract keypoints, person box and pose quality from a single YOLO result"""
+    if not render:
+        annotated_frame = frame
+    elif crop is not None:
+        # Paste the drawn crop back so the patient still sees the whole frame
+        with timed('pose', 'plot'):
+            x1, y1, x2, y2 = crop
+            annotated_frame = frame.copy()
+            annotated_frame[y1:y2, x1:x2] = result.plot()
+    else:
+        with timed('pose', 'plot'):
+            annotated_frame = result.plot()
+    
+    # Extract keypoints
+    if result.keypoints is None or len(result.keypoints.xy) == 0:
+        return annotated_frame, None, None, 0, None
+    
+    keypoints = result.keypoints.xy[0].cpu().numpy()
+    keypoints_conf = result.keypoints.conf[0].cpu().numpy() if result.keypoints.conf is not None else None
+    box = None
+    if result.boxes is not None and len(result.boxes) > 0:
+        box = result.boxes.xyxy[0].cpu().numpy().tolist() + [float(result.boxes.conf[0])]
+    
+    if crop is not None:
+        # Back to frame coordinates; (0, 0) stays "not detected"
+        offset = np.array(crop[:2], dtype=keypoints.dtype)
+        keypoints = np.where(keypoints.any(axis=1, keepdims=True), keypoints + offset, keypoints)
+        if box is not None:
+            box = [box[0] + crop[0], box[1] + crop[1], box[2] + crop[0], box[3] + crop[1], box[4]]
+    
+    # Calculate pose quality
+    pose_quality = calculate_pose_quality(keypoints, keypoints_conf)
+    
+    return annotated_frame, keypoints, keypoints_conf, pose_quality, box
+
+def calculate_pose_quality(keypoints, confidences=None):
+    """
+    Calculate overall pose quality (0-100)
+    Based on keypoint confidence and anatomical plausibility
+    """
+    if keypoints is None or len(keypoints) == 0:
+        return 0
+    
+    # Count valid keypoints (with confidence > 0.5)
+    valid_count = 0
+    if confidences is not None:
+        valid_count = np.sum(confidences > 0.5)
+    else:
+        valid_count = np.sum(np.linalg.norm(keypoints, axis=1) > 0)
+    
+    # Base score on visible keypoints
+    base_score = (valid_count / len(keypoints)) * 100
+    
+    # Bonus for having both knees visible (leg detection)
+    left_knee = keypoints[13]
+    right_knee = keypoints[14]
+    
+    if confidences is not None:
+        left_knee_conf = confidences[13]
+        right_knee_conf = confidences[14]
+    else:
+        left_knee_conf = np.linalg.norm(left_knee) > 0
+        right_knee_conf = np.linalg.norm(right_knee) > 0
+    
+    if left_knee_conf > 0.5 and right_knee_conf > 0.5:
+        base_score = min(100, base_score + 10)
+    
+    return int(base_score)
+
+def analyze_leg_form(keypoints, keypoints_conf=None, exercise="Squats"):
+    """
+    Analyze leg form for specific exercises
+    Returns: form quality score, feedback message
+    """
+    if keypoints is None or len(keypoints) < 17:
+        return 0, "Insufficient pose detection"
+    
+    try:
+        scores, feedback = analyze_leg_form_batch(
+            np.asarray(keypoints)[None],
+            np.asarray(keypoints_conf)[None] if keypoints_conf is not None else None,
+            exercise)
+        return int(scores[0]), feedback[0]
+        
+    except Exception as e:
+        return 50, f"Analysis error: {str(e)[:30]}"
+
+def analyze_leg_form_batch(keypoints, keypoints_conf=None, exercise="Squats"):
+    """
+    analyze_leg_form for a whole batch of poses (N x 17 x 2) in one pass
+    exercise: one name for every pose, or one per pose
+    Returns: scores (N,), list of N feedback messages
+    """
+    keypoints, keypoints_conf = as_pose_batch(keypoints, keypoints_conf)
+    count = len(keypoints)
+    exercises = np.broadcast_to(np.asarray(exercise, dtype=object), (count,))
+    
+    scores = np.full(count, 100)
+    feedback = [[] for _ in range(count)]
+    
+    # Squats: knee angle - ideal 70-100 degrees at bottom, 170+ at top
+    squats = exercises == "Squats"
+    if squats.any():
+        angles = joint_angles(keypoints[squats])
+        avg_knee_angle = (angles[:, LEFT_KNEE_ANGLE] + angles[:, RIGHT_KNEE_ANGLE]) / 2
+        
+        conditions = [avg_knee_angle > 150,
+                      (avg_knee_angle >= 70) & (avg_knee_angle <= 100),
+                      avg_knee_angle < 70]
+        squat_scores = np.select(conditions, [95, 100, 80], default=90)
+        depth = np.select(conditions, [0, 1, 2], default=3)
+        messages = ("Stand straight", "Perfect squat depth!", "Too deep - reduce depth", "Partial squat - good")
+        
+        # Hip misalignment
+        uneven_hips = np.abs(keypoints[squats, 11, 1] - keypoints[squats, 12, 1]) > 30
+        squat_scores = np.where(uneven_hips, np.maximum(60, squat_scores - 15), squat_scores)
+        
+        for i, idx in enumerate(np.flatnonzero(squats)):
+            feedback[idx].append(messages[depth[i]])
+            if uneven_hips[i]:
+                feedback[idx].append("Keep hips level")
+        scores[squats] = squat_scores
+    
+    # Pushups: body should form straight line
+    pushups = exercises == "Pushups"
+    if pushups.any():
+        shoulder_hip_dist = np.linalg.norm(keypoints[pushups, 11] - keypoints[pushups, 5], axis=-1)
+        saggy = shoulder_hip_dist > 50
+        scores[pushups] = np.where(saggy, 70, 95)
+        for i, idx in enumerate(np.flatnonzero(pushups)):
+            feedback[idx].append("Keep body straight" if saggy[i] else "Good body alignment")
+    
+    messages = [" | ".join(items) if items else "Good form" for items in feedback]
+    
+    # Check if joints are valid
+    if keypoints_conf is not None:
+        hidden_knees = (keypoints_conf[:, 13] < 0.5) | (keypoints_conf[:, 14] < 0.5)
+        scores[hidden_knees] = 0
+        for idx in np.flatnonzero(hidden_knees):
+            messages[idx] = "Knees not visible - adjust camera"
+    
+    return scores, messages
+
+def detect_exercises(keypoints, keypoints_conf=None):
+    """
+    Detect which exercise the user is performing
+    Returns: detected exercise name, confidence
+    """
+    if keypoints is None or len(keypoints) < 17:
+        return "Unknown", 0
+    
+    try:
+        exercises, confidences = detect_exercises_batch(np.asarray(keypoints)[None])
+        return str(exercises[0]), float(confidences[0])
+            
+    except:
+        return "Unknown", 0
+
+def detect_exercises_batch(keypoints):
+    """
+    detect_exercises for a whole batch of poses (N x 17 x 2) in one pass
+    Returns: exercise names (N,), confidences (N,)
+    """
+    angles = joint_angles(keypoints)
+    left_knee_angle = angles[:, LEFT_KNEE_ANGLE]
+    right_knee_angle = angles[:, RIGHT_KNEE_ANGLE]
+    avg_knee_angle = (left_knee_angle + right_knee_angle) / 2
+    
+    conditions = [
+        # Squat detection: varying knee angle
+        (avg_knee_angle >= 70) & (avg_knee_angle <= 150),
+        # Standing: straight legs
+        avg_knee_angle > 160,
+        # Lunges: significant knee variation
+        np.abs(left_knee_angle - right_knee_angle) > 40,
+    ]
+    exercises = np.select(conditions, ["Squat", "Standing", "Lunge"], default="Exercise")
+    confidences = np.select(conditions, [0.9, 0.8, 0.85], default=0.5)
+    return exercises, confidences
+
+def decode_frame(frame_bytes):
+    """Decode uploaded image bytes, returns None if not a valid image"""
+    with timed('pose', 'decode'):
+        npimg = np.frombuffer(frame_bytes, np.uint8)
+        return cv2.imdecode(npimg, cv2.IMREAD_COLOR)
+
+def frame_feedback(annotated, keypoints, model_version=None, keypoints_conf=None, render=True):
+    """
+    Exercise detection and form analysis for one frame
+    render=True: includes the annotated frame as a JPEG data URL
+    render=False: includes compact keypoints and confidences instead, nothing is encoded
+    Returns: /frame_detect response fields
+    """
+    with timed('pose', 'analysis'):
+        exercise, conf = detect_exercises(keypoints)
+        score, feedback = analyze_leg_form(keypoints, exercise=exercise)
+    
+    response = {
+        'exercise': exercise,
+        'form_score': int(score),
+        'form_feedback': feedback,
+        'model_version': model_version
+    }
+    
+    if render:
+        with timed('pose', 'jpeg_encode'):
+            _, buffer = cv2.imencode('.jpg', annotated)
+        with timed('pose', 'base64'):
+            frame_b64 = base64.b64encode(buffer).decode()
+        response['frame'] = f"data:image/jpeg;base64,{frame_b64}"
+    else:
+        response.update(compact_keypoints(keypoints, keypoints_conf))
+        response['image_size'] = [int(annotated.shape[1]), int(annotated.shape[0])]
+    
+    return response
+
+def compact_keypoints(keypoints, keypoints_conf=None):
+    """Keypoints as [[x, y], ...] (0.1 px) and confidences (0.01) for the browser to draw"""
+    if keypoints is None:
+        return {'keypoints': None, 'confidences': None}
+    return {
+        'keypoints': np.round(np.asarray(keypoints, dtype=np.float64), 1).tolist(),
+        'confidences': np.round(np.asarray(keypoints_conf, dtype=np.float64), 2).tolist()
+                       if keypoints_conf is not None else None
+    }
+
+def create_knee_overlay(frame, keypoints, keypoints_conf=None):
+    """
+    Draw enhanced knee and pose visualization
+    """
+    if keypoints is None or len(keypoints) < 17:
+        return frame
+    
+    frame_h, frame_w = frame.shape[:2]
+    overlay = frame.copy()
+    
+    try:
+        # Draw keypoints
+        for idx, (x, y) in enumerate(keypoints):
+            if x > 0 and y > 0:
+                conf = keypoints_conf[idx] if keypoints_conf is not None else 1.0
+                
+                if conf > 0.5:
+                    color = (0, 255, 0) if idx in [13, 14, 15, 16] else (255, 100, 0)
+                    cv2.circle(overlay, (int(x), int(y)), 6, color, -1)
+                    
+                    # Label knees
+                    if idx == 13:
+                        cv2.putText(overlay, "L-Knee", (int(x), int(y-10)), 
+                                  cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                    elif idx == 14:
+                        cv2.putText(overlay, "R-Knee", (int(x), int(y-10)), 
+                                  cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        
+        # Draw skeleton
+        for connection in SKELETON:
+            start_idx, end_idx = connection
+            start = keypoints[start_idx]
+            end = keypoints[end_idx]
+            
+            if start[0] > 0 and start[1] > 0 and end[0] > 0 and end[1] > 0:
+                start_conf = keypoints_conf[start_idx] if keypoints_conf is not None else 1.0
+                end_conf = keypoints_conf[end_idx] if keypoints_conf is not None else 1.0
+                
+                if start_conf > 0.5 and end_conf > 0.5:
+                    color = (0, 255, 0) if start_idx in [13, 14, 15, 16] or end_idx in [13, 14, 15, 16] else (255, 100, 0)
+                    cv2.line(overlay, (int(start[0]), int(start[1])), 
+                           (int(end[0]), int(end[1])), color, 2)
+        
+        # Blend overlay
+        result = cv2.addWeighted(frame, 0.5, overlay, 0.5, 0)
+        return result
+        
+    except Exception as e:
+        print(f"Overlay error: {e}")
+        return frame
+
+if __name__ == "__main__":
+    """Test the pose detection in real-time"""
+    from capture_service import get_capture_service
+    
+    capture = get_capture_service()
+    camera = capture.acquire()
+    if camera is None:
+        print("Camera not available")
+        exit()
+    
+    print("Starting live pose detection... Press Q to exit")
+    
+    while camera.is_available():
+        success, frame = camera.get_frame()
+        if not success:
+            break
+        
+        # Detect
+        annotated, keypoints, quality = detect_knees_and_pose(frame)
+        
+        # Analyze
+        if keypoints is not None:
+            exercise, exercise_conf = detect_exercises(keypoints)
+            form_score, form_feedback = analyze_leg_form(keypoints, exercise=exercise)
+            
+            cv2.putText(annotated, f"Exercise: {exercise} ({exercise_conf:.1f})", 
+                       (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+            cv2.putText(annotated, f"Form: {form_score}% - {form_feedback}", 
+                       (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+        
+        cv2.imshow("Pose & Knee Detection", annotated)
+        
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            break
+    
+    capture.close()
+    cv2.destroyAllWindows()
@@ -0,0 +1,280 @@
+"""
+Incremental Alert Rules for ZenMed
+Rules are evaluated as each exercise log, posture score or glucose
+reading is written, against a small per-patient state (rolling posture
+mean, last alert time per type), so an event costs O(1) and nothing
+rescans a patient's history. Alerts land in the alerts table in the
+writer's transaction - one executemany per batch - and a rule does not
+fire again for the same patient within its dedup window. A firing rule
+claims its dedup slot under the engine lock before the insert, so two
+writers for one patient cannot both raise it; a write that fails to
+commit releases the claim. Posture scores only join the shared state
+once the writer has committed them (apply), so a rolled-back write
+neither suppresses its alert nor counts twice when retried. Missed exercise is the one rule about something not
+happening; it is checked once a day by a single INSERT ... SELECT.
+
+Events are dicts with 'kind' ('exercise', 'posture' or 'glucose') and
+'user_id' plus the kind's fields.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from pose_tracker import RollingMean
+import portal_feed
+
+HIGH_FASTING_MG_DL = float(os.environ.get('ZENMED_HIGH_FASTING_MG_DL', '130'))
+HIGH_POST_MEAL_MG_DL = float(os.environ.get('ZENMED_HIGH_POST_MEAL_MG_DL', '180'))
+LOW_SUGAR_MG_DL = float(os.environ.get('ZENMED_LOW_SUGAR_MG_DL', '70'))
+# Posture alert: mean of the last POSTURE_WINDOW scores below POOR_POSTURE_SCORE
+POSTURE_WINDOW = int(os.environ.get('ZENMED_POSTURE_ALERT_WINDOW', '5'))
+POOR_POSTURE_SCORE = float(os.environ.get('ZENMED_POOR_POSTURE_SCORE', '50'))
+MISSED_EXERCISE_DAYS = int(os.environ.get('ZENMED_MISSED_EXERCISE_DAYS', '3'))
+DEDUP_HOURS = float(os.environ.get('ZENMED_ALERT_DEDUP_HOURS', '12'))
+# Patients whose rule state is kept in memory (least recently seen dropped first)
+MAX_PATIENT_STATES = int(os.environ.get('ZENMED_ALERT_STATE_SIZE', '10000'))
+
+class Rule:
+    """
+    alert_type: alerts.type written when the rule fires
+    kind: event kind the rule listens to
+    condition(event, state) -> bool, message(event, state) -> str
+    """
+
+    __slots__ = ("alert_type", "kind", "condition", "message", "dedup_s")
+
+    def __init__(self, alert_type, kind, condition, message, dedup_hours=DEDUP_HOURS):
+        self.alert_type = alert_type
+        self.kind = kind
+        self.condition = condition
+        self.message = message
+        self.dedup_s = dedup_hours * 3600
+
+READING_LABELS = {'fasting': 'fasting', 'post_meal': 'post-meal', 'cgm': 'CGM'}
+
+def _high_sugar(event, state):
+    # Fasting has the tighter limit; CGM samples are judged like post-meal readings
+    limit = HIGH_FASTING_MG_DL if event['reading'] == 'fasting' else HIGH_POST_MEAL_MG_DL
+    return event['value'] >= limit
+
+def _low_sugar(event, state):
+    return event['value'] < LOW_SUGAR_MG_DL
+
+def _glucose_message(label):
+    def message(event, state):
+        taken_at = datetime.fromtimestamp(event['taken_at']).isoformat(sep=' ', timespec='minutes')
+        return f"{label}: {event['value']:g} mg/dL {READING_LABELS.get(event['reading'], '')} at {taken_at}"
+    return message
+
+RULES = [
+    Rule('HIGH_SUGAR', 'glucose', _high_sugar, _glucose_message("High blood sugar")),
+    Rule('LOW_SUGAR', 'glucose', _low_sugar, _glucose_message("Low blood sugar")),
+    Rule('POOR_POSTURE', 'posture',
+         lambda event, state: len(state.posture) >= POSTURE_WINDOW and state.posture.mean() < POOR_POSTURE_SCORE,
+         lambda event, state: f"Average posture score {state.posture.mean():.0f} over the last {POSTURE_WINDOW} sessions"),
+]
+
+class PatientState:
+    """What the rules need to remember about one patient"""
+
+    __slots__ = ("posture", "last_alert")
+
+    def __init__(self, last_alert=None):
+        self.posture = RollingMean(POSTURE_WINDOW)
+        # alert type -> epoch seconds of the newest alert
+        self.last_alert = last_alert or {}
+
+    def copy(self):
+        state = PatientState(dict(self.last_alert))
+        state.posture = self.posture.copy()
+        return state
+
+    def observe(self, event):
+        if event['kind'] == 'posture':
+            self.posture.push(event['score'])
+
+class AlertEngine:
+    """Evaluates RULES against incoming events and writes the alerts they raise"""
+
+    def __init__(self, rules=RULES, max_states=MAX_PATIENT_STATES):
+        self.rules = {}
+        for rule in rules:
+            self.rules.setdefault(rule.kind, []).append(rule)
+        self.max_states = max_states
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self.fired = 0
+
+    def evaluate(self, conn, events, now=None):
+        """
+        Alerts events would raise. Posture is worked out on copies of the patients' state;
+        each alert claims its type's dedup slot in the shared state as it fires.
+        Returns: ((patient_id, type, message) alerts, changes to apply() once they are
+        committed or release() if they are not)
+        """
+        now = time.time() if now is None else now
+        user_ids = {event['user_id'] for event in events}
+        with self._lock:
+            states = {user_id: self._states[user_id] for user_id in user_ids if user_id in self._states}
+        # First sight since startup: read their alerts from the table outside the lock
+        loaded = {user_id: self._load(conn, user_id) for user_id in user_ids - states.keys()}
+        alerts = []
+        fired = []
+        tentative = {}
+        with self._lock:
+            for user_id in user_ids:
+                states[user_id] = self._cache(user_id, states.get(user_id) or loaded[user_id])
+            for event in events:
+                user_id = event['user_id']
+                shared = states[user_id]
+                state = tentative.get(user_id)
+                if state is None:
+                    state = tentative[user_id] = shared.copy()
+                state.observe(event)
+                for rule in self.rules.get(event['kind'], ()):
+                    if not rule.condition(event, state):
+                        continue
+                    previous = shared.last_alert.get(rule.alert_type)
+                    if previous is not None and now - previous < rule.dedup_s:
+                        continue
+                    shared.last_alert[rule.alert_type] = now
+                    fired.append((user_id, rule.alert_type, now, previous))
+                    alerts.append((user_id, rule.alert_type, rule.message(event, state)))
+        return alerts, (list(events), fired)
+
+    def record(self, conn, events, now=None):
+        """Evaluate events and insert their alerts in the caller's transaction, returns (alerts, changes)"""
+        alerts, changes = self.evaluate(conn, events, now)
+        if alerts:
+            try:
+                conn.executemany("INSERT INTO alerts (patient_id, type, message) VALUES (?, ?, ?)", alerts)
+            except Exception:
+                self.release(changes)
+                raise
+        return alerts, changes
+
+    def apply(self, changes):
+        """Fold committed events into the shared state"""
+        events, fired = changes
+        with self._lock:
+            for event in events:
+                # Patients no longer cached reload their alerts from the table when next seen
+                state = self._states.get(event['user_id'])
+                if state is not None:
+                    state.observe(event)
+            self.fired += len(fired)
+
+    def release(self, changes):
+        """Give back the dedup slots claimed by a write that was not committed"""
+        events, fired = changes
+        with self._lock:
+            for user_id, alert_type, fired_at, previous in reversed(fired):
+                state = self._states.get(user_id)
+                # Leave a slot alone once a later alert has taken it over
+                if state is None or state.last_alert.get(alert_type) != fired_at:
+                    continue
+                if previous is None:
+                    del state.last_alert[alert_type]
+                else:
+                    state.last_alert[alert_type] = previous
+
+    def _cache(self, user_id, state):
+        """The cached state for user_id, caching state if there is none yet (lock held)"""
+        cached = self._states.get(user_id)
+        if cached is not None:
+            self._states.move_to_end(user_id)
+            return cached
+        self._states[user_id] = state
+        if len(self._states) > self.max_states:
+            self._states.popitem(last=False)
+        return state
+
+    @staticmethod
+    def _load(conn, user_id):
+        # Dedup against alerts already in the table
+        return PatientState({row[0]: row[1] for row in conn.execute("""
+            SELECT type, CAST(strftime('%s', MAX(created_at)) AS INTEGER)
+            FROM alerts WHERE patient_id = ? GROUP BY type
+        """, (user_id,)) if row[1] is not None})
+
+engine = AlertEngine()
+
+def activity_events(rows):
+    """Events for exercise log rows (user_id, date, minutes, posture_score or None)"""
+    events = []
+    for user_id, day, minutes, score in rows:
+        events.append({'kind': 'exercise', 'user_id': user_id, 'date': day, 'minutes': minutes})
+        if score is not None:
+            events.append({'kind': 'posture', 'user_id': user_id, 'date': day, 'score': score})
+    return events
+
+def record_activity(conn, rows):
+    """
+    Alerts for newly written exercise log rows, in the caller's transaction
+    Returns (alerts, changes) - finish the write with commit(conn, (alerts, changes))
+    """
+    return engine.record(conn, activity_events(rows))
+
+def record_glucose(conn, rows):
+    """Same as record_activity, for glucose readings (user_id, taken_at epoch seconds, mg/dL, kind)"""
+    return engine.record(conn, [{'kind': 'glucose', 'user_id': user_id, 'taken_at': taken_at,
+                                 'value': value, 'reading': reading}
+                                for user_id, taken_at, value, reading in rows])
+
+def commit(conn, recorded, user_ids=()):
+    """
+    Finish a write: commit the caller's transaction, let the rule state see what it
+    wrote, then push the alerts and changed patients to open doctor portals
+    recorded: (alerts, changes) from record_activity / record_glucose
+    Every writer ends through here, so state and pushes always follow the commit
+    and a failed commit gives back its alerts' dedup slots.
+    Returns the alerts
+    """
+    alerts, changes = recorded
+    try:
+        conn.commit()
+    except Exception:
+        engine.release(changes)
+        raise
+    engine.apply(changes)
+    portal_feed.publish(conn, alerts, user_ids)
+    return alerts
+
+_checked_on = None
+
+# One alert per lapse: skip patients already alerted since (the day after) their last activity
+INSERT_MISSED_EXERCISE = """
+    INSERT INTO alerts (patient_id, type, message)
+    SELECT s.user_id, 'MISSED_EXERCISE',
+           'No exercise logged for ' || CAST(julianday(:today) - julianday(s.last_active) AS INTEGER)
+           || ' days (last on ' || s.last_active || ')'
+    FROM patient_summary s
+    WHERE s.last_active <= :cutoff
+      AND NOT EXISTS (SELECT 1 FROM alerts a
+                      WHERE a.patient_id = s.user_id AND a.type = 'MISSED_EXERCISE'
+                        AND a.created_at >= date(s.last_active, '+1 day'))
+    RETURNING patient_id, type, message
+"""
+
+def check_missed_exercise(conn, today=None):
+    """
+    MISSED_EXERCISE for patients whose last activity is MISSED_EXERCISE_DAYS or more ago
+    and who have had no such alert since (the day after) that activity - so each lapse
+    alerts once, across restarts. One set-based statement over the last_active and
+    idx_alerts_patient_type indexes, run at most once per day.
+    Returns the number of alerts written.
+    """
+    global _checked_on
+    today = today or date.today()
+    if _checked_on == today:
+        return 0
+    cutoff = (today - timedelta(days=MISSED_EXERCISE_DAYS)).isoformat()
+    alerts = [tuple(row) for row in conn.execute(INSERT_MISSED_EXERCISE,
+                                                 {'today': today.isoformat(), 'cutoff': cutoff})]
+    conn.commit()
+    portal_feed.publish(conn, alerts)
+    _checked_on = today
+    return len(alerts)
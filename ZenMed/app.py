@@ -1,374 +1,628 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
-import sqlite3
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
-import json
-
-from posture_detector import process_frame_for_web
-from advanced_pose_detector import detect_knees_and_pose, analyze_leg_form, detect_exercises
-import base64
-import cv2
-import numpy as np
-
-app = Flask(__name__)
-app.secret_key = "zenmed_secret_key_secure_production"
-
-def get_db_connection():
-    conn = sqlite3.connect("database.db")
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def init_db():
-    conn = get_db_connection()
-    
-    conn.execute("PRAGMA foreign_keys = ON")
-
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            role TEXT DEFAULT 'patient', -- patient, doctor, caregiver
-            language TEXT DEFAULT 'en', -- en, ta
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS diet_plans (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            plan_json TEXT, -- Store generated plan as JSON
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        )
-    """)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS exercise_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            exercise_name TEXT,
-            duration INTEGER, -- minutes
-            date TEXT,
-            posture_score INTEGER, -- AI Score
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        )
-    """)
-
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS reminders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            title TEXT,
-            time TEXT,
-            type TEXT, -- medicine, exercise, water
-            active INTEGER DEFAULT 1,
-            FOREIGN KEY(user_id) REFERENCES users(id)
-        )
-    """)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS alerts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patient_id INTEGER, -- The user who generated the alert
-            type TEXT, -- HIGH_SUGAR, LOW_SUGAR, MISSED_EXERCISE
-            message TEXT,
-            is_read INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(patient_id) REFERENCES users(id)
-        )
-    """)
-    try:
-        conn.execute("ALTER TABLE users ADD COLUMN role TEXT DEFAULT 'patient'")
-    except sqlite3.OperationalError:
-        pass
-    
-    try:
-        conn.execute("ALTER TABLE users ADD COLUMN language TEXT DEFAULT 'en'")
-    except sqlite3.OperationalError:
-        pass
-
-    conn.commit()
-    conn.close()
-
-
-@app.route('/')
-def index():
-    if 'user_id' in session:
-        return redirect(url_for('dashboard'))
-    return render_template('index.html')
-
-@app.route('/register', methods=['GET', 'POST'])
-def register():
-    if request.method == 'POST':
-        name = request.form['name']
-        email = request.form['email']
-        password = generate_password_hash(request.form['password'])
-        role = request.form.get('role', 'patient')
-        language = request.form.get('language', 'en')
-
-        conn = get_db_connection()
-        try:
-            conn.execute(
-                "INSERT INTO users (name, email, password, role, language) VALUES (?, ?, ?, ?, ?)",
-                (name, email, password, role, language)
-            )
-            conn.commit()
-            flash("Registration Successful! Please Login.")
-        except sqlite3.IntegrityError:
-            flash("Email already exists!")
-            conn.close()
-            return render_template('register.html', error="Email already exists!")
-        
-        conn.close()
-        return redirect(url_for('login'))
-
-    return render_template('register.html')
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if request.method == 'POST':
-        email = request.form['email']
-        password = request.form['password']
-
-        conn = get_db_connection()
-        user = conn.execute("SELECT * FROM users WHERE email = ?", (email,)).fetchone()
-        conn.close()
-
-        if user and check_password_hash(user['password'], password):
-            session['user_id'] = user['id']
-            session['user_name'] = user['name']
-            session['role'] = user['role']
-            session['lang'] = user['language']
-            return redirect(url_for('dashboard'))
-        else:
-            return render_template('login.html', error="Invalid Credentials")
-
-    return render_template('login.html')
-
-@app.route('/logout')
-def logout():
-    session.clear()
-    return redirect(url_for('login'))
-
-@app.route('/dashboard')
-def dashboard():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    
-    user_id = session['user_id']
-    conn = get_db_connection()
-
-    exercise_data = conn.execute("SELECT * FROM exercise_logs WHERE user_id = ? ORDER BY date DESC LIMIT 5", (user_id,)).fetchall()
-    reminders = conn.execute("SELECT * FROM reminders WHERE user_id = ? AND active = 1", (user_id,)).fetchall()
-
-    conn.close()
-    
-    return render_template('dashboard.html', 
-                           user=session, 
-                           exercises=exercise_data, 
-                           reminders=reminders)
-
-@app.route('/exercises', methods=['GET', 'POST'])
-def add_exercise():
-    if 'user_id' not in session: return redirect(url_for('login'))
-    
-    if request.method == 'POST':
-        name = request.form.get('exercise_name')
-        duration = request.form.get('duration')
-        
-        conn = get_db_connection()
-        conn.execute("INSERT INTO exercise_logs (user_id, exercise_name, duration, date) VALUES (?, ?, ?, ?)",
-                     (session['user_id'], name, duration, datetime.now().strftime("%Y-%m-%d")))
-        conn.commit()
-        conn.close()
-        return redirect(url_for('dashboard'))
-        
-    return render_template('add_exercise.html')
-
-@app.route('/nutrition', methods=['GET', 'POST'])
-def nutrition():
-    if 'user_id' not in session: return redirect(url_for('login'))
-
-    user_plan = None
-    
-    if request.method == 'POST':
-        location = request.form.get('location')
-        pref = request.form.get('preference')
-        plan = {
-            "breakfast": "Idli with Sambar (2 pcs) - Low GI",
-            "lunch": "Brown Rice (1 cup) with Greens (Keerai) and Rasam",
-            "dinner": "Chapati (2 pcs) with Dal",
-            "snacks": "Roasted Chana or Fruit Salad"
-        }
-        
-        if pref == 'Non-Veg':
-            plan['breakfast'] = "Idly with Egg Curry (1 egg)"
-            plan['lunch'] = "Brown Rice with Fish Curry (Small portion)"
-            plan['dinner'] = "Chapati with Chicken gravy(Small portion)"
-            plan['snacks'] = "Boiled egg or chicken soup (small bowl)"
-        
-        if location and "Madurai" in location:
-             plan['breakfast'] = "Millet Pongal (Limited Ghee)"
-
-        conn = get_db_connection()
-        conn.execute("INSERT INTO diet_plans (user_id, plan_json) VALUES (?, ?)", 
-                     (session['user_id'], json.dumps(plan)))
-        conn.commit()
-        conn.close()
-        
-        user_plan = plan
-        flash("New Diet Plan Generated & Saved!", "success")
-        
-    else:
-        conn = get_db_connection()
-        row = conn.execute("SELECT plan_json FROM diet_plans WHERE user_id = ? ORDER BY id DESC LIMIT 1", 
-                           (session['user_id'],)).fetchone()
-        conn.close()
-        if row:
-            user_plan = json.loads(row['plan_json'])
-        
-    return render_template('nutrition.html', plan=user_plan)
-
-@app.route('/posture')
-def posture_ai():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    return render_template('posture.html', camera_available=True)
-
-
-@app.route('/frame_detect', methods=['POST'])
-def frame_detect():
-    if 'user_id' not in session:
-        return jsonify({'status': 'error', 'msg': 'Not authenticated'}), 401
-
-    try:
-        file = request.files['frame']
-        npimg = np.frombuffer(file.read(), np.uint8)
-        frame = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
-
-        if frame is None:
-            return jsonify({'status': 'error', 'msg': 'Invalid frame'})
-
-        annotated, keypoints, quality = detect_knees_and_pose(frame)
-        exercise, conf = detect_exercises(keypoints)
-        score, feedback = analyze_leg_form(keypoints, exercise=exercise)
-
-        _, buffer = cv2.imencode('.jpg', annotated)
-        frame_b64 = base64.b64encode(buffer).decode()
-
-        return jsonify({
-            'status': 'success',
-            'frame': f"data:image/jpeg;base64,{frame_b64}",
-            'exercise': exercise,
-            'form_score': int(score),
-            'form_feedback': feedback
-        })
-
-    except Exception as e:
-        return jsonify({'status': 'error', 'msg': str(e)})
-
-@app.route('/save_posture_score', methods=['POST'])
-def save_posture_score():
-    if 'user_id' not in session: return jsonify({'status': 'error'})
-    data = request.json
-    score = data.get('score')
-    exercise = data.get('exercise', 'General')
-    duration = data.get('duration', 15)
-    
-    conn = get_db_connection()
-    conn.execute("INSERT INTO exercise_logs (user_id, exercise_name, duration, date, posture_score) VALUES (?, ?, ?, ?, ?)",
-                 (session['user_id'], exercise, duration, datetime.now().strftime("%Y-%m-%d"), score))
-    conn.commit()
-    conn.close()
-    return jsonify({'status': 'success'})
-
-@app.route('/detect_posture', methods=['POST'])
-def detect_posture_endpoint():
-    if 'user_id' not in session:
-        return jsonify({'status': 'error'}), 401
-
-    try:
-        file = request.files['frame']
-        result_img, score, feedback = process_frame_for_web(file.read())
-
-        return jsonify({
-            'status': 'success',
-            'frame': result_img,
-            'score': score,
-            'feedback': feedback
-        })
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)})
-
-@app.route('/analyze_posture_batch', methods=['POST'])
-def analyze_posture_batch():
-    """Analyze multiple frames and return aggregated posture score"""
-    if 'user_id' not in session:
-        return jsonify({'status': 'error'}), 401
-    
-    try:
-        data = request.json
-        scores = data.get('scores', [])
-        exercise = data.get('exercise', 'General')
-        reps = data.get('reps', 0)
-        
-        if scores:
-            avg_score = sum(scores) / len(scores)
-        else:
-            avg_score = 0
-        
-        conn = get_db_connection()
-        conn.execute(
-            "INSERT INTO exercise_logs (user_id, exercise_name, duration, date, posture_score) VALUES (?, ?, ?, ?, ?)",
-            (session['user_id'], exercise, reps, datetime.now().strftime("%Y-%m-%d"), int(avg_score))
-        )
-        conn.commit()
-        conn.close()
-        
-        return jsonify({
-            'status': 'success',
-            'avg_score': round(avg_score, 1),
-            'total_reps': reps
-        })
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
-
-@app.route('/reminders', methods=['GET', 'POST'])
-def reminder_manager():
-    if 'user_id' not in session: return redirect(url_for('login'))
-    
-    if request.method == 'POST':
-        title = request.form['title']
-        time = request.form['time']
-        rtype = request.form['type']
-        
-        conn = get_db_connection()
-        conn.execute("INSERT INTO reminders (user_id, title, time, type) VALUES (?, ?, ?, ?)",
-                     (session['user_id'], title, time, rtype))
-        conn.commit()
-        conn.close()
-        return redirect(url_for('dashboard'))
-        
-    return render_template('reminders.html')
-
-@app.route('/doctor_portal')
-def doctor_portal():
-    if 'user_id' not in session or session.get('role') != 'doctor':
-        return redirect(url_for('dashboard'))
-        
-    conn = get_db_connection()
-    patients = conn.execute("SELECT * FROM users WHERE role = 'patient'").fetchall()
-    alerts = conn.execute("""
-        SELECT a.*, u.name 
-        FROM alerts a 
-        JOIN users u ON a.patient_id = u.id 
-        WHERE a.is_read = 0
-    """).fetchall()
-    conn.close()
-    
-    return render_template('doctor_portal.html', patients=patients, alerts=alerts)
-
-if __name__ == "__main__":
-    init_db()
+from flask import Flask, Response, stream_with_context, render_template, request, redirect, url_for, session, jsonify, flash
+import sqlite3
+from werkzeug.security import generate_password_hash, check_password_hash
+from datetime import datetime, timedelta
+import json
+import os
+import threading
+
+# The inference stack (cv2, torch, ultralytics) is imported lazily by the
+# posture endpoints, so every other route is served without loading it
+from inference_pool import get_pool, InferenceBusy
+from pose_pipeline import process_pose_frame
+from posture_stream import register_posture_stream
+import metrics
+from metrics import timed
+import storage
+from storage import get_db
+import migrations
+import patient_summary
+from ingest import get_ingest, install_shutdown_flush
+import posture_sessions
+import alert_rules
+import pubsub
+import portal_feed
+import glucose_store
+import exercise_rollups
+from reminder_scheduler import get_scheduler
+from pose_tracker import trackers
+
+app = Flask(__name__)
+app.secret_key = "zenmed_secret_key_secure_production"
+
+# Load and warm up the model in the background after the first request
+PRELOAD_MODEL = os.environ.get("ZENMED_PRELOAD_MODEL", "1") == "1"
+# Addresses that may read /metrics and /inference_stats without a doctor login (comma separated)
+METRICS_ALLOW = {addr.strip() for addr in os.environ.get("ZENMED_METRICS_ALLOW", "127.0.0.1,::1").split(",")
+                 if addr.strip()}
+_preload_started = False
+
+# Persistent /ws/posture streaming channel (needs flask-sock)
+register_posture_stream(app)
+
+# Pooled, WAL-mode SQLite connections - one per request, returned at teardown
+storage.init_app(app)
+
+def init_db():
+    """Bring the schema up to date (cheap no-op when it already is)"""
+    with storage.connection() as conn:
+        migrations.migrate(conn)
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+@app.before_request
+def ensure_schema():
+    global _schema_ready
+    if not _schema_ready:
+        with _schema_lock:
+            if not _schema_ready:
+                init_db()
+                _schema_ready = True
+
+@app.route('/')
+def index():
+    if 'user_id' in session:
+        return redirect(url_for('dashboard'))
+    return render_template('index.html')
+
+@app.route('/register', methods=['GET', 'POST'])
+def register():
+    if request.method == 'POST':
+        name = request.form['name']
+        email = request.form['email']
+        password = generate_password_hash(request.form['password'])
+        role = request.form.get('role', 'patient')
+        language = request.form.get('language', 'en')
+
+        conn = get_db()
+        try:
+            cursor = conn.execute(
+                "INSERT INTO users (name, email, password, role, language) VALUES (?, ?, ?, ?, ?)",
+                (name, email, password, role, language)
+            )
+            if role == 'patient':
+                patient_summary.add_patient(conn, cursor.lastrowid, name)
+            conn.commit()
+            flash("Registration Successful! Please Login.")
+        except sqlite3.IntegrityError:
+            flash("Email already exists!")
+            return render_template('register.html', error="Email already exists!")
+        
+        return redirect(url_for('login'))
+
+    return render_template('register.html')
+
+@app.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        email = request.form['email']
+        password = request.form['password']
+
+        conn = get_db()
+        user = conn.execute("SELECT * FROM users WHERE email = ?", (email,)).fetchone()
+
+        if user and check_password_hash(user['password'], password):
+            session['user_id'] = user['id']
+            session['user_name'] = user['name']
+            session['role'] = user['role']
+            session['lang'] = user['language']
+            return redirect(url_for('dashboard'))
+        else:
+            return render_template('login.html', error="Invalid Credentials")
+
+    return render_template('login.html')
+
+@app.route('/logout')
+def logout():
+    session.clear()
+    return redirect(url_for('login'))
+
+@app.route('/dashboard')
+def dashboard():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    user_id = session['user_id']
+    # Queued writes from this user land before we read them back
+    get_ingest().wait_for_user(user_id)
+    conn = get_db()
+
+    exercise_data = conn.execute("SELECT * FROM exercise_logs WHERE user_id = ? ORDER BY date DESC LIMIT 5", (user_id,)).fetchall()
+    reminders = conn.execute("SELECT * FROM reminders WHERE user_id = ? AND active = 1", (user_id,)).fetchall()
+
+    
+    return render_template('dashboard.html', 
+                           user=session, 
+                           exercises=exercise_data, 
+                           reminders=reminders)
+
+@app.route('/exercises', methods=['GET', 'POST'])
+def add_exercise():
+    if 'user_id' not in session: return redirect(url_for('login'))
+    
+    if request.method == 'POST':
+        name = request.form.get('exercise_name')
+        duration = request.form.get('duration')
+        
+        today = datetime.now().strftime("%Y-%m-%d")
+        try:
+            get_ingest().submit_exercise(session['user_id'], name, duration, today)
+        except ValueError as e:
+            flash(f"Could not save exercise: {e}")
+            return redirect(url_for('add_exercise'))
+        return redirect(url_for('dashboard'))
+        
+    return render_template('add_exercise.html')
+
+@app.route('/nutrition', methods=['GET', 'POST'])
+def nutrition():
+    if 'user_id' not in session: return redirect(url_for('login'))
+
+    user_plan = None
+    
+    if request.method == 'POST':
+        location = request.form.get('location')
+        pref = request.form.get('preference')
+        plan = {
+            "breakfast": "Idli with Sambar (2 pcs) - Low GI",
+            "lunch": "Brown Rice (1 cup) with Greens (Keerai) and Rasam",
+            "dinner": "Chapati (2 pcs) with Dal",
+            "snacks": "Roasted Chana or Fruit Salad"
+        }
+        
+        if pref == 'Non-Veg':
+            plan['breakfast'] = "Idly with Egg Curry (1 egg)"
+            plan['lunch'] = "Brown Rice with Fish Curry (Small portion)"
+            plan['dinner'] = "Chapati with Chicken gravy(Small portion)"
+            plan['snacks'] = "Boiled egg or chicken soup (small bowl)"
+        
+        if location and "Madurai" in location:
+             plan['breakfast'] = "Millet Pongal (Limited Ghee)"
+
+        conn = get_db()
+        conn.execute("INSERT INTO diet_plans (user_id, plan_json) VALUES (?, ?)", 
+                     (session['user_id'], json.dumps(plan)))
+        conn.commit()
+        
+        user_plan = plan
+        flash("New Diet Plan Generated & Saved!", "success")
+        
+    else:
+        conn = get_db()
+        row = conn.execute("SELECT plan_json FROM diet_plans WHERE user_id = ? ORDER BY id DESC LIMIT 1", 
+                           (session['user_id'],)).fetchone()
+        if row:
+            user_plan = json.loads(row['plan_json'])
+        
+    return render_template('nutrition.html', plan=user_plan)
+
+@app.route('/posture')
+def posture_ai():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    return render_template('posture.html', camera_available=True)
+
+
+def _preload_inference():
+    """Start the worker pool, or import the inline inference stack"""
+    try:
+        if get_pool() is None:
+            import advanced_pose_detector
+            import posture_detector
+    except Exception as e:
+        print(f"✗ Inference preload failed: {e}")
+
+@app.before_request
+def start_inference_preload():
+    global _preload_started
+    if PRELOAD_MODEL and not _preload_started:
+        _preload_started = True
+        threading.Thread(target=_preload_inference, name="inference-preload", daemon=True).start()
+
+def keypoints_only():
+    """Response mode: ?mode=keypoints or X-Response-Mode: keypoints skips server-side rendering"""
+    mode = request.args.get('mode') or request.headers.get('X-Response-Mode', '')
+    return mode.lower() == 'keypoints'
+
+def busy_response(error):
+    """Fast 503 when the inference queue is full"""
+    response = jsonify({'status': 'busy', 'msg': 'Server busy, please retry', 'retry_after': error.retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+@app.route('/frame_detect', methods=['POST'])
+def frame_detect():
+    if 'user_id' not in session:
+        return jsonify({'status': 'error', 'msg': 'Not authenticated'}), 401
+
+    metrics.frames.inc('frame_detect')
+    try:
+        with timed('frame_detect', 'total'):
+            with timed('frame_detect', 'parse'):
+                frame = request.files['frame'].read()
+            render = not keypoints_only()
+
+            result = process_pose_frame(frame, render=render, user_id=session['user_id'],
+                                        session_id=request.form.get('session_id'))
+
+        if 'error' in result:
+            return jsonify({'status': 'error', 'msg': result['error']})
+
+        return jsonify({'status': 'success', **result})
+
+    except InferenceBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        metrics.errors.inc('frame_detect', 'request')
+        return jsonify({'status': 'error', 'msg': str(e)})
+
+@app.route('/save_posture_score', methods=['POST'])
+def save_posture_score():
+    if 'user_id' not in session: return jsonify({'status': 'error'})
+    data = request.get_json(silent=True) or {}
+    score = data.get('score')
+    exercise = data.get('exercise', 'General')
+    duration = data.get('duration', 15)
+    
+    today = datetime.now().strftime("%Y-%m-%d")
+    try:
+        get_ingest().submit_exercise(session['user_id'], exercise, duration, today, score)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'msg': str(e)}), 400
+    return jsonify({'status': 'success'})
+
+@app.route('/detect_posture', methods=['POST'])
+def detect_posture_endpoint():
+    if 'user_id' not in session:
+        return jsonify({'status': 'error'}), 401
+
+    metrics.frames.inc('detect_posture')
+    try:
+        with timed('detect_posture', 'total'):
+            with timed('detect_posture', 'parse'):
+                frame = request.files['frame'].read()
+            render = not keypoints_only()
+
+            pool = get_pool()
+            if pool is not None:
+                result = pool.run('posture', frame, render=render)
+            else:
+                from posture_detector import analyze_frame_for_web
+
+                result = analyze_frame_for_web(frame, render=render)
+
+        return jsonify({'status': 'success', **result})
+    except InferenceBusy as e:
+        return busy_response(e)
+    except Exception as e:
+        metrics.errors.inc('detect_posture', 'request')
+        return jsonify({'status': 'error', 'message': str(e)})
+
+def _ops_allowed():
+    """Operational endpoints: a local scraper, or a logged-in doctor"""
+    return request.remote_addr in METRICS_ALLOW or session.get('role') == 'doctor'
+
+@app.route('/inference_stats')
+def inference_stats():
+    if not _ops_allowed():
+        return jsonify({'status': 'error'}), 403
+    pool = get_pool()
+    if pool is None:
+        return jsonify({'workers': 0, 'mode': 'inline'})
+    return jsonify(pool.stats())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if not _ops_allowed():
+        return Response("forbidden\n", status=403, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def _queue_depth():
+    pool = get_pool()
+    return pool.queue_depth() if pool is not None else None
+
+def _average_batch_size():
+    from pose_batcher import _batcher
+    return round(_batcher.average_batch_size(), 2) if _batcher is not None else None
+
+def _ingest_pending():
+    from ingest import _ingest
+    return _ingest.pending() if _ingest is not None else None
+
+metrics.register_gauge('zenmed_inference_queue_depth', 'Jobs waiting for an inference worker', _queue_depth)
+metrics.register_gauge('zenmed_pose_batch_size_avg', 'Average frames per batched model call', _average_batch_size)
+metrics.register_gauge('zenmed_posture_sessions_open', 'Posture sessions started and not yet ended',
+                       lambda: len(posture_sessions.sessions))
+metrics.register_gauge('zenmed_sse_subscribers', 'Open Server-Sent Events connections',
+                       pubsub.hub.subscriber_count)
+metrics.register_gauge('zenmed_ingest_pending_rows', 'Exercise log rows queued but not yet committed',
+                       _ingest_pending)
+
+@app.route('/analyze_posture_batch', methods=['POST'])
+def analyze_posture_batch():
+    """Analyze multiple frames and return aggregated posture score"""
+    if 'user_id' not in session:
+        return jsonify({'status': 'error'}), 401
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        scores = data.get('scores', [])
+        exercise = data.get('exercise', 'General')
+        reps = data.get('reps', 0)
+        
+        try:
+            if not isinstance(scores, list):
+                raise ValueError("scores must be a list")
+            if scores:
+                avg_score = sum(float(score) for score in scores) / len(scores)
+            else:
+                avg_score = 0
+            today = datetime.now().strftime("%Y-%m-%d")
+            get_ingest().submit_exercise(session['user_id'], exercise, reps, today, avg_score)
+        except (TypeError, ValueError, OverflowError) as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        
+        return jsonify({
+            'status': 'success',
+            'avg_score': round(avg_score, 1),
+            'total_reps': reps
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/posture_session/start', methods=['POST'])
+def start_posture_session():
+    """Open a server-side session - pass its id with each /frame_detect (session_id) or /ws/posture (session)"""
+    if 'user_id' not in session:
+        return jsonify({'status': 'error'}), 401
+    data = request.get_json(silent=True) or {}
+    # Reps are counted from this session's frames only
+    trackers.reset(session['user_id'])
+    posture_session = posture_sessions.sessions.start(session['user_id'], data.get('exercise', 'General'))
+    return jsonify({'status': 'success', 'session_id': posture_session.session_id,
+                    'ttl_s': posture_sessions.SESSION_TTL_S})
+
+@app.route('/posture_session/<session_id>/frame', methods=['POST'])
+def posture_session_frame(session_id):
+    """Add a score computed on the client (frames analysed by the server are added automatically)"""
+    if 'user_id' not in session:
+        return jsonify({'status': 'error'}), 401
+    data = request.get_json(silent=True) or {}
+    try:
+        score = float(data['score'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'status': 'error', 'msg': 'score is required'}), 400
+    if not 0 <= score <= 100:
+        return jsonify({'status': 'error', 'msg': 'score must be between 0 and 100'}), 400
+    try:
+        reps = _reps(data.get('reps'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'msg': str(e)}), 400
+    posture_session = posture_sessions.sessions.frame(session_id, session['user_id'], score, reps)
+    if posture_session is None:
+        return jsonify({'status': 'error', 'msg': 'Unknown or expired session'}), 404
+    return jsonify({'status': 'success', 'session': posture_session.running()})
+
+def _reps(value):
+    """Client-counted reps: None, or a non-negative int (ValueError otherwise)"""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError('reps must be a whole number')
+    try:
+        reps = int(value)
+    except (ValueError, OverflowError):
+        raise ValueError('reps must be a whole number') from None
+    if not 0 <= reps <= 100000:
+        raise ValueError('reps must be between 0 and 100000')
+    return reps
+
+@app.route('/posture_session/<session_id>/end', methods=['POST'])
+def end_posture_session(session_id):
+    """Close the session and save its summary"""
+    if 'user_id' not in session:
+        return jsonify({'status': 'error'}), 401
+    data = request.get_json(silent=True) or {}
+    try:
+        reps = _reps(data.get('reps'))
+    except ValueError as e:
+        return jsonify({'status': 'error', 'msg': str(e)}), 400
+    posture_session = posture_sessions.sessions.end(session_id, session['user_id'])
+    if posture_session is None:
+        return jsonify({'status': 'error', 'msg': 'Unknown or expired session'}), 404
+
+    # Client-side rep counting, when the server never saw a rep
+    if not posture_session.reps and reps:
+        posture_session.reps = reps
+
+    summary = posture_sessions.persist(get_db(), posture_session)
+    return jsonify({'status': 'success', 'summary': summary})
+
+@app.route('/glucose', methods=['GET', 'POST'])
+def glucose_tracker():
+    if 'user_id' not in session: return redirect(url_for('login'))
+
+    if request.method == 'POST':
+        day = request.form.get('date') or datetime.now().strftime("%Y-%m-%d")
+        try:
+            # Logged today: now; an earlier day: that day at noon
+            if day == datetime.now().strftime("%Y-%m-%d"):
+                taken_at = int(datetime.now().timestamp())
+            else:
+                taken_at = glucose_store.parse_time(f"{day}T12:00")
+            readings = [{'t': taken_at, 'value': request.form[kind], 'kind': kind}
+                        for kind in ('fasting', 'post_meal') if request.form.get(kind)]
+            rows = glucose_store.normalize(readings)
+        except ValueError:
+            flash("Please enter valid glucose levels.")
+            return redirect(url_for('glucose_tracker'))
+
+        if not rows:
+            flash("Please enter valid glucose levels.")
+            return redirect(url_for('glucose_tracker'))
+
+        saved = glucose_store.add_readings(get_db(), session['user_id'], rows)
+        # Readings are unique per time and type: a past day's entries all share its noon
+        # timestamp, so only there (or on a resubmitted form) can one be skipped
+        if saved == len(rows):
+            flash("Glucose reading saved!")
+        elif day != datetime.now().strftime("%Y-%m-%d"):
+            flash(f"{'Some readings saved. ' if saved else ''}A reading of the same type was already "
+                  f"logged for {day} (past days keep one per type) - the earlier value was kept.")
+        else:
+            flash("This reading was already saved.")
+        return redirect(url_for('glucose_tracker'))
+
+    return render_template('add_glucose.html', current_date=datetime.now().strftime("%Y-%m-%d"))
+
+@app.route('/api/glucose/readings', methods=['POST'])
+def glucose_readings():
+    """Bulk upload, e.g. from a CGM bridge: {"readings": [{"t": epoch | ISO 8601, "value": mg/dL, "kind": "cgm"}]}"""
+    if 'user_id' not in session:
+        return jsonify({'status': 'error'}), 401
+    readings = (request.get_json(silent=True) or {}).get('readings') or []
+    if len(readings) > glucose_store.MAX_BATCH:
+        return jsonify({'status': 'error', 'msg': f'At most {glucose_store.MAX_BATCH} readings per request'}), 413
+    try:
+        rows = glucose_store.normalize(readings)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'msg': str(e)}), 400
+    added = glucose_store.add_readings(get_db(), session['user_id'], rows)
+    return jsonify({'status': 'success', 'received': len(rows), 'added': added})
+
+@app.route('/api/glucose/series')
+def glucose_series():
+    """Chart-sized series: ?days=90, or ?start=&end= in epoch seconds; doctors may pass ?user_id="""
+    if 'user_id' not in session:
+        return jsonify({'status': 'error'}), 401
+    user_id = session['user_id']
+    if session.get('role') == 'doctor':
+        user_id = request.args.get('user_id', user_id, type=int)
+
+    points = min(max(request.args.get('points', glucose_store.MAX_POINTS, type=int), 10), 2000)
+    start, end = request.args.get('start', type=int), request.args.get('end', type=int)
+    if start is not None and end is not None:
+        if not 0 <= start < end <= glucose_store.MAX_TIME:
+            return jsonify({'status': 'error',
+                            'msg': f'start and end must satisfy 0 <= start < end <= {glucose_store.MAX_TIME}'}), 400
+        result = glucose_store.series(get_db(), user_id, start, end, points)
+    else:
+        days = min(max(request.args.get('days', 7, type=int), 1), 366)
+        result = glucose_store.recent_series(get_db(), user_id, days, max_points=points)
+    return jsonify({'status': 'success', **result})
+
+@app.route('/api/exercise/trend')
+def exercise_trend():
+    """Daily (week, month) or monthly (year) exercise totals: ?range=week|month|year[&exercise=Squat]"""
+    if 'user_id' not in session:
+        return jsonify({'status': 'error'}), 401
+    range_name = request.args.get('range', 'week')
+    if range_name not in exercise_rollups.TREND_RANGES:
+        return jsonify({'status': 'error', 'msg': 'range must be week, month or year'}), 400
+    user_id = session['user_id']
+    if session.get('role') == 'doctor':
+        user_id = request.args.get('user_id', user_id, type=int)
+
+    # Include this user's queued writes
+    get_ingest().wait_for_user(user_id)
+    result = exercise_rollups.trend(get_db(), user_id, range_name, request.args.get('exercise'))
+    return jsonify({'status': 'success', **result})
+
+@app.route('/reminders', methods=['GET', 'POST'])
+def reminder_manager():
+    if 'user_id' not in session: return redirect(url_for('login'))
+    
+    if request.method == 'POST':
+        title = request.form['title']
+        time = request.form['time']
+        rtype = request.form['type']
+        
+        conn = get_db()
+        cursor = conn.execute("INSERT INTO reminders (user_id, title, time, type) VALUES (?, ?, ?, ?)",
+                              (session['user_id'], title, time, rtype))
+        conn.commit()
+        get_scheduler().add(cursor.lastrowid, session['user_id'], title, time, rtype)
+        return redirect(url_for('dashboard'))
+
+    reminders = get_db().execute("SELECT * FROM reminders WHERE user_id = ? AND active = 1 ORDER BY time",
+                                 (session['user_id'],)).fetchall()
+    return render_template('reminders.html', reminders=reminders)
+
+@app.route('/reminders/<int:reminder_id>/deactivate', methods=['POST'])
+def deactivate_reminder(reminder_id):
+    if 'user_id' not in session: return redirect(url_for('login'))
+
+    conn = get_db()
+    cursor = conn.execute("UPDATE reminders SET active = 0 WHERE id = ? AND user_id = ?",
+                          (reminder_id, session['user_id']))
+    conn.commit()
+    if cursor.rowcount:
+        get_scheduler().remove(reminder_id)
+    return redirect(url_for('reminder_manager'))
+
+@app.route('/events')
+def user_events():
+    """Server-Sent Events for the logged-in user (due reminders)"""
+    if 'user_id' not in session:
+        return jsonify({'status': 'error'}), 401
+    # Make sure reminders are being scheduled before anyone waits on them
+    get_scheduler()
+    subscription = pubsub.hub.subscribe(pubsub.user_topic(session['user_id']))
+    response = Response(stream_with_context(pubsub.event_stream(subscription)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Newest unread alerts listed on the doctor portal (the rest are counted)
+ALERTS_SHOWN = 20
+
+@app.route('/doctor_portal')
+def doctor_portal():
+    if 'user_id' not in session or session.get('role') != 'doctor':
+        return redirect(url_for('dashboard'))
+        
+    sort, direction = patient_summary.resolve_sort(request.args.get('sort'), request.args.get('dir'))
+    after = patient_summary.decode_cursor(request.args.get('after'))
+    before = patient_summary.decode_cursor(request.args.get('before'))
+    # Shown only - the cursors decide which rows are on the page
+    page = max(1, request.args.get('page', 1, type=int))
+
+    conn = get_db()
+    patient_summary.refresh_stale(conn)
+    alert_rules.check_missed_exercise(conn)
+    patients, total, previous_cursor, next_cursor = patient_summary.page(conn, sort, direction, after, before)
+    alerts = conn.execute("""
+        SELECT a.*, u.name 
+        FROM alerts a 
+        JOIN users u ON a.patient_id = u.id 
+        WHERE a.is_read = 0
+        ORDER BY a.created_at DESC
+        LIMIT ?
+    """, (ALERTS_SHOWN,)).fetchall()
+    unread_alerts = conn.execute("SELECT COUNT(*) FROM alerts WHERE is_read = 0").fetchone()[0]
+    
+    pages = max(1, -(-total // patient_summary.PAGE_SIZE))
+    if previous_cursor is None:
+        page = 1
+    return render_template('doctor_portal.html', patients=patients, alerts=alerts,
+                           unread_alerts=unread_alerts, alerts_shown=ALERTS_SHOWN, total_patients=total,
+                           page=min(page, pages), pages=pages, sort=sort, direction=direction,
+                           previous_cursor=previous_cursor, next_cursor=next_cursor)
+
+@app.route('/doctor_portal/stream')
+def doctor_portal_stream():
+    """Server-Sent Events: 'alert' for each new alert, 'patient' for each changed patient summary"""
+    if 'user_id' not in session or session.get('role') != 'doctor':
+        return jsonify({'status': 'error'}), 403
+    subscription = pubsub.hub.subscribe(portal_feed.TOPIC)
+    response = Response(stream_with_context(pubsub.event_stream(subscription)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+if __name__ == "__main__":
+    init_db()
+    install_shutdown_flush()
     app.run(debug=True)  
\ No newline at end of file
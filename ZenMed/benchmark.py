@@ -0,0 +1,264 @@
+"""
+Pose Pipeline Benchmarks for ZenMed
+Times the per-frame functions on synthetic frames and keypoint fixtures.
+By default a deterministic stub stands in for best.pt, so no weights or
+camera are needed; --real runs the trained model instead.
+
+Usage:
+  python benchmark.py                           run everything, compare to benchmark_baseline.json if present
+  python benchmark.py --only analyze,detect     run benchmarks whose name contains any of the words
+  python benchmark.py --save-baseline           store this run as the baseline
+  python benchmark.py --real                    use poster-/best.pt instead of the stub model
+Exits with status 1 when a benchmark is slower than the baseline by more than ZENMED_BENCH_TOLERANCE.
+"""
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import model_registry
+from model_registry import MODEL_PATH
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "benchmark_baseline.json")
+# Allowed slowdown against the baseline before a benchmark counts as a regression
+TOLERANCE = float(os.environ.get("ZENMED_BENCH_TOLERANCE", "0.25"))
+MIN_SECONDS = float(os.environ.get("ZENMED_BENCH_SECONDS", "0.5"))
+
+FRAME_SIZE = (640, 480)
+
+# Standing pose (COCO order) on a 640 x 480 frame, legs bent by fixture_pose()
+STANDING_POSE = np.array([
+    [320, 60], [310, 52], [330, 52], [298, 58], [342, 58],
+    [285, 110], [355, 110], [270, 170], [370, 170], [262, 225], [378, 225],
+    [295, 235], [345, 235], [293, 325], [347, 325], [291, 415], [349, 415],
+], dtype=np.float32)
+
+def fixture_pose(left_knee=175.0, right_knee=175.0, size=FRAME_SIZE):
+    """STANDING_POSE with the knees bent to the given angles, scaled to size"""
+    pose = STANDING_POSE.copy()
+    for knee, ankle, angle in ((13, 15, left_knee), (14, 16, right_knee)):
+        shin = np.linalg.norm(pose[ankle] - pose[knee])
+        bend = np.radians(180.0 - angle)
+        pose[ankle] = pose[knee] + shin * np.array([np.sin(bend), np.cos(bend)], dtype=np.float32)
+    scale = np.array([size[0] / FRAME_SIZE[0], size[1] / FRAME_SIZE[1]], dtype=np.float32)
+    return pose * scale
+
+def keypoint_fixtures(count=64, seed=0):
+    """(count, 17, 2) poses covering standing, squats and lunges, plus confidences"""
+    rng = np.random.default_rng(seed)
+    lefts = rng.uniform(60, 180, count)
+    rights = np.where(rng.random(count) < 0.3, rng.uniform(60, 180, count), lefts + rng.normal(0, 5, count))
+    poses = np.stack([fixture_pose(l, r) for l, r in zip(lefts, rights)])
+    poses += rng.normal(0, 1.5, poses.shape).astype(np.float32)
+    confidences = rng.uniform(0.6, 1.0, (count, 17)).astype(np.float32)
+    return poses, confidences
+
+def synthetic_frame(size=FRAME_SIZE, seed=0):
+    """Deterministic textured BGR frame"""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    return cv2.GaussianBlur(frame, (9, 9), 0)
+
+class _StubTensor(np.ndarray):
+    """ndarray with the .cpu().numpy() calls the detectors make on torch tensors"""
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return np.asarray(self)
+
+def _tensor(values):
+    return np.asarray(values, dtype=np.float32).view(_StubTensor)
+
+class _StubKeypoints:
+    def __init__(self, xy, conf):
+        self.xy = _tensor(xy[None])
+        self.conf = _tensor(conf[None])
+
+class _StubBoxes:
+    def __init__(self, box, conf):
+        self.xyxy = _tensor([box])
+        self.conf = _tensor([conf])
+        self.data = _tensor([list(box) + [conf, 0.0]])
+
+    def __len__(self):
+        return len(self.xyxy)
+
+class _StubResult:
+    def __init__(self, image, keypoints, keypoints_conf):
+        self.orig_img = image
+        self.keypoints = _StubKeypoints(keypoints, keypoints_conf)
+        box = np.concatenate([keypoints.min(axis=0), keypoints.max(axis=0)])
+        self.boxes = _StubBoxes(box, 0.9)
+
+    def plot(self):
+        from advanced_pose_detector import create_knee_overlay
+        return create_knee_overlay(self.orig_img, self.keypoints.xy[0], self.keypoints.conf[0])
+
+class StubPoseModel:
+    """
+    Deterministic stand-in for the YOLO pose model: every image gets the
+    same fixture pose scaled to its size, so results never vary between runs
+    """
+
+    def __init__(self, left_knee=95.0, right_knee=100.0):
+        self.left_knee = left_knee
+        self.right_knee = right_knee
+        self.calls = 0
+
+    def __call__(self, source, conf=0.5, verbose=False, **kwargs):
+        self.calls += 1
+        images = source if isinstance(source, list) else [source]
+        results = []
+        for image in images:
+            height, width = image.shape[:2]
+            keypoints = fixture_pose(self.left_knee, self.right_knee, (width, height))
+            results.append(_StubResult(image, keypoints, np.full(17, 0.9, dtype=np.float32)))
+        return results
+
+def install_stub_model():
+    """Make get_model(MODEL_PATH) serve the stub for this process"""
+    model_registry.registry.reload_check_s = 0
+    return model_registry.registry.install(MODEL_PATH, StubPoseModel(), "stub", engine="stub")
+
+def measure(fn, min_seconds=MIN_SECONDS):
+    """
+    Time fn() for at least min_seconds, then trace its allocations on a few more calls
+    Returns: calls per second, mean microseconds, peak bytes allocated during a call
+    """
+    fn()
+    calls = 0
+    started = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - started
+
+    # Peak traced memory during a call: Python objects plus NumPy buffers
+    samples = max(1, min(calls, 20))
+    peaks = []
+    tracemalloc.start()
+    for _ in range(samples):
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - baseline)
+    tracemalloc.stop()
+
+    return {
+        'calls_per_s': round(calls / elapsed, 1),
+        'mean_us': round(elapsed / calls * 1e6, 1),
+        'peak_alloc_bytes': int(np.median(peaks)),
+    }
+
+def build_benchmarks():
+    """name -> zero-argument callable, all sharing the same fixtures"""
+    import cv2
+    import advanced_pose_detector as apd
+    import posture_detector
+    from joint_angles import joint_angles
+    from pose_tracker import PoseTracker
+
+    frame = synthetic_frame()
+    _, jpeg = cv2.imencode('.jpg', frame)
+    jpeg = jpeg.tobytes()
+    poses, confidences = keypoint_fixtures()
+    pose, pose_conf = poses[0], confidences[0]
+    roi = (200, 20, 440, 460)
+    tracker = PoseTracker()
+    cursor = [0]
+
+    def track():
+        cursor[0] = (cursor[0] + 1) % len(poses)
+        tracker.update(poses[cursor[0]], confidences[cursor[0]])
+
+    return {
+        'detect_knees_and_pose': lambda: apd.detect_knees_and_pose(frame),
+        'infer_poses_x8': lambda: apd.infer_poses([frame] * 8, render=False),
+        'infer_poses_roi_x8': lambda: apd.infer_poses([frame] * 8, render=False, rois=[roi] * 8),
+        'calculate_pose_quality': lambda: apd.calculate_pose_quality(pose, pose_conf),
+        'analyze_leg_form': lambda: apd.analyze_leg_form(pose, pose_conf),
+        'analyze_leg_form_batch_x64': lambda: apd.analyze_leg_form_batch(poses, confidences),
+        'detect_exercises': lambda: apd.detect_exercises(pose),
+        'detect_exercises_batch_x64': lambda: apd.detect_exercises_batch(poses),
+        'joint_angles_x64': lambda: joint_angles(poses, confidences),
+        'create_knee_overlay': lambda: apd.create_knee_overlay(frame, pose, pose_conf),
+        'frame_feedback_keypoints': lambda: apd.frame_feedback(frame, pose, "stub", pose_conf, render=False),
+        'frame_feedback_render': lambda: apd.frame_feedback(frame, pose, "stub", pose_conf, render=True),
+        'process_frame_for_web': lambda: posture_detector.process_frame_for_web(jpeg),
+        'pose_tracker_update': track,
+    }
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Names of benchmarks whose mean time grew by more than tolerance"""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            result['vs_baseline'] = None
+            continue
+        ratio = result['mean_us'] / previous['mean_us'] if previous['mean_us'] else 1.0
+        result['vs_baseline'] = round(ratio, 2)
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+def main(argv):
+    real = '--real' in argv
+    only = None
+    if '--only' in argv:
+        only = argv[argv.index('--only') + 1].split(',')
+
+    if real:
+        if model_registry.get_model(MODEL_PATH) is None:
+            print("✗ --real needs poster-/best.pt and ultralytics")
+            return 1
+    else:
+        install_stub_model()
+
+    baseline_path = BASELINE_PATH if not real else BASELINE_PATH.replace('.json', '_real.json')
+    results = {}
+    for name, fn in build_benchmarks().items():
+        if only and not any(word in name for word in only):
+            continue
+        results[name] = measure(fn)
+
+    baseline = {}
+    if os.path.exists(baseline_path) and '--save-baseline' not in argv:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline)
+
+    print(f"{'benchmark':<28}{'calls/s':>10}{'mean µs':>11}{'peak KB':>10}{'vs base':>9}")
+    for name, result in results.items():
+        ratio = result.get('vs_baseline')
+        mark = "  ✗" if name in regressions else ""
+        print(f"{name:<28}{result['calls_per_s']:>10}{result['mean_us']:>11}"
+              f"{result['peak_alloc_bytes'] / 1024:>10.1f}"
+              f"{(f'{ratio:.2f}x' if ratio else '-'):>9}{mark}")
+
+    if '--save-baseline' in argv:
+        with open(baseline_path, 'w') as f:
+            json.dump({name: {k: v for k, v in result.items() if k != 'vs_baseline'}
+                       for name, result in results.items()}, f, indent=2)
+        print(f"✓ Baseline saved to {baseline_path}")
+        return 0
+
+    if regressions:
+        print(f"✗ {len(regressions)} regression(s) beyond {TOLERANCE:.0%}: {', '.join(regressions)}")
+        return 1
+    if baseline:
+        print("✓ No regressions against the baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
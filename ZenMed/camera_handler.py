@@ -1,123 +1,280 @@
-"""
-Robust Camera Handler for Windows
-Handles camera initialization issues and provides fallbacks
-"""
-
-import cv2
-import os
-from pathlib import Path
-
-class CameraHandler:
-    def __init__(self):
-        self.cap = None
-        self.camera_available = False
-    
-    def initialize_camera(self, camera_index=0, width=640, height=480):
-        """
-        Initialize camera with proper Windows settings
-        Tries multiple backends and configurations
-        """
-        backends = [
-            (cv2.CAP_DSHOW, "DirectShow"),
-            (cv2.CAP_MSMF, "MSMF"),
-            (cv2.CAP_VFW, "VFW"),
-            (cv2.CAP_V4L2, "V4L2"),
-        ]
-        
-        for backend_id, backend_name in backends:
-            try:
-                print(f"Attempting camera with {backend_name}...")
-                cap = cv2.VideoCapture(camera_index, backend_id)
-                
-                if cap.isOpened():
-                    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-                    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-                    cap.set(cv2.CAP_PROP_FPS, 30)
-                    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-                    
-                    ret, frame = cap.read()
-                    if ret and frame is not None and frame.size > 0:
-                        print(f"✓ Camera initialized with {backend_name}")
-                        self.cap = cap
-                        self.camera_available = True
-                        return True
-                    else:
-                        cap.release()
-                else:
-                    print(f"✗ {backend_name}: Cannot open camera")
-            except Exception as e:
-                print(f"✗ {backend_name} failed: {e}")
-                continue
-        
-        print("✗ No camera backend available")
-        return False
-    
-    def is_available(self):
-        """Check if camera is ready"""
-        return self.camera_available and self.cap is not None and self.cap.isOpened()
-    
-    def get_frame(self):
-        """
-        Get camera frame with error handling
-        Returns: (success: bool, frame: numpy.ndarray or None)
-        """
-        if not self.is_available():
-            return False, None
-        
-        try:
-            ret, frame = self.cap.read()
-            if ret and frame is not None and frame.size > 0:
-                return True, frame
-            else:
-                return False, None
-        except Exception as e:
-            print(f"Error capturing frame: {e}")
-            return False, None
-    
-    def release(self):
-        """Release camera resources"""
-        if self.cap is not None:
-            self.cap.release()
-            self.camera_available = False
-    
-    def __del__(self):
-        self.release()
-
-def get_camera_info():
-    """Print detailed camera and system info"""
-    print("\n=== Camera Diagnostics ===")
-    print(f"OpenCV version: {cv2.__version__}")
-    
-    for i in range(5):
-        cap = cv2.VideoCapture(i)
-        if cap.isOpened():
-            print(f"Camera {i}: Available")
-            print(f"  - Resolution: {int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))}x{int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))}")
-            print(f"  - FPS: {cap.get(cv2.CAP_PROP_FPS)}")
-            cap.release()
-
-if __name__ == "__main__":
-    get_camera_info()
-    
-    print("\nInitializing camera...")
-    cam = CameraHandler()
-    
-    if cam.initialize_camera():
-        print("✓ Camera ready!")
-        
-        for i in range(5):
-            success, frame = cam.get_frame()
-            if success:
-                print(f"Frame {i+1}: {frame.shape}")
-            else:
-                print(f"Frame {i+1}: Failed to capture")
-        
-        cam.release()
-    else:
-        print("✗ Camera initialization failed")
-        print("\nTroubleshooting:")
-        print("1. Check if camera is connected")
-        print("2. Verify camera drivers are up to date")
-        print("3. Check camera permissions in Windows Settings")
-        print("4. Try: Settings > Privacy & Security > Camera")
-        print("5. Restart the application")
+"""
+Robust Camera Handler for Windows
+Handles camera initialization issues and provides fallbacks
+"""
+
+import cv2
+import os
+import threading
+import time
+import numpy as np
+from pathlib import Path
+
+class CameraHandler:
+    def __init__(self):
+        self.cap = None
+        self.camera_available = False
+        
+        # Background grab thread state (see start_capture_thread)
+        self._grab_thread = None
+        self._grab_running = False
+        self._ring = None
+        self._ring_timestamps = None
+        self._latest_slot = -1
+        self._latest_seq = 0
+        # Newest frame any reader has taken (drop counting) / this handler's own callers have seen
+        self._read_seq = 0
+        self._own_seq = 0
+        self._frame_ready = threading.Condition()
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.read_failures = 0
+    
+    def initialize_camera(self, camera_index=0, width=640, height=480):
+        """
+        Initialize camera with proper Windows settings
+        Tries multiple backends and configurations
+        """
+        backends = [
+            (cv2.CAP_DSHOW, "DirectShow"),
+            (cv2.CAP_MSMF, "MSMF"),
+            (cv2.CAP_VFW, "VFW"),
+            (cv2.CAP_V4L2, "V4L2"),
+        ]
+        
+        for backend_id, backend_name in backends:
+            try:
+                print(f"Attempting camera with {backend_name}...")
+                cap = cv2.VideoCapture(camera_index, backend_id)
+                
+                if cap.isOpened():
+                    cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+                    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+                    cap.set(cv2.CAP_PROP_FPS, 30)
+                    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+                    
+                    ret, frame = cap.read()
+                    if ret and frame is not None and frame.size > 0:
+                        print(f"✓ Camera initialized with {backend_name}")
+                        self.cap = cap
+                        self.camera_available = True
+                        return True
+                    else:
+                        cap.release()
+                else:
+                    print(f"✗ {backend_name}: Cannot open camera")
+            except Exception as e:
+                print(f"✗ {backend_name} failed: {e}")
+                continue
+        
+        print("✗ No camera backend available")
+        return False
+    
+    def is_available(self):
+        """Check if camera is ready"""
+        return self.camera_available and self.cap is not None and self.cap.isOpened()
+    
+    def get_frame(self):
+        """
+        Get camera frame with error handling
+        Uses the latest buffered frame when the capture thread is running
+        Returns: (success: bool, frame: numpy.ndarray or None)
+        """
+        if self._grab_running:
+            success, frame, _ = self.get_latest_frame()
+            return success, frame
+        
+        if not self.is_available():
+            return False, None
+        
+        try:
+            ret, frame = self.cap.read()
+            if ret and frame is not None and frame.size > 0:
+                return True, frame
+            else:
+                return False, None
+        except Exception as e:
+            print(f"Error capturing frame: {e}")
+            return False, None
+    
+    def start_capture_thread(self, buffer_size=3):
+        """
+        Grab frames on a background thread into a small preallocated ring buffer
+        so the caller never waits on the camera. buffer_size must be at least 2:
+        one slot being written, one holding the latest frame (readers get copies).
+        """
+        if self._grab_running:
+            return True
+        if not self.is_available():
+            return False
+        
+        ret, frame = self.cap.read()
+        if not ret or frame is None or frame.size == 0:
+            return False
+        
+        buffer_size = max(2, buffer_size)
+        self._ring = np.empty((buffer_size,) + frame.shape, dtype=frame.dtype)
+        self._ring_timestamps = np.zeros(buffer_size)
+        self._ring[0] = frame
+        self._ring_timestamps[0] = time.time()
+        self._latest_slot = 0
+        self._latest_seq = 1
+        self._read_seq = 0
+        self._own_seq = 0
+        
+        self._grab_running = True
+        self._grab_thread = threading.Thread(target=self._grab_loop, name="camera-grab", daemon=True)
+        self._grab_thread.start()
+        return True
+    
+    def stop_capture_thread(self):
+        """Stop the background grab thread, frames are read inline again"""
+        self._grab_running = False
+        if self._grab_thread is not None:
+            self._grab_thread.join(timeout=1.0)
+            self._grab_thread = None
+        with self._frame_ready:
+            self._frame_ready.notify_all()
+    
+    def _grab_loop(self):
+        slots = len(self._ring)
+        while self._grab_running and self.is_available():
+            # Never overwrite the latest frame - readers copy it under the lock
+            slot = (self._latest_slot + 1) % slots
+            
+            try:
+                target = self._ring[slot]
+                ret, frame = self.cap.read(target)
+                if ret and frame is not None and frame is not target:
+                    # OpenCV allocated a new image instead of filling ours
+                    if frame.shape == target.shape:
+                        target[...] = frame
+                    else:
+                        ret = False
+            except Exception as e:
+                print(f"Error capturing frame: {e}")
+                ret = False
+            
+            if not ret:
+                self.read_failures += 1
+                time.sleep(0.01)
+                continue
+            
+            with self._frame_ready:
+                self._ring_timestamps[slot] = time.time()
+                if self._latest_seq > self._read_seq:
+                    # Previous frame was never read here - it is stale now
+                    self.frames_dropped += 1
+                self._latest_slot = slot
+                self._latest_seq += 1
+                self.frames_captured += 1
+                self._frame_ready.notify_all()
+    
+    def get_latest_frame(self, timeout=1.0):
+        """
+        Freshest frame from the capture thread, never one that was already returned
+        to this handler's own callers (shared holders use a CameraReader each).
+        Returns immediately when a new frame is waiting, otherwise waits up to timeout.
+        Returns: (success: bool, frame: numpy.ndarray or None, timestamp: float)
+        """
+        success, frame, timestamp, self._own_seq = self.read_after(self._own_seq, timeout)
+        return success, frame, timestamp
+    
+    def read_after(self, seen_seq, timeout=1.0):
+        """
+        First frame newer than seen_seq, as a copy the caller owns
+        Returns: (success, frame or None, timestamp, seq of the returned frame)
+        """
+        with self._frame_ready:
+            if self._latest_seq <= seen_seq:
+                self._frame_ready.wait_for(
+                    lambda: self._latest_seq > seen_seq or not self._grab_running,
+                    timeout=timeout)
+            if self._latest_seq <= seen_seq:
+                return False, None, 0.0, seen_seq
+            
+            slot = self._latest_slot
+            self._read_seq = self._latest_seq
+            # Copy under the lock: the grab thread may reuse this slot right after
+            return True, self._ring[slot].copy(), float(self._ring_timestamps[slot]), self._latest_seq
+    
+    def capture_stats(self):
+        """Counters for the background capture thread"""
+        return {
+            'frames_captured': self.frames_captured,
+            'frames_dropped': self.frames_dropped,
+            'read_failures': self.read_failures,
+        }
+    
+    def release(self):
+        """Release camera resources"""
+        self.stop_capture_thread()
+        if self.cap is not None:
+            self.cap.release()
+            self.camera_available = False
+    
+    def __del__(self):
+        self.release()
+
+class CameraReader:
+    """
+    One holder's view of a shared CameraHandler
+    Keeps its own last-seen frame so holders do not steal each other's frames;
+    everything else is delegated to the handler
+    """
+    
+    def __init__(self, handler):
+        self.handler = handler
+        self._seen_seq = 0
+    
+    def get_latest_frame(self, timeout=1.0):
+        success, frame, timestamp, self._seen_seq = self.handler.read_after(self._seen_seq, timeout)
+        return success, frame, timestamp
+    
+    def get_frame(self):
+        if self.handler._grab_running:
+            success, frame, _ = self.get_latest_frame()
+            return success, frame
+        return self.handler.get_frame()
+    
+    def __getattr__(self, name):
+        return getattr(self.handler, name)
+
+def get_camera_info():
+    """Print detailed camera and system info"""
+    print("\n=== Camera Diagnostics ===")
+    print(f"OpenCV version: {cv2.__version__}")
+    
+    for i in range(5):
+        cap = cv2.VideoCapture(i)
+        if cap.isOpened():
+            print(f"Camera {i}: Available")
+            print(f"  - Resolution: {int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))}x{int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))}")
+            print(f"  - FPS: {cap.get(cv2.CAP_PROP_FPS)}")
+            cap.release()
+
+if __name__ == "__main__":
+    get_camera_info()
+    
+    print("\nInitializing camera...")
+    cam = CameraHandler()
+    
+    if cam.initialize_camera():
+        print("✓ Camera ready!")
+        
+        for i in range(5):
+            success, frame = cam.get_frame()
+            if success:
+                print(f"Frame {i+1}: {frame.shape}")
+            else:
+                print(f"Frame {i+1}: Failed to capture")
+        
+        cam.release()
+    else:
+        print("✗ Camera initialization failed")
+        print("\nTroubleshooting:")
+        print("1. Check if camera is connected")
+        print("2. Verify camera drivers are up to date")
+        print("3. Check camera permissions in Windows Settings")
+        print("4. Try: Settings > Privacy & Security > Camera")
+        print("5. Restart the application")
@@ -0,0 +1,118 @@
+"""
+On-demand Camera Capture Service for ZenMed
+Opens the camera only while someone holds it, shares one device
+between holders with reference counting, and closes it after an
+idle timeout. Each holder reads through its own CameraReader, so
+every holder sees every fresh frame. Importing this module never
+touches camera hardware.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+CAMERA_INDEX = int(os.environ.get("ZENMED_CAMERA_INDEX", "0"))
+CAMERA_IDLE_TIMEOUT_S = float(os.environ.get("ZENMED_CAMERA_IDLE_TIMEOUT_S", "30"))
+
+class CaptureService:
+    """
+    acquire() opens the camera (or reuses the open one) and returns a CameraReader
+    for the caller alone, release() gives it back. The device is closed once nobody has held it for idle_timeout.
+    """
+
+    def __init__(self, camera_index=CAMERA_INDEX, width=640, height=480,
+                 idle_timeout=CAMERA_IDLE_TIMEOUT_S, threaded=True):
+        self.camera_index = camera_index
+        self.threaded = threaded
+        self.width = width
+        self.height = height
+        self.idle_timeout = idle_timeout
+        self._handler = None
+        self._refs = 0
+        self._idle_timer = None
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Returns a CameraReader on the open camera, or None if no camera could be opened"""
+        from camera_handler import CameraHandler, CameraReader
+
+        with self._lock:
+            self._cancel_idle_timer()
+
+            if self._handler is None or not self._handler.is_available():
+
+                handler = CameraHandler()
+                if not handler.initialize_camera(self.camera_index, self.width, self.height):
+                    return None
+                if self.threaded:
+                    # Holders always get the freshest frame without waiting on capture
+                    handler.start_capture_thread()
+                self._handler = handler
+
+            self._refs += 1
+            return CameraReader(self._handler)
+
+    def release(self):
+        """Drop one reference; the camera closes after the idle timeout"""
+        with self._lock:
+            if self._refs == 0:
+                return
+            self._refs -= 1
+            if self._refs == 0:
+                if self.idle_timeout <= 0:
+                    self._close()
+                else:
+                    self._idle_timer = threading.Timer(self.idle_timeout, self._close_if_idle)
+                    self._idle_timer.daemon = True
+                    self._idle_timer.start()
+
+    @contextmanager
+    def session(self):
+        """with service.session() as camera: ... (camera is None if unavailable)"""
+        handler = self.acquire()
+        try:
+            yield handler
+        finally:
+            if handler is not None:
+                self.release()
+
+    def is_open(self):
+        return self._handler is not None and self._handler.is_available()
+
+    def holders(self):
+        return self._refs
+
+    def close(self):
+        """Close the camera now, regardless of holders"""
+        with self._lock:
+            self._cancel_idle_timer()
+            self._refs = 0
+            self._close()
+
+    def _close_if_idle(self):
+        with self._lock:
+            if self._refs == 0:
+                self._close()
+
+    def _close(self):
+        if self._handler is not None:
+            self._handler.release()
+            self._handler = None
+            print("✓ Camera released")
+
+    def _cancel_idle_timer(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_capture_service():
+    """Shared capture service for the default camera"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = CaptureService()
+    return _service
@@ -0,0 +1,134 @@
+"""
+Daily Exercise Rollups for ZenMed
+One row per patient, day and exercise (minutes, sessions, average and
+best posture score) maintained as exercise logs are written, so weekly,
+monthly and yearly trends read a few hundred rollup rows instead of
+grouping the raw log.
+
+Usage:
+  python exercise_rollups.py backfill     rebuild every rollup from exercise_logs
+"""
+
+import sys
+from datetime import date, timedelta
+
+import storage
+
+DEFAULT_EXERCISE = 'General'
+
+# ?range= value -> (days covered including today, bucket)
+TREND_RANGES = {
+    'week': (7, 'day'),
+    'month': (30, 'day'),
+    'year': (365, 'month'),
+}
+
+def record(conn, rows):
+    """
+    Fold exercise log rows into the daily rollups, in the caller's transaction
+    rows: iterable of (user_id, date 'YYYY-MM-DD', exercise_name, minutes, posture_score or None)
+    Values are expected clean (ints, validated where the row entered - see ingest.clean_row)
+    """
+    conn.executemany("""
+        INSERT INTO exercise_daily (user_id, date, exercise_name, minutes, sessions,
+                                    score_sum, score_count, best_score)
+        VALUES (?, ?, ?, ?, 1, ?, ?, ?)
+        ON CONFLICT(user_id, date, exercise_name) DO UPDATE SET
+            minutes = minutes + excluded.minutes,
+            sessions = sessions + 1,
+            score_sum = score_sum + excluded.score_sum,
+            score_count = score_count + excluded.score_count,
+            -- MAX() of a NULL is NULL in SQLite, so fall back to whichever side has a score
+            best_score = MAX(COALESCE(best_score, excluded.best_score),
+                             COALESCE(excluded.best_score, best_score))
+    """, [(user_id, day, exercise or DEFAULT_EXERCISE, minutes or 0, score or 0,
+           0 if score is None else 1, score)
+          for user_id, day, exercise, minutes, score in rows if user_id is not None and day])
+
+def rebuild(conn):
+    """Recompute every rollup from exercise_logs (migrations, backfill, repairs)"""
+    conn.execute("DELETE FROM exercise_daily")
+    conn.execute("""
+        INSERT INTO exercise_daily (user_id, date, exercise_name, minutes, sessions,
+                                    score_sum, score_count, best_score)
+        SELECT user_id, date, COALESCE(exercise_name, ?), COALESCE(SUM(duration), 0), COUNT(*),
+               COALESCE(SUM(posture_score), 0), COUNT(posture_score), MAX(posture_score)
+        FROM exercise_logs
+        WHERE user_id IS NOT NULL AND date IS NOT NULL
+        GROUP BY user_id, date, COALESCE(exercise_name, ?)
+    """, (DEFAULT_EXERCISE, DEFAULT_EXERCISE))
+    return conn.execute("SELECT COUNT(*) FROM exercise_daily").fetchone()[0]
+
+def _periods(start, today, bucket):
+    if bucket == 'day':
+        return [(start + timedelta(days=i)).isoformat() for i in range((today - start).days + 1)]
+    periods = []
+    year, month = start.year, start.month
+    while (year, month) <= (today.year, today.month):
+        periods.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return periods
+
+def _figures(minutes, sessions, score_sum, score_count, best):
+    return {
+        'minutes': minutes,
+        'sessions': sessions,
+        'avg_score': round(score_sum / score_count, 1) if score_count else None,
+        'best_score': best,
+    }
+
+def trend(conn, user_id, range_name='week', exercise=None, today=None):
+    """
+    Activity per day (week, month) or per month (year), read from the rollups only
+    Every period in the range is present, empty ones with zero minutes.
+    Returns: {'range', 'bucket', 'start', 'end', 'points': [...], 'exercises': {name: figures}}
+    """
+    days, bucket = TREND_RANGES[range_name]
+    today = today or date.today()
+    start = today - timedelta(days=days - 1)
+    period = "date" if bucket == 'day' else "substr(date, 1, 7)"
+
+    sql = f"""
+        SELECT {period} AS period, exercise_name, SUM(minutes), SUM(sessions),
+               SUM(score_sum), SUM(score_count), MAX(best_score)
+        FROM exercise_daily
+        WHERE user_id = ? AND date >= ? AND date <= ?
+    """
+    params = [user_id, start.isoformat(), today.isoformat()]
+    if exercise:
+        sql += " AND exercise_name = ?"
+        params.append(exercise)
+    sql += " GROUP BY period, exercise_name"
+
+    periods = {key: [0, 0, 0.0, 0, None] for key in _periods(start, today, bucket)}
+    exercises = {}
+    for key, name, minutes, sessions, score_sum, score_count, best in conn.execute(sql, params):
+        for totals in (periods.setdefault(key, [0, 0, 0.0, 0, None]),
+                       exercises.setdefault(name, [0, 0, 0.0, 0, None])):
+            totals[0] += minutes
+            totals[1] += sessions
+            totals[2] += score_sum
+            totals[3] += score_count
+            if best is not None:
+                totals[4] = best if totals[4] is None else max(totals[4], best)
+
+    return {
+        'range': range_name,
+        'bucket': bucket,
+        'start': start.isoformat(),
+        'end': today.isoformat(),
+        'points': [{'period': key, **_figures(*totals)} for key, totals in sorted(periods.items())],
+        'exercises': {name: _figures(*totals) for name, totals in sorted(exercises.items())},
+    }
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "backfill":
+        print(__doc__)
+        sys.exit(1)
+    import migrations
+
+    with storage.connection() as conn:
+        migrations.migrate(conn)
+        count = rebuild(conn)
+        conn.commit()
+    print(f"✓ Rebuilt {count} daily exercise rollups from exercise_logs")
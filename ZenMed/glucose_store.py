@@ -0,0 +1,189 @@
+"""
+Glucose Time-Series Store for ZenMed
+Readings (manual fasting / post-meal logs and CGM samples every few
+minutes) are kept per patient in time order, and every insert also
+folds into hourly and daily rollups (count, sum, min, max, time in
+range). Range queries pick the coarsest table that still gives enough
+points, so a 90-day chart reads about two thousand hourly rows - never
+the tens of thousands of raw readings behind them.
+Times are epoch seconds; rollup buckets are aligned to UTC hours / days.
+"""
+
+import math
+import os
+import time
+from datetime import datetime
+
+import alert_rules
+
+# Standard CGM target range, mg/dL
+RANGE_LOW = float(os.environ.get('ZENMED_GLUCOSE_RANGE_LOW', '70'))
+RANGE_HIGH = float(os.environ.get('ZENMED_GLUCOSE_RANGE_HIGH', '180'))
+# Points returned by series() at most
+MAX_POINTS = int(os.environ.get('ZENMED_GLUCOSE_MAX_POINTS', '300'))
+# Readings per bulk request
+MAX_BATCH = int(os.environ.get('ZENMED_GLUCOSE_MAX_BATCH', '5000'))
+
+READING_KINDS = ('fasting', 'post_meal', 'cgm')
+# Epoch seconds SQLite and the charts can take; readings may run ahead of the server clock by a day at most
+MAX_TIME = 2 ** 31 - 1
+FUTURE_ALLOWANCE_S = 86400
+
+HOUR = 3600
+DAY = 86400
+# (table, bucket seconds) from finest to coarsest
+ROLLUPS = (('glucose_hourly', HOUR), ('glucose_daily', DAY))
+
+def parse_time(value):
+    """Epoch seconds from epoch seconds or an ISO 8601 string (naive = server local time)"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp())
+
+def normalize(readings):
+    """
+    Validated (taken_at, value, kind) tuples from dicts with 't', 'value' and optional 'kind'
+    Raises ValueError on a malformed reading
+    """
+    rows = []
+    for reading in readings:
+        try:
+            taken_at = parse_time(reading['t'])
+            value = float(reading['value'])
+        except (KeyError, TypeError, ValueError, OverflowError) as e:
+            raise ValueError(f"invalid reading {reading!r}: {e}") from None
+        kind = reading.get('kind', 'cgm')
+        if kind not in READING_KINDS:
+            raise ValueError(f"invalid reading kind {kind!r}")
+        # Also rejects inf / nan
+        if not 10 <= value <= 1000:
+            raise ValueError(f"glucose value out of range: {value}")
+        if not 0 <= taken_at <= min(MAX_TIME, time.time() + FUTURE_ALLOWANCE_S):
+            raise ValueError(f"reading time out of range: {reading['t']!r}")
+        rows.append((taken_at, value, kind))
+    return rows
+
+def add_readings(conn, user_id, rows):
+    """
+    Insert (taken_at, value, kind) readings and update the rollups, in one transaction
+    Readings already stored (same time and kind) are skipped, so retried uploads are harmless.
+    Returns the number of new readings
+    """
+    rows = sorted(set(rows))
+    if not rows:
+        return 0
+    existing = {(row[0], row[1]) for row in conn.execute("""
+        SELECT taken_at, kind FROM glucose_readings
+        WHERE user_id = ? AND taken_at BETWEEN ? AND ?
+    """, (user_id, rows[0][0], rows[-1][0]))}
+    fresh = []
+    for taken_at, value, kind in rows:
+        if (taken_at, kind) not in existing:
+            existing.add((taken_at, kind))
+            fresh.append((taken_at, value, kind))
+    if not fresh:
+        return 0
+
+    conn.executemany("INSERT INTO glucose_readings (user_id, taken_at, value, kind) VALUES (?, ?, ?, ?)",
+                     [(user_id, taken_at, value, kind) for taken_at, value, kind in fresh])
+    for table, width in ROLLUPS:
+        _fold(conn, table, width, user_id, fresh)
+
+    alert_rules.commit(conn, alert_rules.record_glucose(
+        conn, [(user_id, taken_at, value, kind) for taken_at, value, kind in fresh]))
+    return len(fresh)
+
+def _fold(conn, table, width, user_id, rows):
+    # Aggregate the batch per bucket first - one upsert per bucket, not per reading
+    buckets = {}
+    for taken_at, value, _ in rows:
+        bucket = buckets.setdefault(taken_at - taken_at % width, [0, 0.0, value, value, 0, 0, 0])
+        bucket[0] += 1
+        bucket[1] += value
+        bucket[2] = min(bucket[2], value)
+        bucket[3] = max(bucket[3], value)
+        if value < RANGE_LOW:
+            bucket[5] += 1
+        elif value > RANGE_HIGH:
+            bucket[6] += 1
+        else:
+            bucket[4] += 1
+    conn.executemany(f"""
+        INSERT INTO {table} (user_id, bucket, count, total, min_value, max_value, in_range, below, above)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, bucket) DO UPDATE SET
+            count = count + excluded.count,
+            total = total + excluded.total,
+            min_value = MIN(min_value, excluded.min_value),
+            max_value = MAX(max_value, excluded.max_value),
+            in_range = in_range + excluded.in_range,
+            below = below + excluded.below,
+            above = above + excluded.above
+    """, [(user_id, bucket, *values) for bucket, values in buckets.items()])
+
+def resolution(start, end, max_points=MAX_POINTS):
+    """(source table or None for raw readings, output bucket seconds) for a time range"""
+    width = max(1, math.ceil((end - start) / max_points))
+    source = None
+    for table, table_width in ROLLUPS:
+        if width >= table_width:
+            source = table
+    if source is not None:
+        # Whole source buckets per point, so no bucket is split between two points
+        table_width = dict(ROLLUPS)[source]
+        width = math.ceil(width / table_width) * table_width
+    return source, width
+
+def series(conn, user_id, start, end, max_points=MAX_POINTS):
+    """
+    Downsampled readings in [start, end) - at most about max_points points
+    Returns: {'resolution_s', 'source', 'points': [{'t', 'mean', 'min', 'max', 'n'}], 'summary'}
+    start / end are clamped to 0..MAX_TIME
+    """
+    start, end = (min(max(int(t), 0), MAX_TIME) for t in (start, end))
+    source, width = resolution(start, end, max_points)
+    if source is None:
+        rows = conn.execute("""
+            SELECT (taken_at / :width) * :width AS t, AVG(value), MIN(value), MAX(value), COUNT(*),
+                   SUM(value BETWEEN :low AND :high), SUM(value < :low), SUM(value > :high)
+            FROM glucose_readings
+            WHERE user_id = :user_id AND taken_at >= :start AND taken_at < :end
+            GROUP BY t ORDER BY t
+        """, {'width': width, 'low': RANGE_LOW, 'high': RANGE_HIGH,
+              'user_id': user_id, 'start': start, 'end': end}).fetchall()
+    else:
+        table_width = dict(ROLLUPS)[source]
+        rows = conn.execute(f"""
+            SELECT (bucket / :width) * :width AS t, SUM(total) / SUM(count), MIN(min_value), MAX(max_value),
+                   SUM(count), SUM(in_range), SUM(below), SUM(above)
+            FROM {source}
+            WHERE user_id = :user_id AND bucket >= :start AND bucket < :end
+            GROUP BY t ORDER BY t
+        """, {'width': width, 'user_id': user_id,
+              'start': start - start % table_width, 'end': end}).fetchall()
+
+    points = []
+    totals = [0, 0, 0, 0]
+    for t, mean, low, high, count, in_range, below, above in rows:
+        points.append({'t': t, 'mean': round(mean, 1), 'min': low, 'max': high, 'n': count})
+        totals[0] += count
+        totals[1] += in_range
+        totals[2] += below
+        totals[3] += above
+
+    readings = totals[0]
+    return {
+        'resolution_s': width,
+        'source': source or 'glucose_readings',
+        'points': points,
+        'summary': {
+            'readings': readings,
+            'time_in_range_pct': round(100 * totals[1] / readings, 1) if readings else None,
+            'below_range_pct': round(100 * totals[2] / readings, 1) if readings else None,
+            'above_range_pct': round(100 * totals[3] / readings, 1) if readings else None,
+        },
+    }
+
+def recent_series(conn, user_id, days, now=None, max_points=MAX_POINTS):
+    now = int(time.time() if now is None else now)
+    return series(conn, user_id, now - days * DAY, now + 1, max_points)
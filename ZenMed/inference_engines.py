@@ -0,0 +1,232 @@
+"""
+CPU Inference Engines for the ZenMed Pose Model
+The PyTorch weights (poster-/best.pt) can be served as-is or exported once
+to ONNX Runtime / OpenVINO, optionally INT8-quantized. Exports are cached
+next to the weights and rebuilt when the weights change.
+
+Select the engine with ZENMED_INFERENCE_ENGINE:
+  torch           ultralytics PyTorch (default)
+  onnx            ONNX Runtime                     (pip install onnx onnxruntime)
+  onnx-int8       ONNX Runtime, dynamic INT8 weights
+  openvino        OpenVINO                         (pip install openvino)
+  openvino-int8   OpenVINO, INT8 post-training quantization (needs calibration data)
+
+Compare engines against the PyTorch reference on real frames:
+  python inference_engines.py [image|video ...] [--engines onnx,openvino]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from pose_batcher import MAX_BATCH_SIZE
+
+ENGINES = ('torch', 'onnx', 'onnx-int8', 'openvino', 'openvino-int8')
+
+INFERENCE_ENGINE = os.environ.get('ZENMED_INFERENCE_ENGINE', 'torch').lower()
+# Calibration dataset for openvino-int8 (an ultralytics dataset yaml)
+INT8_CALIBRATION_DATA = os.environ.get('ZENMED_INT8_CALIBRATION_DATA', 'coco8-pose.yaml')
+# Largest mean keypoint offset (pixels) from PyTorch for an engine to count as consistent
+KEYPOINT_TOLERANCE_PX = float(os.environ.get('ZENMED_KEYPOINT_TOLERANCE_PX', '4'))
+
+def engine_path(weights, engine):
+    """Where the exported model for engine lives (the weights file itself for torch)"""
+    stem, _ = os.path.splitext(weights)
+    return {
+        'torch': weights,
+        'onnx': f"{stem}.onnx",
+        'onnx-int8': f"{stem}_int8.onnx",
+        'openvino': f"{stem}_openvino_model",
+        'openvino-int8': f"{stem}_int8_openvino_model",
+    }[engine]
+
+def _is_stale(artifact, weights):
+    return not os.path.exists(artifact) or os.path.getmtime(artifact) < os.path.getmtime(weights)
+
+def export_engine(weights, engine):
+    """Export weights for engine unless an up-to-date export already exists, returns its path"""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown inference engine '{engine}', expected one of {', '.join(ENGINES)}")
+
+    artifact = engine_path(weights, engine)
+    if engine == 'torch' or not _is_stale(artifact, weights):
+        return artifact
+
+    from ultralytics import YOLO
+
+    started = time.perf_counter()
+    if engine == 'onnx':
+        YOLO(weights).export(format='onnx', dynamic=True)
+    elif engine == 'onnx-int8':
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(export_engine(weights, 'onnx'), artifact, weight_type=QuantType.QUInt8)
+    elif engine == 'openvino':
+        YOLO(weights).export(format='openvino', dynamic=True)
+    elif engine == 'openvino-int8':
+        # Dynamic shapes like the other exports - warmup, pose_batcher and ROI crops all vary batch / size
+        YOLO(weights).export(format='openvino', int8=True, data=INT8_CALIBRATION_DATA,
+                             dynamic=True, batch=MAX_BATCH_SIZE)
+
+    print(f"✓ Exported {engine} model in {time.perf_counter() - started:.1f}s: {artifact}")
+    return artifact
+
+def load_engine(weights, engine=INFERENCE_ENGINE):
+    """
+    Load the pose model for engine, exporting it first if needed
+    Falls back to PyTorch when the engine is unavailable on this host
+    Returns: (model, engine actually loaded)
+    """
+    from ultralytics import YOLO
+
+    if engine != 'torch':
+        try:
+            return YOLO(export_engine(weights, engine), task='pose'), engine
+        except Exception as e:
+            print(f"✗ {engine} engine unavailable ({e}) - falling back to torch")
+
+    return YOLO(weights), 'torch'
+
+def _peak_memory_mb():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        import resource
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / (1024 * 1024)
+    except ImportError:
+        return None
+
+def _probe_engine(weights, engine, frames, runs, results):
+    """Child process: load one engine, time it, and collect its keypoints"""
+    try:
+        started = time.perf_counter()
+        model, loaded = load_engine(weights, engine)
+        load_s = time.perf_counter() - started
+
+        keypoints = []
+        for frame in frames:
+            result = model(frame, conf=0.5, verbose=False)[0]
+            if result.keypoints is None or len(result.keypoints.xy) == 0:
+                keypoints.append(None)
+            else:
+                keypoints.append((result.keypoints.xy[0].cpu().numpy(),
+                                  result.keypoints.conf[0].cpu().numpy()
+                                  if result.keypoints.conf is not None else None))
+
+        latencies = []
+        for i in range(runs):
+            started = time.perf_counter()
+            model(frames[i % len(frames)], conf=0.5, verbose=False)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        results.put({
+            'engine': engine,
+            'loaded': loaded,
+            'load_s': round(load_s, 2),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 1),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 1),
+            'memory_mb': round(_peak_memory_mb() or 0, 1),
+            'keypoints': keypoints,
+        })
+    except Exception as e:
+        results.put({'engine': engine, 'error': str(e)})
+
+def keypoint_error(reference, candidate, min_conf=0.5):
+    """Mean / max pixel offset of confident keypoints, and frames where detection differs"""
+    offsets = []
+    mismatched = 0
+    for ref, cand in zip(reference, candidate):
+        if ref is None or cand is None:
+            mismatched += ref is not cand
+            continue
+        (ref_xy, ref_conf), (cand_xy, _) = ref, cand
+        visible = ref_conf >= min_conf if ref_conf is not None else np.ones(len(ref_xy), dtype=bool)
+        offsets.append(np.linalg.norm(ref_xy[visible] - cand_xy[visible], axis=-1))
+
+    offsets = np.concatenate(offsets) if offsets else np.zeros(0)
+    return {
+        'mean_px_error': round(float(offsets.mean()), 2) if len(offsets) else None,
+        'max_px_error': round(float(offsets.max()), 2) if len(offsets) else None,
+        'detection_mismatches': int(mismatched),
+    }
+
+def compare_engines(weights, frames, engines=ENGINES, runs=30):
+    """
+    Latency, memory and keypoint consistency of each engine against PyTorch
+    Every engine runs in its own process so memory figures do not overlap
+    Returns: one report dict per engine
+    """
+    import multiprocessing as mp
+
+    ctx = mp.get_context('spawn')
+    engines = ['torch'] + [engine for engine in engines if engine != 'torch']
+    reports = []
+
+    for engine in engines:
+        results = ctx.Queue()
+        process = ctx.Process(target=_probe_engine, args=(weights, engine, frames, runs, results))
+        process.start()
+        reports.append(results.get())
+        process.join()
+
+    reference = reports[0].get('keypoints')
+    for report in reports:
+        keypoints = report.pop('keypoints', None)
+        if report['engine'] == 'torch' or keypoints is None or reference is None:
+            continue
+        report.update(keypoint_error(reference, keypoints))
+        report['consistent'] = (report['detection_mismatches'] == 0 and
+                                (report['mean_px_error'] or 0) <= KEYPOINT_TOLERANCE_PX)
+    return reports
+
+def _read_frames(paths, per_video=20):
+    import cv2
+
+    frames = []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is not None:
+            frames.append(image)
+            continue
+        cap = cv2.VideoCapture(path)
+        while len(frames) < per_video:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frames.append(frame)
+        cap.release()
+    return frames
+
+if __name__ == "__main__":
+    from model_registry import MODEL_PATH
+
+    args = sys.argv[1:]
+    engines = ENGINES
+    if '--engines' in args:
+        i = args.index('--engines')
+        engines = tuple(args[i + 1].split(','))
+        del args[i:i + 2]
+
+    frames = _read_frames(args)
+    if not frames:
+        print("✗ No frames given - using blank frames (latency only, no keypoint check)")
+        frames = [np.zeros((480, 640, 3), dtype=np.uint8)]
+
+    for report in compare_engines(MODEL_PATH, frames, engines):
+        if 'error' in report:
+            print(f"✗ {report['engine']:<14} {report['error']}")
+            continue
+        line = (f"{report['engine']:<14} load {report['load_s']:>5}s  p50 {report['p50_ms']:>6} ms  "
+                f"p95 {report['p95_ms']:>6} ms  mem {report['memory_mb']:>7} MB")
+        if report['loaded'] != report['engine']:
+            line += f"  (fell back to {report['loaded']})"
+        if 'consistent' in report:
+            mark = "✓" if report['consistent'] else "✗"
+            line += f"  {mark} keypoints mean {report['mean_px_error']} px, max {report['max_px_error']} px"
+        print(line)
@@ -0,0 +1,343 @@
+"""
+Inference Worker Pool for ZenMed
+Runs YOLO inference in dedicated worker processes, each pinned to its
+own CPU cores with its own torch thread count. Jobs go to the least busy
+worker's own queue, with a bound on how many may wait across the pool;
+when it is reached requests are rejected immediately with a retry hint.
+A worker that exits fails the jobs it was given and is started again on
+a fresh queue (one killed mid-read can leave its queue unusable).
+"""
+
+import atexit
+import itertools
+import math
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import metrics
+
+# 0 workers = run inference inline on the request thread
+INFERENCE_WORKERS = int(os.environ.get("ZENMED_INFERENCE_WORKERS", "0"))
+INFERENCE_QUEUE_SIZE = int(os.environ.get("ZENMED_INFERENCE_QUEUE_SIZE", "32"))
+# 0 = split the available cores evenly between workers
+TORCH_THREADS_PER_WORKER = int(os.environ.get("ZENMED_TORCH_THREADS", "0"))
+INFERENCE_TIMEOUT_S = float(os.environ.get("ZENMED_INFERENCE_TIMEOUT_S", "10"))
+# How often the results thread checks for workers that have exited
+WORKER_CHECK_S = float(os.environ.get("ZENMED_WORKER_CHECK_S", "1"))
+
+class InferenceBusy(Exception):
+    """Raised when the inference queue is full"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Inference queue full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+def split_cores(num_workers):
+    """Divide the cores this process may use into one contiguous set per worker"""
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+
+    if num_workers >= len(cores):
+        return [[cores[i % len(cores)]] for i in range(num_workers)]
+
+    per_worker = len(cores) // num_workers
+    return [cores[i * per_worker:(i + 1) * per_worker] for i in range(num_workers)]
+
+def _run_jobs(kind, jobs):
+    """Execute one gathered batch of jobs of the same kind inside a worker"""
+    if kind == "pose":
+        from advanced_pose_detector import decode_frame, infer_poses, frame_feedback
+
+        frames = [decode_frame(payload) for _, payload, _, _ in jobs]
+        renders = [options.get('render', True) for _, _, options, _ in jobs]
+        rois = [options.get('roi') for _, _, options, _ in jobs]
+        valid = [i for i, frame in enumerate(frames) if frame is not None]
+        detections = iter(infer_poses([frames[i] for i in valid], render=[renders[i] for i in valid],
+                                      rois=[rois[i] for i in valid])
+                          if valid else ())
+
+        outputs = []
+        for frame, render in zip(frames, renders):
+            if frame is None:
+                outputs.append({'error': 'Invalid frame'})
+                continue
+            annotated, keypoints, keypoints_conf, _, model_version, box = next(detections)
+            output = frame_feedback(annotated, keypoints, model_version, keypoints_conf, render=render)
+            # Raw keypoints for per-patient tracking in the web process
+            output['_keypoints'] = keypoints
+            output['_keypoints_conf'] = keypoints_conf
+            output['_box'] = box
+            outputs.append(output)
+        return outputs
+
+    if kind == "posture":
+        from posture_detector import analyze_frame_for_web
+        return [analyze_frame_for_web(payload, render=options.get('render', True))
+                for _, payload, options, _ in jobs]
+
+    raise ValueError(f"Unknown inference job: {kind}")
+
+def _worker_main(worker_id, cores, torch_threads, jobs, results):
+    """Worker process loop: pin, configure torch, then serve batches forever"""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+        torch.set_num_interop_threads(1)
+    except ImportError:
+        pass
+
+    # Load and warm up the model before taking jobs
+    try:
+        import advanced_pose_detector
+        import posture_detector
+    except Exception as e:
+        print(f"✗ Inference worker {worker_id} could not load models: {e}")
+
+    from pose_batcher import gather, BATCH_WINDOW_MS, MAX_BATCH_SIZE
+    print(f"✓ Inference worker {worker_id} on cores {cores} ({torch_threads} threads)")
+
+    while True:
+        batch = gather(jobs, MAX_BATCH_SIZE, BATCH_WINDOW_MS / 1000.0)
+        stop = None in batch
+        batch = [job for job in batch if job is not None]
+        started = time.time()
+        # Jobs now held by this worker - failed by the pool if the worker dies with them
+        results.put(("taken", worker_id, [job[1] for job in batch]))
+
+        by_kind = {}
+        for job in batch:
+            by_kind.setdefault(job[0], []).append(job[1:])
+
+        for kind, kind_jobs in by_kind.items():
+            try:
+                outputs = _run_jobs(kind, kind_jobs)
+                errors = [None] * len(kind_jobs)
+            except Exception as e:
+                outputs = [None] * len(kind_jobs)
+                errors = [str(e)] * len(kind_jobs)
+                metrics.errors.inc(kind, 'worker', amount=len(kind_jobs))
+
+            service_s = time.time() - started
+            for (job_id, _, _, enqueued_at), output, error in zip(kind_jobs, outputs, errors):
+                results.put(("done", worker_id, (job_id, output, error, started - enqueued_at, service_s)))
+
+        # Stage timings recorded in this process, merged into the web process's /metrics
+        results.put(("metrics", worker_id, metrics.drain()))
+
+        if stop:
+            break
+
+class InferencePool:
+    """
+    Fixed set of inference worker processes, each fed from its own queue
+    Jobs are ("pose" | "posture", raw image bytes, options such as render=False)
+    """
+
+    def __init__(self, num_workers, queue_size=INFERENCE_QUEUE_SIZE, torch_threads=TORCH_THREADS_PER_WORKER):
+        self._ctx = ctx = mp.get_context("spawn")
+        self.num_workers = num_workers
+        self.queue_size = queue_size
+        self._results = ctx.Queue()
+        # job_id -> (kind, future) for every job not yet answered
+        self._pending = {}
+        # worker_id -> ids of the unanswered jobs sent to it
+        self._assigned = {}
+        # Ids of the jobs a worker has taken off its queue
+        self._taken = set()
+        self._closing = False
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.restarts = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+        self.service_total_s = 0.0
+        self.service_max_s = 0.0
+
+        self._cores = split_cores(num_workers)
+        self._threads = [torch_threads or max(1, len(cores)) for cores in self._cores]
+        self._queues = [None] * num_workers
+        self._workers = [self._start_worker(worker_id) for worker_id in range(num_workers)]
+
+        self._dispatcher = threading.Thread(target=self._dispatch, name="inference-results", daemon=True)
+        self._dispatcher.start()
+
+    def _start_worker(self, worker_id):
+        self._queues[worker_id] = jobs = self._ctx.Queue()
+        proc = self._ctx.Process(target=_worker_main, name=f"inference-worker-{worker_id}",
+                                 args=(worker_id, self._cores[worker_id], self._threads[worker_id],
+                                       jobs, self._results),
+                                 daemon=True)
+        proc.start()
+        return proc
+
+    def queue_depth(self):
+        """Jobs waiting for a worker to take them"""
+        return len(self._pending) - len(self._taken)
+
+    def in_flight(self):
+        """Jobs a worker has taken and not yet answered"""
+        return len(self._taken)
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained"""
+        avg_service = self.service_total_s / self.completed if self.completed else 1.0
+        return max(1, math.ceil(len(self._pending) * avg_service / max(1, self.num_workers)))
+
+    def submit(self, kind, payload, **options):
+        """Queue a job without blocking, raises InferenceBusy if the queue is full"""
+        return self._submit(kind, payload, options)[1]
+
+    def _submit(self, kind, payload, options):
+        future = Future()
+        job_id = next(self._ids)
+
+        with self._lock:
+            if self.queue_depth() >= self.queue_size:
+                self.rejected += 1
+                busy = True
+            else:
+                busy = False
+                # Least busy worker, passing over any that died and are not restarted yet
+                worker_id = min(range(self.num_workers),
+                                key=lambda w: (not self._workers[w].is_alive(), len(self._assigned.get(w, ()))))
+                self._assigned.setdefault(worker_id, set()).add(job_id)
+                self._pending[job_id] = (kind, future)
+                self.submitted += 1
+                jobs = self._queues[worker_id]
+        if busy:
+            raise InferenceBusy(self.retry_after())
+
+        jobs.put((kind, job_id, payload, options, time.time()))
+        return job_id, future
+
+    def run(self, kind, payload, timeout=INFERENCE_TIMEOUT_S, **options):
+        """Submit a job and wait for its result dict"""
+        job_id, future = self._submit(kind, payload, options)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            # Nobody is waiting any more - a late answer is dropped
+            with self._lock:
+                self._forget(job_id)
+            raise InferenceBusy(self.retry_after())
+
+    def _forget(self, job_id):
+        """Stop tracking a job (lock held), returns its (kind, future) or None"""
+        self._taken.discard(job_id)
+        for job_ids in self._assigned.values():
+            job_ids.discard(job_id)
+        return self._pending.pop(job_id, None)
+
+    def _dispatch(self):
+        next_check = time.monotonic() + WORKER_CHECK_S
+        while True:
+            try:
+                self._handle(*self._results.get(timeout=WORKER_CHECK_S))
+            except queue.Empty:
+                pass
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + WORKER_CHECK_S
+                self._replace_dead_workers()
+
+    def _handle(self, message, worker_id, body):
+        if message == "metrics":
+            metrics.merge(body)
+            return
+        if message == "taken":
+            with self._lock:
+                # Jobs run() has already given up on stay forgotten
+                self._taken.update(job_id for job_id in body if job_id in self._pending)
+            return
+
+        job_id, output, error, wait_s, service_s = body
+        with self._lock:
+            _, future = self._forget(job_id) or (None, None)
+            self.completed += 1
+            self.wait_total_s += wait_s
+            self.wait_max_s = max(self.wait_max_s, wait_s)
+            self.service_total_s += service_s
+            self.service_max_s = max(self.service_max_s, service_s)
+            if error is not None:
+                self.failed += 1
+
+        if future is None:
+            return
+        if error is not None:
+            future.set_exception(RuntimeError(error))
+        else:
+            future.set_result(output)
+
+    def _replace_dead_workers(self):
+        """Fail the jobs sent to workers that exited and start new ones in their place"""
+        for worker_id, proc in enumerate(self._workers):
+            if proc.is_alive() or self._closing:
+                continue
+            with self._lock:
+                lost = [self._forget(job_id) for job_id in list(self._assigned.pop(worker_id, ()))]
+                lost = [job for job in lost if job is not None]
+                self.failed += len(lost)
+                self.restarts += 1
+                self._workers[worker_id] = self._start_worker(worker_id)
+            print(f"✗ Inference worker {worker_id} exited (code {proc.exitcode}), "
+                  f"failing {len(lost)} job(s) and restarting")
+            for kind, future in lost:
+                metrics.errors.inc(kind, 'worker')
+                future.set_exception(RuntimeError(f"Inference worker {worker_id} exited"))
+
+    def stats(self):
+        """Queue depth, wait time and service time for monitoring"""
+        completed = self.completed or 1
+        return {
+            'workers': self.num_workers,
+            'workers_alive': sum(1 for proc in self._workers if proc.is_alive()),
+            'restarts': self.restarts,
+            'queue_depth': self.queue_depth(),
+            'in_flight': self.in_flight(),
+            'queue_capacity': self.queue_size,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'failed': self.failed,
+            'avg_wait_ms': round(self.wait_total_s / completed * 1000, 2),
+            'max_wait_ms': round(self.wait_max_s * 1000, 2),
+            'avg_service_ms': round(self.service_total_s / completed * 1000, 2),
+            'max_service_ms': round(self.service_max_s * 1000, 2),
+        }
+
+    def shutdown(self, timeout=5):
+        self._closing = True
+        for jobs in self._queues:
+            jobs.put(None)
+        for proc in self._workers:
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Shared worker pool, or None when inference runs inline"""
+    global _pool
+    if INFERENCE_WORKERS <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = InferencePool(INFERENCE_WORKERS)
+                atexit.register(_pool.shutdown)
+    return _pool
@@ -0,0 +1,287 @@
+"""
+Write-Behind Ingestion for ZenMed Exercise Logs
+Requests hand exercise / posture-score rows to a queue and return at once.
+A background thread writes them in batches - one executemany and one
+commit (one fsync) per batch - when ZENMED_INGEST_BATCH rows are waiting
+or ZENMED_INGEST_FLUSH_MS has passed, and always before the process exits.
+Rows are validated on submit. A batch that still fails is retried with
+backoff when the database is busy; otherwise it is written row by row and
+the rows the database rejects are set aside (dead_letters), so one bad
+row never holds up the rows behind it.
+"""
+
+import atexit
+import math
+import os
+import signal
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import date as _date
+
+import storage
+import patient_summary
+import alert_rules
+import exercise_rollups
+
+INGEST_BATCH = int(os.environ.get('ZENMED_INGEST_BATCH', '200'))
+INGEST_FLUSH_MS = float(os.environ.get('ZENMED_INGEST_FLUSH_MS', '250'))
+# Longest a dashboard waits for its own user's writes to land
+READ_BARRIER_TIMEOUT_S = float(os.environ.get('ZENMED_INGEST_BARRIER_S', '2'))
+# Longest wait between retries while the database stays locked
+MAX_BACKOFF_S = float(os.environ.get('ZENMED_INGEST_MAX_BACKOFF_S', '30'))
+# Rejected rows kept for inspection (oldest dropped first)
+DEAD_LETTER_SIZE = int(os.environ.get('ZENMED_INGEST_DEAD_LETTERS', '1000'))
+
+MAX_DURATION_MIN = 24 * 60
+DEFAULT_EXERCISE = 'General'
+
+INSERT_EXERCISE = """
+    INSERT INTO exercise_logs (user_id, exercise_name, duration, date, posture_score)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+def _number(value, name, low, high):
+    try:
+        number = float(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"{name} must be a number") from None
+    if not math.isfinite(number) or not low <= number <= high:
+        raise ValueError(f"{name} must be between {low} and {high}")
+    return int(round(number))
+
+def clean_exercise_name(name):
+    """Exercise label as stored - any client value becomes a short string"""
+    return str(name or '').strip()[:100] or DEFAULT_EXERCISE
+
+def clean_row(user_id, exercise_name, duration, date, posture_score=None):
+    """
+    exercise_logs row with every value coerced to what the table stores
+    Raises ValueError for input that cannot be stored (the route answers 400)
+    """
+    if isinstance(duration, bool) or isinstance(posture_score, bool):
+        raise ValueError("duration and score must be numbers")
+    duration = 0 if duration in (None, '') else _number(duration, "duration", 0, MAX_DURATION_MIN)
+    if posture_score in (None, ''):
+        posture_score = None
+    else:
+        posture_score = _number(posture_score, "score", 0, 100)
+    exercise_name = clean_exercise_name(exercise_name)
+    try:
+        date = _date.fromisoformat(str(date)).isoformat()
+    except ValueError:
+        raise ValueError("date must be YYYY-MM-DD") from None
+    return (int(user_id), exercise_name, duration, date, posture_score)
+
+def _transient(error):
+    """Errors worth retrying the same rows for - the database was busy, not the rows bad"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+class IngestQueue:
+    """
+    Buffered exercise_logs writer
+    Rows are committed in submission order; committed_seq is the last row known to be durable
+    """
+
+    def __init__(self, batch_size=INGEST_BATCH, flush_ms=INGEST_FLUSH_MS, connection=storage.connection):
+        self.batch_size = max(1, batch_size)
+        self.flush_s = max(0.0, flush_ms) / 1000.0
+        self.connection = connection
+
+        self._pending = []
+        self._seq = 0
+        self.committed_seq = 0
+        self._user_seq = {}
+        self._flush_now = False
+        self._stopped = False
+        self._flushing = threading.Lock()
+        self._cond = threading.Condition()
+
+        self.batches = 0
+        self.rows_written = 0
+        self.failures = 0
+        self.dead_letters = deque(maxlen=DEAD_LETTER_SIZE)
+        self.rejected = 0
+        self._backoff_s = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+
+    def submit_exercise(self, user_id, exercise_name, duration, date, posture_score=None):
+        """Queue one exercise_logs row, returns immediately; ValueError for an invalid row"""
+        row = clean_row(user_id, exercise_name, duration, date, posture_score)
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("ingest queue is shut down")
+            self._seq += 1
+            self._pending.append((self._seq, row))
+            self._user_seq[row[0]] = self._seq
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def wait_for_user(self, user_id, timeout=READ_BARRIER_TIMEOUT_S):
+        """
+        Read-your-writes barrier: block until every row this user submitted is committed
+        Returns at once when nothing of theirs is outstanding. False on timeout.
+        """
+        with self._cond:
+            target = self._user_seq.get(user_id, 0)
+            if target <= self.committed_seq:
+                return True
+            self._flush_now = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: self.committed_seq >= target, timeout)
+
+    def flush(self):
+        """Write everything queued so far, in batches; returns the number of rows written"""
+        written = 0
+        with self._flushing:
+            while True:
+                with self._cond:
+                    batch = self._pending[:self.batch_size]
+                    del self._pending[:len(batch)]
+                if not batch:
+                    return written
+                if not self._write(batch):
+                    return written
+                written += len(batch)
+
+    def _commit(self, rows):
+        with self.connection() as conn:
+            conn.executemany(INSERT_EXERCISE, rows)
+            activity = [(user_id, date, duration, score) for user_id, _, duration, date, score in rows]
+            patient_summary.record_activity(conn, activity)
+            exercise_rollups.record(conn, [(user_id, date, name, duration, score)
+                                           for user_id, name, duration, date, score in rows])
+            alert_rules.commit(conn, alert_rules.record_activity(conn, activity), {row[0] for row in rows})
+
+    def _write(self, batch):
+        """Write one batch; False when (some of) it went back on the queue for a retry"""
+        try:
+            self._commit([row for _, row in batch])
+            self._done(batch, len(batch))
+            return True
+        except Exception as e:
+            if _transient(e):
+                self._retry_later(batch, e)
+                return False
+            if len(batch) == 1:
+                self._reject(batch[0], e)
+                self._done(batch, 0)
+                return True
+            print(f"✗ Ingest batch of {len(batch)} rejected ({e}), writing its rows one at a time")
+
+        # Isolate the rows the database refuses
+        written = 0
+        for index, item in enumerate(batch):
+            try:
+                self._commit([item[1]])
+                written += 1
+            except Exception as e:
+                if _transient(e):
+                    if index:
+                        self._done(batch[:index], written)
+                    self._retry_later(batch[index:], e)
+                    return False
+                self._reject(item, e)
+        self._done(batch, written)
+        return True
+
+    def _retry_later(self, items, error):
+        print(f"✗ Ingest flush failed ({len(items)} rows kept for retry): {error}")
+        with self._cond:
+            # Back at the front so commit order still follows submission order
+            self._pending[:0] = items
+            self.failures += 1
+
+    def _reject(self, item, error):
+        print(f"✗ Ingest row rejected and set aside: {item[1]} ({error})")
+        with self._cond:
+            self.dead_letters.append((item[1], str(error)))
+            self.rejected += 1
+
+    def _done(self, items, written):
+        """items are settled - written or rejected - so nobody should wait for them any more"""
+        with self._cond:
+            self.committed_seq = items[-1][0]
+            self.batches += 1
+            self.rows_written += written
+            self._backoff_s = 0.0
+            # Forget users whose rows are all settled so the map stays small
+            for user_id in {row[0] for _, row in items}:
+                if self._user_seq.get(user_id, 0) <= self.committed_seq:
+                    self._user_seq.pop(user_id, None)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_s
+                self._cond.wait_for(
+                    lambda: (self._stopped or self._flush_now or len(self._pending) >= self.batch_size
+                             or time.monotonic() >= deadline),
+                    timeout=self.flush_s)
+                self._flush_now = False
+                stopped = self._stopped
+            failed_before = self.failures
+            self.flush()
+            if stopped:
+                return
+            if self.failures > failed_before:
+                # Database busy - back off exponentially before retrying
+                self._backoff_s = min(MAX_BACKOFF_S, max(self._backoff_s * 2, self.flush_s, 0.5))
+                time.sleep(self._backoff_s)
+
+    def shutdown(self, timeout=10):
+        """Stop accepting rows and write everything still queued"""
+        with self._cond:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pending': len(self._pending),
+                'batches': self.batches,
+                'rows_written': self.rows_written,
+                'failures': self.failures,
+                'rejected': self.rejected,
+            }
+
+_ingest = None
+_ingest_lock = threading.Lock()
+
+def get_ingest():
+    """Shared ingest queue, flushed on interpreter exit"""
+    global _ingest
+    if _ingest is None:
+        with _ingest_lock:
+            if _ingest is None:
+                _ingest = IngestQueue()
+                atexit.register(_ingest.shutdown)
+    return _ingest
+
+def install_shutdown_flush():
+    """
+    Turn SIGTERM into a normal exit so the atexit flush runs
+    (a bare SIGTERM would kill the process with rows still queued)
+    """
+    def _terminate(signum, frame):
+        raise SystemExit(0)
+
+    try:
+        if signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+            signal.signal(signal.SIGTERM, _terminate)
+    except (ValueError, AttributeError):
+        # Not the main thread, or no SIGTERM on this platform
+        pass
@@ -0,0 +1,70 @@
+"""
+Vectorized Joint-Angle Kernel for ZenMed
+Computes every joint angle of interest for a batch of poses
+(N x 17 x 2 COCO keypoints) in a single NumPy pass
+"""
+
+import numpy as np
+
+# Angle at the middle joint, between the middle->first and middle->last limbs
+JOINT_ANGLES = {
+    'left_knee': (11, 13, 15),       # hip - knee - ankle
+    'right_knee': (12, 14, 16),
+    'left_hip': (5, 11, 13),         # shoulder - hip - knee
+    'right_hip': (6, 12, 14),
+    'left_elbow': (5, 7, 9),         # shoulder - elbow - wrist
+    'right_elbow': (6, 8, 10),
+    'left_shoulder': (11, 5, 7),     # hip - shoulder - elbow
+    'right_shoulder': (12, 6, 8),
+}
+
+ANGLE_NAMES = tuple(JOINT_ANGLES)
+ANGLE_INDEX = {name: i for i, name in enumerate(ANGLE_NAMES)}
+
+_A, _B, _C = (np.array(joints) for joints in zip(*JOINT_ANGLES.values()))
+
+def angle_between(point_a, point_b, point_c):
+    """
+    Angle in degrees at point_b, broadcast over any leading dimensions
+    Points are (..., 2) arrays (extra coordinates beyond x, y are ignored)
+    """
+    a = np.asarray(point_a, dtype=np.float64)[..., :2]
+    b = np.asarray(point_b, dtype=np.float64)[..., :2]
+    c = np.asarray(point_c, dtype=np.float64)[..., :2]
+
+    ba = a - b
+    bc = c - b
+
+    dot = np.einsum('...k,...k->...', ba, bc)
+    norms = np.linalg.norm(ba, axis=-1) * np.linalg.norm(bc, axis=-1)
+    cosine = dot / (norms + 1e-6)
+    return np.degrees(np.arccos(np.clip(cosine, -1.0, 1.0)))
+
+def as_pose_batch(keypoints, confidences=None):
+    """Promote a single (17, 2) pose to a batch of one"""
+    keypoints = np.asarray(keypoints, dtype=np.float64)
+    if keypoints.ndim == 2:
+        keypoints = keypoints[None]
+        if confidences is not None:
+            confidences = np.asarray(confidences)[None]
+    elif confidences is not None:
+        confidences = np.asarray(confidences)
+    return keypoints[..., :2], confidences
+
+def joint_angles(keypoints, confidences=None, min_conf=0.5):
+    """
+    All JOINT_ANGLES for a batch of poses
+    keypoints: (N, 17, 2) or (17, 2); confidences: (N, 17) or (17,), optional
+    Returns: (N, len(ANGLE_NAMES)) degrees - NaN where any of the three
+    joints is below min_conf (only when confidences are given)
+    """
+    keypoints, confidences = as_pose_batch(keypoints, confidences)
+    angles = angle_between(keypoints[:, _A], keypoints[:, _B], keypoints[:, _C])
+
+    if confidences is not None:
+        valid = ((confidences[:, _A] >= min_conf) &
+                 (confidences[:, _B] >= min_conf) &
+                 (confidences[:, _C] >= min_conf))
+        angles = np.where(valid, angles, np.nan)
+
+    return angles
@@ -0,0 +1,196 @@
+"""
+Adaptive Inference Rate for ZenMed Pose Streams
+Runs the pose model only on keyframes - every k-th frame, or sooner when
+the image changes enough - and carries keypoints forward between them
+with sparse optical flow, which costs a fraction of a YOLO pass.
+
+Usage (measure the joint-angle error against running the model on every frame):
+  python keyframe_scheduler.py recording.mp4 [interval]
+"""
+
+import os
+import sys
+import threading
+
+import numpy as np
+
+from pose_tracker import TrackerStore
+from metrics import timed
+
+# Run the model at least every KEYFRAME_INTERVAL frames (1 = every frame)
+KEYFRAME_INTERVAL = max(1, int(os.environ.get('ZENMED_KEYFRAME_INTERVAL', '3')))
+# Mean grey-level change (0-255) since the last keyframe that forces a new one
+MOTION_THRESHOLD = float(os.environ.get('ZENMED_KEYFRAME_MOTION', '12'))
+
+MOTION_SIZE = (80, 60)
+_lk_params = None
+
+def lk_params():
+    """Lucas-Kanade settings, built on first use so importing this module does not load OpenCV"""
+    global _lk_params
+    if _lk_params is None:
+        import cv2
+        _lk_params = dict(winSize=(21, 21), maxLevel=3,
+                          criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+    return _lk_params
+
+class KeyframeScheduler:
+    """
+    Per-stream keyframe selection and keypoint propagation
+    interval: maximum frames between model runs
+    motion_threshold: image change since the keyframe that triggers an early run
+    min_tracked: fraction of visible keypoints optical flow must keep, else the next frame is a keyframe
+    """
+
+    def __init__(self, interval=KEYFRAME_INTERVAL, motion_threshold=MOTION_THRESHOLD,
+                 min_conf=0.5, min_tracked=0.6):
+        self.interval = interval
+        self.motion_threshold = motion_threshold
+        self.min_conf = min_conf
+        self.min_tracked = min_tracked
+
+        self.keyframes = 0
+        self.interpolated = 0
+
+        self._since_keyframe = 0
+        self._force_keyframe = True
+        self._keyframe_small = None
+        self._prev_gray = None
+        self._last = None
+        self._lock = threading.Lock()
+
+    def step(self, frame, detect, render=True):
+        """
+        Process one decoded frame
+        detect: callable(frame) -> (annotated, keypoints, keypoints_conf, quality, model_version, box)
+        Returns: the same tuple as detect, plus True when the model actually ran
+        """
+        import cv2
+
+        with self._lock:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            small = cv2.resize(gray, MOTION_SIZE, interpolation=cv2.INTER_AREA)
+
+            if self._needs_keyframe(small):
+                result = detect(frame)
+                self._keyframe_small = small
+                self._since_keyframe = 0
+                self._force_keyframe = False
+                self._last = result
+                self.keyframes += 1
+            else:
+                result = self._propagate(frame, gray, render)
+                self._since_keyframe += 1
+                self.interpolated += 1
+
+            self._prev_gray = gray
+            return result + (self._since_keyframe == 0,)
+
+    def _needs_keyframe(self, small):
+        if self._force_keyframe or self._last is None:
+            return True
+        if self._since_keyframe + 1 >= self.interval:
+            return True
+        import cv2
+
+        motion = cv2.absdiff(small, self._keyframe_small).mean()
+        return motion > self.motion_threshold
+
+    def _propagate(self, frame, gray, render):
+        """Move the previous keypoints along the optical flow between the last two frames"""
+        import cv2
+        from advanced_pose_detector import calculate_pose_quality, create_knee_overlay
+
+        _, keypoints, keypoints_conf, _, model_version, box = self._last
+        if keypoints is None:
+            # Nobody in view at the keyframe - image motion will trigger the next run
+            self._last = (frame, None, None, 0, model_version, None)
+            return self._last
+
+        keypoints = np.asarray(keypoints, dtype=np.float32)
+        if keypoints_conf is None:
+            visible = np.ones(len(keypoints), dtype=bool)
+        else:
+            visible = np.asarray(keypoints_conf) >= self.min_conf
+
+        moved = keypoints.copy()
+        if visible.any():
+            points = keypoints[visible].reshape(-1, 1, 2)
+            with timed('pose', 'optical_flow'):
+                new_points, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, points, None, **lk_params())
+            tracked = status.ravel() == 1
+            visible_moved = moved[visible]
+            visible_moved[tracked] = new_points.reshape(-1, 2)[tracked]
+            moved[visible] = visible_moved
+            if tracked.mean() < self.min_tracked:
+                self._force_keyframe = True
+
+        annotated = frame
+        if render:
+            with timed('pose', 'plot'):
+                annotated = create_knee_overlay(frame, moved, keypoints_conf)
+        quality = calculate_pose_quality(moved, keypoints_conf)
+        self._last = (annotated, moved, keypoints_conf, quality, model_version, box)
+        return self._last
+
+    def stats(self):
+        total = self.keyframes + self.interpolated
+        return {
+            'keyframes': self.keyframes,
+            'interpolated': self.interpolated,
+            'model_run_ratio': round(self.keyframes / total, 3) if total else None
+        }
+
+schedulers = TrackerStore(KeyframeScheduler)
+
+def measure_angle_error(frames, interval=KEYFRAME_INTERVAL, motion_threshold=MOTION_THRESHOLD):
+    """
+    Run every frame through the model and through a KeyframeScheduler
+    Returns: model run ratio and the joint-angle error (degrees) of interpolated frames
+    """
+    from advanced_pose_detector import infer_poses
+    from joint_angles import joint_angles
+
+    scheduler = KeyframeScheduler(interval, motion_threshold)
+    errors = []
+
+    for frame in frames:
+        reference = infer_poses([frame], render=False)[0]
+        _, keypoints, _, _, _, _, keyframe = scheduler.step(frame, lambda f: reference, render=False)
+        if keyframe or keypoints is None or reference[1] is None:
+            continue
+        diff = np.abs(joint_angles(keypoints, reference[2]) - joint_angles(reference[1], reference[2]))
+        errors.append(diff[~np.isnan(diff)])
+
+    errors = np.concatenate(errors) if errors else np.zeros(0)
+    report = scheduler.stats()
+    if len(errors):
+        report.update({
+            'mean_angle_error': round(float(errors.mean()), 2),
+            'p95_angle_error': round(float(np.percentile(errors, 95)), 2),
+            'max_angle_error': round(float(errors.max()), 2)
+        })
+    return report
+
+def _read_video(path):
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    interval = int(sys.argv[2]) if len(sys.argv) > 2 else KEYFRAME_INTERVAL
+    report = measure_angle_error(_read_video(sys.argv[1]), interval)
+    for key, value in report.items():
+        print(f"{key:>18}: {value}")
@@ -0,0 +1,181 @@
+"""
+Per-Stage Latency Metrics for ZenMed
+Histograms of where frame time goes (parse, decode, inference, plot,
+encode, ...) plus frame / invalid-frame / error counters, rendered in
+Prometheus text format for GET /metrics.
+Recording is two perf_counter() calls and one bucket increment, so it
+stays on in production; set ZENMED_METRICS=0 to turn it off entirely.
+"""
+
+import bisect
+import os
+import threading
+import time
+
+METRICS_ENABLED = os.environ.get('ZENMED_METRICS', '1') != '0'
+
+# Seconds - covers sub-millisecond analysis up to slow CPU inference
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def drain(self):
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label combination"""
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *label_values):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # bucket counts (+Inf last), sum, count
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def drain(self):
+        with self._lock:
+            series, self._series = self._series, {}
+        return series
+
+    def merge(self, series):
+        with self._lock:
+            for key, (counts, total, count) in series.items():
+                current = self._series.get(key)
+                if current is None:
+                    self._series[key] = [list(counts), total, count]
+                    continue
+                current[0] = [a + b for a, b in zip(current[0], counts)]
+                current[1] += total
+                current[2] += count
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(names, key + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+class _StageTimer:
+    """Context manager recording one stage's wall time"""
+
+    __slots__ = ("pipeline", "stage", "started")
+
+    def __init__(self, pipeline, stage):
+        self.pipeline = pipeline
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        stage_seconds.observe(time.perf_counter() - self.started, self.pipeline, self.stage)
+        return False
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NO_TIMER = _NoTimer()
+
+stage_seconds = Histogram('zenmed_stage_seconds', 'Time spent in each frame processing stage',
+                          labels=('pipeline', 'stage'))
+frames = Counter('zenmed_frames_total', 'Frames received', labels=('endpoint',))
+invalid_frames = Counter('zenmed_invalid_frames_total', 'Frames that could not be decoded',
+                         labels=('pipeline',))
+errors = Counter('zenmed_errors_total', 'Exceptions caught while processing frames',
+                 labels=('pipeline', 'where'))
+
+METRICS = (stage_seconds, frames, invalid_frames, errors)
+
+_gauges = []
+
+def timed(pipeline, stage):
+    """with timed('pose', 'decode'): ... - records the block into zenmed_stage_seconds"""
+    if not METRICS_ENABLED:
+        return _NO_TIMER
+    return _StageTimer(pipeline, stage)
+
+def register_gauge(name, help_text, read):
+    """Expose read() (a number, or None to skip) as a gauge at scrape time"""
+    _gauges.append((name, help_text, read))
+
+def drain():
+    """Take everything recorded since the last drain - worker processes send this to the web process"""
+    return {metric.name: metric.drain() for metric in METRICS}
+
+def merge(snapshot):
+    """Add a drained snapshot from another process"""
+    for metric in METRICS:
+        if snapshot.get(metric.name):
+            metric.merge(snapshot[metric.name])
+
+def render():
+    """All metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, help_text, read in _gauges:
+        try:
+            value = read()
+        except Exception:
+            value = None
+        if value is None:
+            continue
+        lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"])
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,347 @@
+"""
+Versioned Schema Migrations for ZenMed
+Each migration runs once, in order, inside its own transaction. The
+schema version lives in PRAGMA user_version (history in schema_migrations),
+so startup on an up-to-date database is a single pragma read.
+
+Usage:
+  python migrations.py            apply pending migrations to ZENMED_DB_PATH
+  python migrations.py check      EXPLAIN QUERY PLAN every hot query, exit 1 on a full table scan
+"""
+
+import sys
+
+import storage
+import patient_summary
+import exercise_rollups
+
+def _add_column(conn, table, column, definition):
+    """ALTER TABLE ... ADD COLUMN unless the column is already there"""
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def _baseline(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            role TEXT DEFAULT 'patient', -- patient, doctor, caregiver
+            language TEXT DEFAULT 'en', -- en, ta
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # Databases created before these columns existed
+    _add_column(conn, "users", "role", "TEXT DEFAULT 'patient'")
+    _add_column(conn, "users", "language", "TEXT DEFAULT 'en'")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS diet_plans (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            plan_json TEXT, -- Store generated plan as JSON
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS exercise_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            exercise_name TEXT,
+            duration INTEGER, -- minutes
+            date TEXT,
+            posture_score INTEGER, -- AI Score
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+    _add_column(conn, "exercise_logs", "posture_score", "INTEGER")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reminders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            title TEXT,
+            time TEXT,
+            type TEXT, -- medicine, exercise, water
+            active INTEGER DEFAULT 1,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id INTEGER, -- The user who generated the alert
+            type TEXT, -- HIGH_SUGAR, LOW_SUGAR, MISSED_EXERCISE, POOR_POSTURE (alert_rules.py)
+            message TEXT,
+            is_read INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(patient_id) REFERENCES users(id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS glucose_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            fasting_level REAL,
+            post_meal_level REAL,
+            date TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+
+def _hot_query_indexes(conn):
+    # Dashboard: latest exercise logs - covers every column, so no table lookups
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_exercise_logs_user_date
+        ON exercise_logs(user_id, date DESC, exercise_name, duration, posture_score)
+    """)
+    # Dashboard: active reminders - covering
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_reminders_user_active
+        ON reminders(user_id, active, title, time, type)
+    """)
+    # Doctor portal: unread alerts, joined to users by primary key
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_unread ON alerts(is_read, patient_id)")
+    # Nutrition: newest plan per user (the index is ordered by id within a user)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_diet_plans_user ON diet_plans(user_id)")
+
+def _patient_summaries(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS patient_daily_activity (
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            minutes INTEGER DEFAULT 0,
+            sessions INTEGER DEFAULT 0,
+            score_sum REAL DEFAULT 0,
+            score_count INTEGER DEFAULT 0,
+            PRIMARY KEY (user_id, date)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS patient_summary (
+            user_id INTEGER PRIMARY KEY,
+            name TEXT,
+            last_active TEXT,
+            minutes_7d INTEGER DEFAULT 0,
+            avg_score_7d REAL,
+            window_date TEXT, -- day the 7-day figures were computed for
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+    # One index per portal sort order; user_id breaks ties so pages are stable
+    for column in ("name", "last_active", "minutes_7d", "avg_score_7d"):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_patient_summary_{column} "
+                     f"ON patient_summary({column}, user_id)")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_patient_summary_window ON patient_summary(window_date)
+        WHERE minutes_7d > 0 OR avg_score_7d IS NOT NULL
+    """)
+    # Doctor portal: newest unread alerts first
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_unread_recent ON alerts(is_read, created_at)")
+    patient_summary.rebuild(conn)
+
+def _posture_sessions(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS posture_sessions (
+            session_id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            exercise TEXT,
+            started_at TEXT,
+            ended_at TEXT,
+            ended_by TEXT, -- completed, timeout
+            frames INTEGER,
+            avg_score REAL,
+            stddev REAL,
+            min_score REAL,
+            max_score REAL,
+            histogram TEXT, -- JSON list, frames per 10-point score band
+            active_seconds REAL,
+            good_form_seconds REAL,
+            reps INTEGER,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_posture_sessions_user ON posture_sessions(user_id, started_at)")
+
+def _alert_rule_indexes(conn):
+    # Alert rules: newest alert of each type per patient, read once per patient for deduplication
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_patient_type ON alerts(patient_id, type, created_at)")
+
+def _glucose_series(conn):
+    # Clustered by (user_id, taken_at): a patient's range query reads contiguous pages
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS glucose_readings (
+            user_id INTEGER NOT NULL,
+            taken_at INTEGER NOT NULL, -- epoch seconds
+            kind TEXT NOT NULL, -- fasting, post_meal, cgm
+            value REAL NOT NULL, -- mg/dL
+            PRIMARY KEY (user_id, taken_at, kind)
+        ) WITHOUT ROWID
+    """)
+    for table in ("glucose_hourly", "glucose_daily"):
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                user_id INTEGER NOT NULL,
+                bucket INTEGER NOT NULL, -- epoch seconds at the start of the UTC hour / day
+                count INTEGER NOT NULL,
+                total REAL NOT NULL,
+                min_value REAL,
+                max_value REAL,
+                in_range INTEGER NOT NULL,
+                below INTEGER NOT NULL,
+                above INTEGER NOT NULL,
+                PRIMARY KEY (user_id, bucket)
+            ) WITHOUT ROWID
+        """)
+    # glucose_logs (baseline) was never written by the app, so there is nothing to carry over
+
+def _exercise_rollups(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS exercise_daily (
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            exercise_name TEXT NOT NULL,
+            minutes INTEGER DEFAULT 0,
+            sessions INTEGER DEFAULT 0,
+            score_sum REAL DEFAULT 0,
+            score_count INTEGER DEFAULT 0,
+            best_score REAL,
+            PRIMARY KEY (user_id, date, exercise_name)
+        ) WITHOUT ROWID
+    """)
+    exercise_rollups.rebuild(conn)
+
+# (version, description, apply(conn)) - append only, never edit a released entry
+MIGRATIONS = [
+    (1, "baseline schema", _baseline),
+    (2, "indexes for dashboard, doctor portal and nutrition queries", _hot_query_indexes),
+    (3, "patient summaries for the doctor portal", _patient_summaries),
+    (4, "server-side posture session summaries", _posture_sessions),
+    (5, "alert rule deduplication index", _alert_rule_indexes),
+    (6, "glucose readings with hourly and daily rollups", _glucose_series),
+    (7, "daily exercise rollups for trends", _exercise_rollups),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Queries that run on every page view - each must be served by an index
+HOT_QUERIES = {
+    'dashboard_exercises': ("SELECT * FROM exercise_logs WHERE user_id = ? ORDER BY date DESC LIMIT 5", (1,)),
+    'dashboard_reminders': ("SELECT * FROM reminders WHERE user_id = ? AND active = 1", (1,)),
+    'doctor_portal_alerts': ("""
+        SELECT a.*, u.name
+        FROM alerts a
+        JOIN users u ON a.patient_id = u.id
+        WHERE a.is_read = 0
+        ORDER BY a.created_at DESC
+        LIMIT ?
+    """, (20,)),
+    'doctor_portal_unread_count': ("SELECT COUNT(*) FROM alerts WHERE is_read = 0", ()),
+    'doctor_portal_patients': ("""
+        SELECT s.user_id AS id, s.name, u.email, u.language, s.last_active,
+               s.minutes_7d, s.avg_score_7d
+        FROM patient_summary s
+        JOIN users u ON u.id = s.user_id
+        WHERE (s.minutes_7d, s.user_id) < (?, ?)
+        ORDER BY s.minutes_7d DESC, s.user_id DESC
+        LIMIT ?
+    """, (30, 1000, 26)),
+    'doctor_portal_stale_summaries': ("""
+        SELECT user_id FROM patient_summary
+        WHERE window_date < ? AND (minutes_7d > 0 OR avg_score_7d IS NOT NULL)
+    """, ('2000-01-01',)),
+    'alert_rules_last_alerts': ("""
+        SELECT type, CAST(strftime('%s', MAX(created_at)) AS INTEGER)
+        FROM alerts WHERE patient_id = ? GROUP BY type
+    """, (1,)),
+    'alert_rules_inactive_patients': ("""
+        SELECT s.user_id, s.last_active FROM patient_summary s
+        WHERE s.last_active <= ?
+          AND NOT EXISTS (SELECT 1 FROM alerts a
+                          WHERE a.patient_id = s.user_id AND a.type = 'MISSED_EXERCISE'
+                            AND a.created_at >= date(s.last_active, '+1 day'))
+    """, ('2000-01-01',)),
+    'glucose_raw_series': ("SELECT taken_at, value FROM glucose_readings "
+                           "WHERE user_id = ? AND taken_at >= ? AND taken_at < ? ORDER BY taken_at",
+                           (1, 0, 86400)),
+    'glucose_hourly_series': ("SELECT * FROM glucose_hourly WHERE user_id = ? AND bucket >= ? AND bucket < ?",
+                              (1, 0, 86400)),
+    'exercise_trend': ("SELECT date, exercise_name, SUM(minutes), SUM(sessions), MAX(best_score) "
+                       "FROM exercise_daily WHERE user_id = ? AND date >= ? AND date <= ? "
+                       "GROUP BY date, exercise_name", (1, '2000-01-01', '2000-01-07')),
+    'nutrition_latest_plan': ("SELECT plan_json FROM diet_plans WHERE user_id = ? ORDER BY id DESC LIMIT 1", (1,)),
+}
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Apply pending migrations, returns the versions applied (empty when up to date)"""
+    if schema_version(conn) >= LATEST_VERSION:
+        return []
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+
+    applied = []
+    for version, description, apply in MIGRATIONS:
+        # IMMEDIATE takes the write lock first, so two processes starting
+        # together cannot both apply the same migration
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            apply(conn)
+            conn.execute("INSERT OR REPLACE INTO schema_migrations (version, description) VALUES (?, ?)",
+                         (version, description))
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+        print(f"✓ Migration {version}: {description}")
+    return applied
+
+def query_plans(conn):
+    """name -> EXPLAIN QUERY PLAN detail lines for every HOT_QUERIES entry"""
+    return {name: [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            for name, (sql, params) in HOT_QUERIES.items()}
+
+def full_scans(conn):
+    """Hot queries whose plan scans a table or sorts in a temp b-tree"""
+    problems = {}
+    for name, plan in query_plans(conn).items():
+        bad = [step for step in plan
+               if (step.startswith("SCAN") and "USING" not in step) or "TEMP B-TREE" in step]
+        if bad:
+            problems[name] = bad
+    return problems
+
+def check(conn):
+    """Print each hot query's plan, returns True when all of them use an index"""
+    problems = full_scans(conn)
+    for name, plan in query_plans(conn).items():
+        mark = "✗" if name in problems else "✓"
+        print(f"{mark} {name}")
+        for step in plan:
+            print(f"    {step}")
+    return not problems
+
+if __name__ == "__main__":
+    with storage.connection() as conn:
+        applied = migrate(conn)
+        if not applied:
+            print(f"✓ Schema up to date (version {schema_version(conn)})")
+        if len(sys.argv) > 1 and sys.argv[1] == "check":
+            sys.exit(0 if check(conn) else 1)
@@ -0,0 +1,181 @@
+"""
+Shared Pose Model Registry for ZenMed
+Loads each weights file once per process, warms it up before the first
+patient frame, and hot-swaps to a new version when the file changes on disk
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+
+from inference_engines import INFERENCE_ENGINE, load_engine
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "poster-", "best.pt")
+
+WARMUP_RUNS = int(os.environ.get("ZENMED_WARMUP_RUNS", "3"))
+# How often get() looks at the weights file for a new version (0 disables)
+RELOAD_CHECK_S = float(os.environ.get("ZENMED_MODEL_RELOAD_CHECK_S", "5"))
+
+def file_version(path):
+    """Short content hash identifying a weights file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"{os.path.basename(path)}@{digest.hexdigest()[:12]}"
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+class LoadedModel:
+    """A loaded model together with the version and engine it was loaded from"""
+
+    def __init__(self, model, path, version, stamp, engine='torch'):
+        self.model = model
+        self.path = path
+        self.version = version
+        self.stamp = stamp
+        self.engine = engine
+        self.loaded_at = time.time()
+
+    def __call__(self, *args, **kwargs):
+        return self.model(*args, **kwargs)
+
+class ModelRegistry:
+    """
+    One LoadedModel per weights path, swapped atomically on reload
+    loader: callable(path, engine) -> (model, engine actually loaded)
+    """
+
+    def __init__(self, loader=load_engine, engine=INFERENCE_ENGINE,
+                 warmup_runs=WARMUP_RUNS, reload_check_s=RELOAD_CHECK_S):
+        self.loader = loader
+        self.engine = engine
+        self.warmup_runs = warmup_runs
+        self.reload_check_s = reload_check_s
+        self._models = {}
+        self._failed = set()
+        self._last_check = {}
+        self._reloading = set()
+        self._lock = threading.Lock()
+
+    def get(self, path=MODEL_PATH):
+        """Current model for path, loading it on first use. None if it cannot be loaded."""
+        loaded = self._models.get(path)
+        if loaded is None:
+            if path in self._failed:
+                return None
+            with self._lock:
+                loaded = self._models.get(path)
+                if loaded is None and path not in self._failed:
+                    loaded = self._load(path)
+            return loaded
+
+        self._maybe_reload(loaded)
+        return loaded
+
+    def reload(self, path=MODEL_PATH):
+        """Load and warm up the weights at path, then swap them in"""
+        loaded = self._load(path, swap=False)
+        if loaded is not None:
+            with self._lock:
+                previous = self._models.get(path)
+                self._models[path] = loaded
+            if previous is None or previous.version != loaded.version:
+                print(f"✓ Model swapped to {loaded.version}")
+        return loaded
+
+    def install(self, path, model, version, engine='torch'):
+        """Serve an already constructed model for path (benchmarks, offline checks)"""
+        loaded = LoadedModel(model, path, version, _file_stamp(path), engine)
+        with self._lock:
+            self._models[path] = loaded
+            self._failed.discard(path)
+        self._last_check[path] = time.monotonic()
+        return loaded
+
+    def versions(self):
+        return {path: loaded.version for path, loaded in self._models.items()}
+
+    def _load(self, path, swap=True):
+        stamp = _file_stamp(path)
+        try:
+            model, engine = self.loader(path, self.engine)
+            version = file_version(path)
+            if engine != 'torch':
+                version = f"{version}+{engine}"
+        except Exception as e:
+            print(f"✗ Error loading pose model: {e}")
+            if swap:
+                self._failed.add(path)
+            return None
+
+        loaded = LoadedModel(model, path, version, stamp, engine)
+        self._warmup(loaded)
+        print(f"✓ Pose model loaded: {path} ({version})")
+
+        if swap:
+            self._models[path] = loaded
+        self._last_check[path] = time.monotonic()
+        return loaded
+
+    def _warmup(self, loaded):
+        """Run a few dummy inferences so the first real frame is not the slow one"""
+        if self.warmup_runs <= 0:
+            return
+        blank = np.zeros((480, 640, 3), dtype=np.uint8)
+        try:
+            started = time.perf_counter()
+            for _ in range(self.warmup_runs):
+                loaded.model(blank, conf=0.5, verbose=False)
+            loaded.model([blank, blank], conf=0.5, verbose=False)
+            print(f"✓ Warmup done in {(time.perf_counter() - started) * 1000:.0f} ms")
+        except Exception as e:
+            print(f"✗ Warmup failed: {e}")
+
+    def _maybe_reload(self, loaded):
+        """Reload in the background when the weights file has changed"""
+        if self.reload_check_s <= 0:
+            return
+        path = loaded.path
+        now = time.monotonic()
+        if now - self._last_check.get(path, 0) < self.reload_check_s:
+            return
+        self._last_check[path] = now
+
+        stamp = _file_stamp(path)
+        if stamp is None or stamp == loaded.stamp or path in self._reloading:
+            return
+
+        self._reloading.add(path)
+
+        def _reload():
+            try:
+                self.reload(path)
+            finally:
+                self._reloading.discard(path)
+
+        threading.Thread(target=_reload, name="model-reload", daemon=True).start()
+
+registry = ModelRegistry()
+
+def get_model(path=MODEL_PATH):
+    """Shared model for path (defaults to poster-/best.pt)"""
+    return registry.get(path)
+
+if __name__ == "__main__":
+    import sys
+
+    path = sys.argv[1] if len(sys.argv) > 1 else MODEL_PATH
+    loaded = registry.get(path)
+    if loaded is None:
+        print("✗ Model not available")
+    else:
+        print(f"Serving version: {loaded.version}")
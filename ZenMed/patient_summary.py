@@ -0,0 +1,197 @@
+"""
+Precomputed Patient Summaries for the ZenMed Doctor Portal
+Every exercise / posture write folds into a per-day activity row and
+refreshes that patient's summary (last active, 7-day minutes, 7-day
+average posture score). The portal pages through the summary table by
+index, keyset-style (after / before the last row seen), so a page view
+never aggregates exercise_logs or skips over earlier pages.
+"""
+
+import json
+from datetime import date, timedelta
+
+WINDOW_DAYS = 7
+PAGE_SIZE = 25
+
+_refreshed_on = None
+
+# ?sort= value -> (column, default direction)
+SORT_COLUMNS = {
+    'name': ('name', 'ASC'),
+    'last_active': ('last_active', 'DESC'),
+    'minutes': ('minutes_7d', 'DESC'),
+    'score': ('avg_score_7d', 'DESC'),
+}
+
+def _window_start(today):
+    return (today - timedelta(days=WINDOW_DAYS - 1)).isoformat()
+
+def add_patient(conn, user_id, name):
+    """Empty summary row for a newly registered patient"""
+    conn.execute("INSERT OR IGNORE INTO patient_summary (user_id, name) VALUES (?, ?)", (user_id, name))
+
+def record_activity(conn, rows, today=None):
+    """
+    Fold exercise log rows into the daily activity table and refresh the affected summaries
+    rows: iterable of (user_id, date 'YYYY-MM-DD', minutes, posture_score or None)
+    Runs inside the caller's transaction.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    conn.executemany("""
+        INSERT INTO patient_daily_activity (user_id, date, minutes, sessions, score_sum, score_count)
+        VALUES (?, ?, ?, 1, ?, ?)
+        ON CONFLICT(user_id, date) DO UPDATE SET
+            minutes = minutes + excluded.minutes,
+            sessions = sessions + 1,
+            score_sum = score_sum + excluded.score_sum,
+            score_count = score_count + excluded.score_count
+    """, [(user_id, day, minutes or 0, score or 0, 0 if score is None else 1)
+          for user_id, day, minutes, score in rows])
+
+    refresh(conn, {row[0] for row in rows}, today)
+
+def refresh(conn, user_ids, today=None):
+    """Recompute the 7-day figures of some patients from at most 7 daily rows each"""
+    today = today or date.today()
+    conn.executemany("""
+        UPDATE patient_summary SET
+            last_active = (SELECT MAX(date) FROM patient_daily_activity WHERE user_id = :user_id),
+            minutes_7d = (SELECT COALESCE(SUM(minutes), 0) FROM patient_daily_activity
+                          WHERE user_id = :user_id AND date >= :start),
+            avg_score_7d = (SELECT CASE WHEN SUM(score_count) > 0
+                                        THEN ROUND(SUM(score_sum) / SUM(score_count), 1) END
+                            FROM patient_daily_activity WHERE user_id = :user_id AND date >= :start),
+            window_date = :today
+        WHERE user_id = :user_id
+    """, [{'user_id': user_id, 'start': _window_start(today), 'today': today.isoformat()}
+          for user_id in user_ids])
+
+def refresh_stale(conn, today=None):
+    """
+    Slide the 7-day window for patients with no new activity since an earlier day
+    Only rows that still hold non-zero 7-day figures can change, so this touches few rows.
+    Cheap to call per page view: after the first call of the day it returns at once.
+    """
+    global _refreshed_on
+    today = today or date.today()
+    if _refreshed_on == today:
+        return 0
+    stale = [row[0] for row in conn.execute("""
+        SELECT user_id FROM patient_summary
+        WHERE window_date < ? AND (minutes_7d > 0 OR avg_score_7d IS NOT NULL)
+    """, (today.isoformat(),))]
+    if stale:
+        refresh(conn, stale, today)
+        conn.commit()
+    _refreshed_on = today
+    return len(stale)
+
+def rebuild(conn, today=None):
+    """Recompute every daily row and summary from exercise_logs (migrations, repairs)"""
+    conn.execute("DELETE FROM patient_daily_activity")
+    conn.execute("""
+        INSERT INTO patient_daily_activity (user_id, date, minutes, sessions, score_sum, score_count)
+        SELECT user_id, date, COALESCE(SUM(duration), 0), COUNT(*),
+               COALESCE(SUM(posture_score), 0), COUNT(posture_score)
+        FROM exercise_logs
+        WHERE user_id IS NOT NULL AND date IS NOT NULL
+        GROUP BY user_id, date
+    """)
+    conn.execute("""
+        INSERT OR IGNORE INTO patient_summary (user_id, name)
+        SELECT id, name FROM users WHERE role = 'patient'
+    """)
+    refresh(conn, [row[0] for row in conn.execute("SELECT user_id FROM patient_summary")], today)
+
+def resolve_sort(sort, direction=None):
+    """Validated (sort key, 'asc' | 'desc'), falling back to the column's default direction"""
+    if sort not in SORT_COLUMNS:
+        sort = 'last_active'
+    direction = (direction or '').lower()
+    if direction not in ('asc', 'desc'):
+        direction = SORT_COLUMNS[sort][1].lower()
+    return sort, direction
+
+def encode_cursor(row, sort):
+    """Opaque ?after= / ?before= value for a patient row: its sort key and id"""
+    return json.dumps([row[SORT_COLUMNS[sort][0]], row['id']], separators=(',', ':'))
+
+def decode_cursor(text):
+    """(sort value, user_id) from encode_cursor, None when missing or malformed"""
+    try:
+        value, user_id = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    if isinstance(user_id, bool) or not isinstance(user_id, int):
+        return None
+    if value is not None and (isinstance(value, bool) or not isinstance(value, (str, int, float))):
+        return None
+    return value, user_id
+
+def _after(conn, column, direction, cursor, limit):
+    """
+    Up to limit rows strictly after cursor in (column, user_id) order
+    Every query is a range on idx_patient_summary_<column>. SQLite sorts NULLs
+    first ascending and last descending, and a row-value comparison never
+    matches NULL, so the NULL run is read as its own range.
+    """
+    op = '<' if direction == 'DESC' else '>'
+    nulls_first = direction == 'ASC'
+    if cursor is None:
+        ranges = [("", ())]
+    elif cursor[0] is None:
+        ranges = [(f"WHERE s.{column} IS NULL AND s.user_id {op} ?", (cursor[1],))]
+        if nulls_first:
+            ranges.append((f"WHERE s.{column} IS NOT NULL", ()))
+    else:
+        ranges = [(f"WHERE (s.{column}, s.user_id) {op} (?, ?)", cursor)]
+        if not nulls_first:
+            ranges.append((f"WHERE s.{column} IS NULL", ()))
+
+    rows = []
+    for where, params in ranges:
+        rows += conn.execute(f"""
+            SELECT s.user_id AS id, s.name, u.email, u.language, s.last_active,
+                   s.minutes_7d, s.avg_score_7d
+            FROM patient_summary s
+            JOIN users u ON u.id = s.user_id
+            {where}
+            ORDER BY s.{column} {direction}, s.user_id {direction}
+            LIMIT ?
+        """, (*params, limit - len(rows))).fetchall()
+        if len(rows) >= limit:
+            break
+    return rows
+
+def page(conn, sort='last_active', direction=None, after=None, before=None, page_size=PAGE_SIZE):
+    """
+    One page of the patient list, keyset-paginated so deep pages cost the same as the first
+    after / before: a cursor (decode_cursor) of the row the page follows / precedes
+    Returns: (rows, total patients, cursor of the previous page or None, of the next page or None)
+    """
+    sort, direction = resolve_sort(sort, direction)
+    column = SORT_COLUMNS[sort][0]
+    direction = direction.upper()
+
+    total = conn.execute("SELECT COUNT(*) FROM patient_summary").fetchone()[0]
+    if before is not None:
+        # Walk backwards from the cursor, then put the rows back in page order
+        reverse = 'ASC' if direction == 'DESC' else 'DESC'
+        rows = _after(conn, column, reverse, before, page_size + 1)
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        if not has_previous:
+            # Reached the start - show a full first page
+            return page(conn, sort, direction, page_size=page_size)
+        has_next = True
+    else:
+        rows = _after(conn, column, direction, after, page_size + 1)
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = after is not None
+
+    previous_cursor = encode_cursor(rows[0], sort) if rows and has_previous else None
+    next_cursor = encode_cursor(rows[-1], sort) if rows and has_next else None
+    return rows, total, previous_cursor, next_cursor
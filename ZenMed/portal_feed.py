@@ -0,0 +1,57 @@
+"""
+Live Doctor Portal Feed for ZenMed
+After a write commits, new alerts and the changed patient summary rows
+are published to open doctor portals (GET /doctor_portal/stream), which
+patch the page in place instead of reloading it. Nothing is read or
+published while no portal is open.
+"""
+
+from pubsub import hub
+
+TOPIC = 'doctor_portal'
+
+def watching():
+    return hub.has_subscribers(TOPIC)
+
+def publish(conn, alerts=(), user_ids=()):
+    """
+    Push committed changes to open portals
+    alerts: (patient_id, type, message) rows just inserted
+    user_ids: patients whose summary changed
+    Never raises - a failed push must not fail the write that caused it
+    """
+    if not watching() or not (alerts or user_ids):
+        return
+    try:
+        if alerts:
+            names = _names(conn, {alert[0] for alert in alerts})
+            created_at = conn.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0]
+            for patient_id, alert_type, message in alerts:
+                hub.publish(TOPIC, 'alert', {
+                    'patient_id': patient_id,
+                    'name': names.get(patient_id, ''),
+                    'type': alert_type,
+                    'message': message,
+                    'created_at': created_at,
+                })
+        for row in _summaries(conn, set(user_ids)):
+            hub.publish(TOPIC, 'patient', dict(row))
+    except Exception as e:
+        print(f"✗ Doctor portal push failed: {e}")
+
+def _placeholders(values):
+    return ",".join("?" * len(values))
+
+def _names(conn, user_ids):
+    user_ids = list(user_ids)
+    return {row[0]: row[1] for row in conn.execute(
+        f"SELECT id, name FROM users WHERE id IN ({_placeholders(user_ids)})", user_ids)}
+
+def _summaries(conn, user_ids):
+    if not user_ids:
+        return []
+    user_ids = list(user_ids)
+    return conn.execute(f"""
+        SELECT user_id AS id, name, last_active, minutes_7d, avg_score_7d
+        FROM patient_summary WHERE user_id IN ({_placeholders(user_ids)})
+    """, user_ids).fetchall()
@@ -0,0 +1,110 @@
+"""
+Dynamic Request Batching for ZenMed Pose Inference
+Gathers frames from concurrent requests over a short window
+and runs them through the pose model in a single batched call
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Batching window - how long the first frame waits for company
+BATCH_WINDOW_MS = float(os.environ.get("ZENMED_BATCH_WINDOW_MS", "10"))
+MAX_BATCH_SIZE = int(os.environ.get("ZENMED_MAX_BATCH_SIZE", "8"))
+
+def gather(source, max_batch, window_s):
+    """
+    Block for the first item, then keep collecting until the
+    window closes or the batch is full. Items already waiting
+    are always drained, so a backlog never waits on the timer.
+    Works with queue.Queue and multiprocessing queues.
+    """
+    batch = [source.get()]
+    deadline = time.perf_counter() + window_s
+
+    while len(batch) < max_batch:
+        remaining = deadline - time.perf_counter()
+        try:
+            if remaining > 0:
+                item = source.get(timeout=remaining)
+            else:
+                item = source.get_nowait()
+        except queue.Empty:
+            break
+        batch.append(item)
+
+    return batch
+
+class PoseBatcher:
+    """
+    Collects frames submitted from request threads and hands each
+    caller its own (annotated, keypoints, keypoints_conf, quality, model_version, box)
+    """
+
+    def __init__(self, infer_fn, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH_SIZE):
+        self.infer_fn = infer_fn
+        self.window_s = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches_run = 0
+        self.frames_run = 0
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="pose-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, frame, render=True, roi=None):
+        """Queue a frame (optionally only its roi) for the next batch, returns a Future"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((frame, render, roi, future))
+        return future
+
+    def detect(self, frame, render=True, roi=None, timeout=None):
+        """Blocking helper: submit a frame and wait for its result"""
+        return self.submit(frame, render=render, roi=roi).result(timeout=timeout)
+
+    def average_batch_size(self):
+        return self.frames_run / self.batches_run if self.batches_run else 0.0
+
+    def _run(self):
+        while True:
+            batch = gather(self._queue, self.max_batch, self.window_s)
+            frames = [frame for frame, _, _, _ in batch]
+            renders = [render for _, render, _, _ in batch]
+            rois = [roi for _, _, roi, _ in batch]
+
+            try:
+                outputs = self.infer_fn(frames, render=renders, rois=rois)
+            except Exception as e:
+                print(f"Error in batched detection: {e}")
+                for _, _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches_run += 1
+            self.frames_run += len(batch)
+
+            for (_, _, _, future), output in zip(batch, outputs):
+                future.set_result(output)
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_batcher():
+    """Shared batcher over advanced_pose_detector.infer_poses"""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                from advanced_pose_detector import infer_poses
+                _batcher = PoseBatcher(infer_poses)
+    return _batcher
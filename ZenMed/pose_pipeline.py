@@ -0,0 +1,72 @@
+"""
+Pose Frame Pipeline for ZenMed
+Shared by /frame_detect and /ws/posture: inference (batched inline or
+on the worker pool), form analysis and per-patient temporal tracking
+"""
+
+from inference_pool import get_pool
+from pose_batcher import get_batcher
+from pose_tracker import trackers
+from keyframe_scheduler import schedulers
+from pose_roi import regions
+from posture_sessions import sessions
+from metrics import invalid_frames
+
+def process_pose_frame(frame, render=True, user_id=None, session_id=None):
+    """
+    frame: encoded image bytes, or an already decoded BGR frame (inline mode)
+    user_id: when given, the frame also updates that patient's PoseTracker, the model
+             only looks at the region around the patient's last detection and,
+             running inline, only runs on that stream's keyframes
+    session_id: an open posture session of user_id that this frame's form score is added to
+    Returns: response fields, or {'error': ...} for an undecodable frame
+    Raises: InferenceBusy when the worker pool queue is full
+    """
+    # Crop around the patient's last detection when there is one
+    region = regions.get(user_id) if user_id is not None else None
+    roi = region.next_roi() if region is not None else None
+
+    pool = get_pool()
+    if pool is not None:
+        result = pool.run('pose', frame, render=render, roi=roi)
+        keypoints = result.pop('_keypoints', None)
+        keypoints_conf = result.pop('_keypoints_conf', None)
+        box = result.pop('_box', None)
+        if 'error' in result:
+            invalid_frames.inc('pose')
+        elif region is not None:
+            region.update(box, roi)
+    else:
+        from advanced_pose_detector import decode_frame, frame_feedback
+
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            frame = decode_frame(frame)
+        if frame is None:
+            invalid_frames.inc('pose')
+            return {'error': 'Invalid frame'}
+
+        # Batched with frames from other concurrent requests
+        detect = lambda f: get_batcher().detect(f, render=render, roi=roi)
+        if user_id is None:
+            annotated, keypoints, keypoints_conf, _, model_version, _ = detect(frame)
+        else:
+            annotated, keypoints, keypoints_conf, _, model_version, box, keyframe = \
+                schedulers.get(user_id).step(frame, detect, render=render)
+            if keyframe:
+                region.update(box, roi)
+        result = frame_feedback(annotated, keypoints, model_version, keypoints_conf, render=render)
+        if user_id is not None:
+            result['keyframe'] = keyframe
+
+    if 'error' in result or user_id is None:
+        return result
+
+    # Stable label and rep count from the patient's recent frames
+    state = trackers.get(user_id).update(keypoints, keypoints_conf)
+    result.update(state)
+
+    if session_id is not None and 'form_score' in result:
+        session = sessions.frame(session_id, user_id, result['form_score'], state['total_reps'])
+        if session is not None:
+            result['session'] = session.running()
+    return result
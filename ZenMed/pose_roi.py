@@ -0,0 +1,84 @@
+"""
+Region-of-Interest Inference for ZenMed Pose Streams
+Once a patient is found, later frames only send a crop around the last
+person box (plus a margin) to the model, at a smaller input size.
+A weak or missing detection falls back to the full frame.
+"""
+
+import os
+
+from pose_tracker import TrackerStore
+
+ROI_ENABLED = os.environ.get('ZENMED_ROI', '1') != '0'
+# Model input size for crops - full frames keep the model's default (640)
+ROI_IMGSZ = int(os.environ.get('ZENMED_ROI_IMGSZ', '320'))
+# Extra space around the last box, as a fraction of its size on each side
+ROI_MARGIN = float(os.environ.get('ZENMED_ROI_MARGIN', '0.25'))
+# Person confidence below which the next frame is run in full
+ROI_MIN_CONF = float(os.environ.get('ZENMED_ROI_MIN_CONF', '0.6'))
+# Run a full frame at least this often, so someone stepping into view is found
+ROI_REFRESH_FRAMES = int(os.environ.get('ZENMED_ROI_REFRESH_FRAMES', '30'))
+
+MIN_ROI_SIDE = 32
+
+def expand_box(box, margin=ROI_MARGIN):
+    """Grow an (x1, y1, x2, y2) box by margin of its width/height on every side"""
+    x1, y1, x2, y2 = box[:4]
+    dx = (x2 - x1) * margin
+    dy = (y2 - y1) * margin
+    return (x1 - dx, y1 - dy, x2 + dx, y2 + dy)
+
+def clip_roi(roi, frame_shape):
+    """
+    Integer crop inside the frame for an roi, or None when it is
+    too small to be worth cropping (the full frame is used instead)
+    """
+    if roi is None:
+        return None
+    height, width = frame_shape[:2]
+    x1, y1, x2, y2 = roi
+    x1, y1 = max(0, int(x1)), max(0, int(y1))
+    x2, y2 = min(width, int(round(x2))), min(height, int(round(y2)))
+    if x2 - x1 < MIN_ROI_SIDE or y2 - y1 < MIN_ROI_SIDE:
+        return None
+    return x1, y1, x2, y2
+
+class RoiTracker:
+    """Per-stream choice between a crop around the last person and the full frame"""
+
+    def __init__(self, margin=ROI_MARGIN, min_conf=ROI_MIN_CONF, refresh_frames=ROI_REFRESH_FRAMES,
+                 enabled=ROI_ENABLED):
+        self.margin = margin
+        self.min_conf = min_conf
+        self.refresh_frames = refresh_frames
+        self.enabled = enabled
+        self.box = None
+        self.roi_frames = 0
+        self.full_frames = 0
+        self._since_full = 0
+
+    def next_roi(self):
+        """Region for the next model run, None for the full frame"""
+        if not self.enabled or self.box is None or self._since_full >= self.refresh_frames:
+            return None
+        return expand_box(self.box, self.margin)
+
+    def update(self, box, roi=None):
+        """
+        Record the result of a model run
+        box: [x1, y1, x2, y2, conf] of the person in frame coordinates, or None
+        roi: the region that run used (None for a full frame)
+        """
+        if roi is None:
+            self.full_frames += 1
+            self._since_full = 0
+        else:
+            self.roi_frames += 1
+            self._since_full += 1
+
+        if box is None or box[4] < self.min_conf:
+            self.box = None
+        else:
+            self.box = tuple(box[:4])
+
+regions = TrackerStore(RoiTracker)
@@ -0,0 +1,203 @@
+"""
+Temporal Pose Tracker for ZenMed
+Per-session keypoint/angle smoothing, squat and lunge rep counting
+and stable exercise labels - constant time and memory per frame
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from joint_angles import joint_angles, ANGLE_INDEX, ANGLE_NAMES
+
+LEFT_KNEE_ANGLE = ANGLE_INDEX['left_knee']
+RIGHT_KNEE_ANGLE = ANGLE_INDEX['right_knee']
+
+class RollingMean:
+    """Mean of the last `size` values, kept in a fixed circular buffer"""
+
+    def __init__(self, size):
+        self._values = np.zeros(size)
+        self._index = 0
+        self._count = 0
+        self._sum = 0.0
+
+    def push(self, value):
+        """Add a value, returns the current mean"""
+        value = float(value)
+        if self._count == len(self._values):
+            self._sum -= self._values[self._index]
+        else:
+            self._count += 1
+        self._values[self._index] = value
+        self._sum += value
+        self._index = (self._index + 1) % len(self._values)
+        return self.mean()
+
+    def mean(self):
+        return self._sum / self._count if self._count else 0.0
+
+    def __len__(self):
+        return self._count
+
+    def copy(self):
+        other = RollingMean(len(self._values))
+        other._values[:] = self._values
+        other._index, other._count, other._sum = self._index, self._count, self._sum
+        return other
+
+class RepCounter:
+    """
+    Hysteresis state machine on a knee angle: going below down_angle
+    enters DOWN, coming back above up_angle completes one rep.
+    The gap between the thresholds stops jitter from double counting.
+    """
+
+    def __init__(self, down_angle=100, up_angle=160):
+        self.down_angle = down_angle
+        self.up_angle = up_angle
+        self.stage = "UP"
+        self.reps = 0
+
+    def update(self, angle):
+        """Returns True when this angle completes a rep"""
+        if np.isnan(angle):
+            return False
+        if self.stage == "UP" and angle < self.down_angle:
+            self.stage = "DOWN"
+        elif self.stage == "DOWN" and angle > self.up_angle:
+            self.stage = "UP"
+            self.reps += 1
+            return True
+        return False
+
+class PoseTracker:
+    """
+    Smooths one patient's pose stream and counts reps
+    alpha: exponential smoothing weight of the newest frame
+    label_hold: frames a new exercise label must persist before it is reported
+    """
+
+    def __init__(self, alpha=0.5, label_hold=5, min_conf=0.5, lunge_asymmetry=40):
+        self.alpha = alpha
+        self.label_hold = label_hold
+        self.min_conf = min_conf
+        self.lunge_asymmetry = lunge_asymmetry
+
+        self.keypoints = None
+        self.angles = np.full(len(ANGLE_NAMES), np.nan)
+
+        self.rep_counter = RepCounter()
+        self.reps = {"Squat": 0, "Lunge": 0}
+        self._bottom_asymmetry = 0.0
+
+        self.exercise = "Unknown"
+        self._candidate = "Unknown"
+        self._candidate_frames = 0
+
+        self.frames = 0
+        self.last_update = time.time()
+
+    def update(self, keypoints, confidences=None):
+        """Feed one frame's keypoints (17 x 2, or None when nobody was detected)"""
+        self.frames += 1
+        self.last_update = time.time()
+
+        if keypoints is not None and len(keypoints) >= 17:
+            self._smooth_keypoints(np.asarray(keypoints, dtype=np.float64)[:, :2], confidences)
+
+            angles = joint_angles(self.keypoints)[0]
+            fresh = ~np.isnan(angles)
+            self.angles[fresh] = np.where(np.isnan(self.angles[fresh]), angles[fresh],
+                                          self.alpha * angles[fresh] + (1 - self.alpha) * self.angles[fresh])
+
+            self._count_reps()
+            self._update_label(self._frame_label())
+        else:
+            self._update_label("Unknown")
+
+        return self.state()
+
+    def _smooth_keypoints(self, keypoints, confidences):
+        if self.keypoints is None:
+            self.keypoints = keypoints.copy()
+            return
+        if confidences is None:
+            visible = np.ones(len(keypoints), dtype=bool)
+        else:
+            visible = np.asarray(confidences) >= self.min_conf
+        # Hidden joints keep their last smoothed position
+        self.keypoints[visible] = self.alpha * keypoints[visible] + (1 - self.alpha) * self.keypoints[visible]
+
+    def _count_reps(self):
+        left = self.angles[LEFT_KNEE_ANGLE]
+        right = self.angles[RIGHT_KNEE_ANGLE]
+        avg_knee_angle = (left + right) / 2
+
+        if self.rep_counter.stage == "DOWN":
+            self._bottom_asymmetry = max(self._bottom_asymmetry, abs(left - right))
+        if self.rep_counter.update(avg_knee_angle):
+            # Uneven knees at the bottom of the rep means a lunge
+            kind = "Lunge" if self._bottom_asymmetry > self.lunge_asymmetry else "Squat"
+            self.reps[kind] += 1
+            self._bottom_asymmetry = 0.0
+
+    def _frame_label(self):
+        left = self.angles[LEFT_KNEE_ANGLE]
+        right = self.angles[RIGHT_KNEE_ANGLE]
+        avg_knee_angle = (left + right) / 2
+
+        if self.rep_counter.stage == "DOWN" or 70 <= avg_knee_angle <= 150:
+            return "Lunge" if abs(left - right) > self.lunge_asymmetry else "Squat"
+        if avg_knee_angle > 160:
+            return "Standing"
+        return "Exercise"
+
+    def _update_label(self, label):
+        if label == self._candidate:
+            self._candidate_frames += 1
+        else:
+            self._candidate = label
+            self._candidate_frames = 1
+        if self._candidate_frames >= self.label_hold or self.exercise == "Unknown":
+            self.exercise = self._candidate
+
+    def state(self):
+        """Compact view for API responses"""
+        return {
+            'exercise': self.exercise,
+            'reps': dict(self.reps),
+            'total_reps': self.reps["Squat"] + self.reps["Lunge"],
+            'stage': self.rep_counter.stage,
+            'angles': {name: round(float(angle), 1)
+                       for name, angle in zip(ANGLE_NAMES, self.angles) if not np.isnan(angle)},
+        }
+
+class TrackerStore:
+    """Bounded per-user state objects, least recently used evicted first"""
+
+    def __init__(self, factory=PoseTracker, max_trackers=1024):
+        self.factory = factory
+        self.max_trackers = max_trackers
+        self._trackers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            tracker = self._trackers.get(key)
+            if tracker is None:
+                tracker = self.factory()
+                self._trackers[key] = tracker
+                if len(self._trackers) > self.max_trackers:
+                    self._trackers.popitem(last=False)
+            else:
+                self._trackers.move_to_end(key)
+            return tracker
+
+    def reset(self, key):
+        with self._lock:
+            self._trackers.pop(key, None)
+
+trackers = TrackerStore()
@@ -1,29 +1,29 @@
-import cv2
-
-cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-
-if not cap.isOpened():
-    print("Camera not accessible")
-    exit()
-
-print("Press 'q' to exit")
-
-while True:
-    ret, frame = cap.read()
-
-    if not ret:
-        print("Failed to grab frame")
-        break
-
-    frame = cv2.flip(frame, 1)
-
-    cv2.imshow("Test Camera", frame)
-
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-cap.release()
+import cv2
+
+cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
+
+cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+
+if not cap.isOpened():
+    print("Camera not accessible")
+    exit()
+
+print("Press 'q' to exit")
+
+while True:
+    ret, frame = cap.read()
+
+    if not ret:
+        print("Failed to grab frame")
+        break
+
+    frame = cv2.flip(frame, 1)
+
+    cv2.imshow("Test Camera", frame)
+
+    if cv2.waitKey(1) & 0xFF == ord('q'):
+        break
+
+cap.release()
 cv2.destroyAllWindows()
\ No newline at end of file
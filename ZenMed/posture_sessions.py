@@ -0,0 +1,278 @@
+"""
+Server-Side Posture Sessions for ZenMed
+A session collects the form_score of every frame the server analyses
+(/frame_detect, /ws/posture) between start and end. Statistics are
+streamed - Welford mean / variance, min / max, a 10-point histogram,
+time in good form and reps - so a session is a few numbers however long
+it runs. The summary is written once, when the session ends; sessions
+abandoned for ZENMED_SESSION_TTL_S are ended and written as timeouts by
+a background sweep.
+"""
+
+import json
+import math
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import storage
+from ingest import clean_exercise_name
+import patient_summary
+import alert_rules
+import exercise_rollups
+
+# form_score at or above this counts as good form
+GOOD_FORM_SCORE = int(os.environ.get('ZENMED_GOOD_FORM_SCORE', '80'))
+SESSION_TTL_S = float(os.environ.get('ZENMED_SESSION_TTL_S', '600'))
+# How often abandoned sessions are looked for
+SWEEP_INTERVAL_S = float(os.environ.get('ZENMED_SESSION_SWEEP_S', '60'))
+MAX_SESSIONS = int(os.environ.get('ZENMED_MAX_SESSIONS', '1024'))
+# Longer gaps between frames (paused camera, lost connection) are not counted as exercise time
+MAX_FRAME_GAP_S = float(os.environ.get('ZENMED_SESSION_MAX_GAP_S', '2'))
+
+HISTOGRAM_WIDTH = 10
+HISTOGRAM_BUCKETS = 100 // HISTOGRAM_WIDTH
+
+class ScoreStats:
+    """Running statistics of a score stream in constant memory"""
+
+    __slots__ = ("count", "mean", "_m2", "min", "max", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+        self.histogram = [0] * HISTOGRAM_BUCKETS
+
+    def add(self, score):
+        score = float(score)
+        # Welford's update - numerically stable, no stored samples
+        self.count += 1
+        delta = score - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (score - self.mean)
+
+        self.min = score if self.min is None else min(self.min, score)
+        self.max = score if self.max is None else max(self.max, score)
+        bucket = min(HISTOGRAM_BUCKETS - 1, max(0, int(score // HISTOGRAM_WIDTH)))
+        self.histogram[bucket] += 1
+
+    @property
+    def variance(self):
+        """Population variance, 0 below two samples"""
+        return self._m2 / self.count if self.count > 1 else 0.0
+
+    @property
+    def stddev(self):
+        return math.sqrt(self.variance)
+
+class PostureSession:
+    """One patient's exercise session"""
+
+    __slots__ = ("session_id", "user_id", "exercise", "started_at", "last_seen",
+                 "_last_frame_at", "stats", "active_seconds", "good_form_seconds", "reps")
+
+    def __init__(self, session_id, user_id, exercise, now):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.exercise = exercise
+        self.started_at = now
+        self.last_seen = now
+        self._last_frame_at = None
+        self.stats = ScoreStats()
+        self.active_seconds = 0.0
+        self.good_form_seconds = 0.0
+        self.reps = 0
+
+    def add_frame(self, score, reps=None, now=None):
+        now = time.time() if now is None else now
+        if self._last_frame_at is not None:
+            elapsed = min(max(0.0, now - self._last_frame_at), MAX_FRAME_GAP_S)
+            self.active_seconds += elapsed
+            if score >= GOOD_FORM_SCORE:
+                self.good_form_seconds += elapsed
+        self._last_frame_at = now
+        self.last_seen = now
+
+        self.stats.add(score)
+        if reps is not None:
+            self.reps = max(self.reps, reps)
+
+    def running(self):
+        """Small live view included with every frame result"""
+        return {
+            'session_id': self.session_id,
+            'frames': self.stats.count,
+            'avg_score': round(self.stats.mean, 1),
+            'good_form_seconds': round(self.good_form_seconds, 1),
+        }
+
+    def summary(self, ended_at=None, reason='completed'):
+        stats = self.stats
+        ended_at = self.last_seen if ended_at is None else ended_at
+        return {
+            'session_id': self.session_id,
+            'exercise': self.exercise,
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds'),
+            'ended_at': datetime.fromtimestamp(ended_at).isoformat(timespec='seconds'),
+            'ended_by': reason,
+            'frames': stats.count,
+            'avg_score': round(stats.mean, 1) if stats.count else None,
+            'stddev': round(stats.stddev, 1) if stats.count else None,
+            'min_score': stats.min,
+            'max_score': stats.max,
+            'histogram': list(stats.histogram),
+            'active_seconds': round(self.active_seconds, 1),
+            'good_form_seconds': round(self.good_form_seconds, 1),
+            'good_form_pct': round(100 * self.good_form_seconds / self.active_seconds, 1)
+                             if self.active_seconds else None,
+            'reps': self.reps,
+        }
+
+class SessionStore:
+    """
+    Open sessions, least recently active first
+    Expired sessions are evicted oldest first - by a sweeper thread started with
+    the first session, and as a side effect of every call - and handed to
+    on_evict outside the lock
+    """
+
+    def __init__(self, ttl_s=SESSION_TTL_S, max_sessions=MAX_SESSIONS, on_evict=None,
+                 sweep_interval_s=SWEEP_INTERVAL_S):
+        self.ttl_s = ttl_s
+        self.max_sessions = max_sessions
+        self.on_evict = on_evict
+        self.sweep_interval_s = sweep_interval_s
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def start(self, user_id, exercise='General', now=None):
+        now = time.time() if now is None else now
+        self._start_sweeper()
+        session = PostureSession(secrets.token_urlsafe(12), user_id, clean_exercise_name(exercise), now)
+        with self._lock:
+            evicted = self._expire(now)
+            self._sessions[session.session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                evicted.append(self._sessions.popitem(last=False)[1])
+        self._evicted(evicted)
+        return session
+
+    def frame(self, session_id, user_id, score, reps=None, now=None):
+        """Add one frame's score, returns the session or None if it is unknown / not this user's"""
+        now = time.time() if now is None else now
+        with self._lock:
+            evicted = self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is not None and session.user_id == user_id:
+                session.add_frame(score, reps, now)
+                self._sessions.move_to_end(session_id)
+            else:
+                session = None
+        self._evicted(evicted)
+        return session
+
+    def end(self, session_id, user_id, now=None):
+        """Close a session, returns it (or None) - the caller persists the summary"""
+        now = time.time() if now is None else now
+        with self._lock:
+            evicted = self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is not None and session.user_id == user_id:
+                del self._sessions[session_id]
+                session.last_seen = now
+            else:
+                session = None
+        self._evicted(evicted)
+        return session
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def sweep(self, now=None):
+        """End every expired session now, returns how many"""
+        now = time.time() if now is None else now
+        with self._lock:
+            evicted = self._expire(now)
+        self._evicted(evicted)
+        return len(evicted)
+
+    def _start_sweeper(self):
+        if self._sweeper is not None or self.sweep_interval_s <= 0:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name="posture-session-sweeper",
+                                                 daemon=True)
+                self._sweeper.start()
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval_s)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"✗ Posture session sweep failed: {e}")
+
+    def _expire(self, now):
+        evicted = []
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_seen < self.ttl_s:
+                break
+            evicted.append(self._sessions.popitem(last=False)[1])
+        return evicted
+
+    def _evicted(self, evicted):
+        if self.on_evict is None:
+            return
+        for session in evicted:
+            try:
+                self.on_evict(session)
+            except Exception as e:
+                print(f"✗ Could not save abandoned session {session.session_id}: {e}")
+
+def persist(conn, session, reason='completed'):
+    """
+    Write a finished session - its summary row, the matching exercise log, the
+    patient summary update and any alerts - in one transaction, and push the
+    changes to open doctor portals
+    Returns: the summary dict
+    """
+    summary = session.summary(reason=reason)
+    day = summary['started_at'][:10]
+    score = int(round(session.stats.mean)) if session.stats.count else None
+    minutes = int(math.ceil(session.active_seconds / 60))
+
+    conn.execute("""
+        INSERT INTO posture_sessions (session_id, user_id, exercise, started_at, ended_at, ended_by,
+                                      frames, avg_score, stddev, min_score, max_score, histogram,
+                                      active_seconds, good_form_seconds, reps)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (summary['session_id'], session.user_id, summary['exercise'], summary['started_at'],
+          summary['ended_at'], reason, summary['frames'], summary['avg_score'], summary['stddev'],
+          summary['min_score'], summary['max_score'], json.dumps(summary['histogram']),
+          summary['active_seconds'], summary['good_form_seconds'], summary['reps']))
+    conn.execute("INSERT INTO exercise_logs (user_id, exercise_name, duration, date, posture_score) "
+                 "VALUES (?, ?, ?, ?, ?)", (session.user_id, summary['exercise'], minutes, day, score))
+    activity = [(session.user_id, day, minutes, score)]
+    patient_summary.record_activity(conn, activity)
+    exercise_rollups.record(conn, [(session.user_id, day, summary['exercise'], minutes, score)])
+    alert_rules.commit(conn, alert_rules.record_activity(conn, activity), [session.user_id])
+    return summary
+
+def _persist_abandoned(session):
+    # Nothing was analysed - nothing worth keeping
+    if session.stats.count == 0:
+        return
+    with storage.connection() as conn:
+        persist(conn, session, reason='timeout')
+
+sessions = SessionStore(on_evict=_persist_abandoned)
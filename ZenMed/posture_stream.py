@@ -0,0 +1,167 @@
+"""
+Persistent WebSocket Streaming for ZenMed Posture Sessions
+The browser keeps one connection open for the whole session, pushes
+binary JPEG frames and receives compact results (JSON or msgpack).
+Receiving/decoding runs on its own thread so it overlaps inference,
+and only the newest frame is kept, so a slow frame never queues others.
+
+Protocol on /ws/posture:
+  client -> server  binary message: one JPEG frame
+  client -> server  text message:   {"type": "config", "mode": "keypoints" | "frame",
+                                     "format": "json" | "msgpack",
+                                     "session": posture session id from /posture_session/start}
+  server -> client  one result per processed frame, same fields as /frame_detect
+                    plus "seq" (frame number on this connection) and "dropped"
+"""
+
+import json
+import threading
+
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from flask import session
+
+from inference_pool import get_pool, InferenceBusy
+from pose_pipeline import process_pose_frame
+import metrics
+
+class PostureStream:
+    """One patient's streaming connection"""
+
+    def __init__(self, ws, user_id):
+        self.ws = ws
+        self.user_id = user_id
+        self.render = False
+        self.use_msgpack = False
+        self.session_id = None
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+        self._latest = None
+        self._closed = False
+        self._ready = threading.Condition()
+        self._send_lock = threading.Lock()
+        self._pool = get_pool()
+
+    def run(self):
+        """Process the newest frame until the client disconnects"""
+        reader = threading.Thread(target=self._read_loop, name="posture-stream-reader", daemon=True)
+        reader.start()
+
+        while True:
+            item = self._next_frame()
+            if item is None:
+                break
+            seq, frame = item
+            result = self._process(frame)
+            result['seq'] = seq
+            result['dropped'] = self.dropped
+            self.processed += 1
+            self._send(result)
+
+    def _read_loop(self):
+        """Receive (and, when running inline, decode) frames ahead of inference"""
+        try:
+            while not self._closed:
+                message = self.ws.receive()
+                if message is None:
+                    continue
+                if isinstance(message, str):
+                    self._configure(message)
+                    continue
+
+                self.received += 1
+                frame = message
+                if self._pool is None:
+                    from advanced_pose_detector import decode_frame
+                    frame = decode_frame(message)
+
+                with self._ready:
+                    if self._latest is not None:
+                        # Newer frame arrived before the last one was processed
+                        self.dropped += 1
+                    self._latest = (self.received, frame)
+                    self._ready.notify()
+        except Exception:
+            pass
+        finally:
+            with self._ready:
+                self._closed = True
+                self._ready.notify()
+
+    def _next_frame(self):
+        with self._ready:
+            self._ready.wait_for(lambda: self._latest is not None or self._closed)
+            item, self._latest = self._latest, None
+            return item
+
+    def _process(self, frame):
+        metrics.frames.inc('ws_posture')
+        if frame is None:
+            metrics.invalid_frames.inc('pose')
+            return {'status': 'error', 'msg': 'Invalid frame'}
+
+        try:
+            with metrics.timed('ws_posture', 'total'):
+                result = process_pose_frame(frame, render=self.render, user_id=self.user_id,
+                                            session_id=self.session_id)
+        except InferenceBusy as e:
+            return {'status': 'busy', 'retry_after': e.retry_after}
+        except Exception as e:
+            metrics.errors.inc('ws_posture', 'request')
+            return {'status': 'error', 'msg': str(e)}
+
+        if 'error' in result:
+            return {'status': 'error', 'msg': result['error']}
+        return {'status': 'success', **result}
+
+    def _configure(self, message):
+        try:
+            config = json.loads(message)
+        except ValueError:
+            return
+        if config.get('type') != 'config':
+            return
+
+        if 'mode' in config:
+            self.render = config['mode'] == 'frame'
+        if 'format' in config:
+            self.use_msgpack = config['format'] == 'msgpack' and msgpack is not None
+        if 'session' in config:
+            self.session_id = config['session']
+
+        self._send({
+            'status': 'config',
+            'mode': 'frame' if self.render else 'keypoints',
+            'format': 'msgpack' if self.use_msgpack else 'json'
+        })
+
+    def _send(self, payload):
+        data = msgpack.packb(payload) if self.use_msgpack else json.dumps(payload)
+        with self._send_lock:
+            self.ws.send(data)
+
+def register_posture_stream(app):
+    """Add the /ws/posture route if flask-sock is installed"""
+    if Sock is None:
+        print("✗ flask-sock not installed - /ws/posture streaming disabled")
+        return None
+
+    sock = Sock(app)
+
+    @sock.route('/ws/posture')
+    def posture_stream(ws):
+        if 'user_id' not in session:
+            ws.close(reason=1008, message='Not authenticated')
+            return
+        PostureStream(ws, session['user_id']).run()
+
+    return sock
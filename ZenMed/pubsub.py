@@ -0,0 +1,119 @@
+"""
+In-Process Publish / Subscribe for ZenMed Server-Sent Events
+Publishers (reminder scheduler, alert rules, ...) post small JSON
+events to a topic; each open SSE connection holds a subscription with a
+bounded buffer, so a stalled browser loses its oldest events instead of
+growing memory or slowing the publisher.
+"""
+
+import json
+import os
+import threading
+from collections import deque
+
+SUBSCRIBER_BUFFER = int(os.environ.get('ZENMED_SSE_BUFFER', '100'))
+# Comment line sent when idle, keeps proxies from closing the connection
+HEARTBEAT_S = float(os.environ.get('ZENMED_SSE_HEARTBEAT_S', '15'))
+
+class Subscription:
+    """One subscriber's buffered events"""
+
+    def __init__(self, topics, buffer_size=SUBSCRIBER_BUFFER):
+        self.topics = tuple(topics)
+        self._events = deque(maxlen=buffer_size)
+        self._ready = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def push(self, event):
+        with self._ready:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(event)
+            self._ready.notify()
+
+    def get(self, timeout=HEARTBEAT_S):
+        """Wait for events, returns all buffered ones (empty list on timeout or close)"""
+        with self._ready:
+            self._ready.wait_for(lambda: self._events or self.closed, timeout)
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    def close(self):
+        with self._ready:
+            self.closed = True
+            self._ready.notify_all()
+
+class PubSub:
+    """Topic -> subscriptions; publishing never blocks on a subscriber"""
+
+    def __init__(self):
+        self._topics = {}
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, *topics, buffer_size=SUBSCRIBER_BUFFER):
+        subscription = Subscription(topics, buffer_size)
+        with self._lock:
+            for topic in topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[topic]
+
+    def publish(self, topic, event, data):
+        """Deliver to every current subscriber of topic, returns how many received it"""
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        message = (event, data)
+        for subscription in subscribers:
+            subscription.push(message)
+        self.published += 1
+        return len(subscribers)
+
+    def has_subscribers(self, topic):
+        with self._lock:
+            return bool(self._topics.get(topic))
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({subscription for subscribers in self._topics.values() for subscription in subscribers})
+
+hub = PubSub()
+
+def format_event(event, data):
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def event_stream(subscription, hello=None):
+    """
+    SSE body for a subscription - ends (and unsubscribes) when the client disconnects
+    hello: optional (event, data) sent first
+    """
+    try:
+        if hello is not None:
+            yield format_event(*hello)
+        # Tell EventSource how long to wait before reconnecting
+        yield "retry: 5000\n\n"
+        while not subscription.closed:
+            events = subscription.get()
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for event, data in events:
+                yield format_event(event, data)
+    finally:
+        hub.unsubscribe(subscription)
+
+def user_topic(user_id):
+    return f"user:{user_id}"
@@ -0,0 +1,163 @@
+"""
+Reminder Scheduler for ZenMed
+Active reminders are loaded once into a heap ordered by next fire time.
+One thread sleeps until the earliest is due, pushes it to the patient's
+open pages (pubsub -> GET /events) and schedules the next day's
+occurrence. Adding or deactivating a reminder updates the heap in
+O(log n); the reminders table is never polled.
+"""
+
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+
+import storage
+from pubsub import hub, user_topic
+
+def next_fire(time_of_day, after):
+    """
+    Epoch seconds of the next daily 'HH:MM' strictly after `after` (epoch seconds)
+    Returns None for an unparsable time
+    """
+    try:
+        hour, minute = (int(part) for part in str(time_of_day).split(':')[:2])
+        start = datetime.fromtimestamp(after)
+        fire = start.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    except ValueError:
+        return None
+    if fire.timestamp() <= after:
+        fire += timedelta(days=1)
+    return fire.timestamp()
+
+class ReminderScheduler:
+    """
+    Heap of (fire_at, reminder_id, version)
+    Reminders are replaced or removed by bumping / dropping their entry in
+    self._reminders - stale heap entries are skipped when they surface
+    """
+
+    def __init__(self, publish=hub.publish, clock=time.time):
+        self.publish = publish
+        self.clock = clock
+        self._heap = []
+        # reminder_id -> (version, user_id, title, time, type)
+        self._reminders = {}
+        self._version = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+        self.fired = 0
+        self._thread = None
+
+    def load(self, conn):
+        """Schedule every active reminder (one read at startup)"""
+        now = self.clock()
+        rows = conn.execute("SELECT id, user_id, title, time, type FROM reminders WHERE active = 1").fetchall()
+        with self._cond:
+            for row in rows:
+                entry = self._put(row['id'], row['user_id'], row['title'], row['time'], row['type'], now)
+                if entry is not None:
+                    self._heap.append(entry)
+            heapq.heapify(self._heap)
+            self._cond.notify()
+        return len(rows)
+
+    def add(self, reminder_id, user_id, title, time_of_day, reminder_type):
+        """Schedule a new (or changed) reminder"""
+        with self._cond:
+            entry = self._put(reminder_id, user_id, title, time_of_day, reminder_type, self.clock())
+            if entry is not None:
+                heapq.heappush(self._heap, entry)
+                # Wake the thread in case this is now the earliest reminder
+                self._cond.notify()
+
+    def remove(self, reminder_id):
+        """Stop firing a reminder - its heap entry is dropped lazily"""
+        with self._cond:
+            self._reminders.pop(reminder_id, None)
+
+    def _put(self, reminder_id, user_id, title, time_of_day, reminder_type, now):
+        fire_at = next_fire(time_of_day, now)
+        if fire_at is None:
+            self._reminders.pop(reminder_id, None)
+            return None
+        self._version += 1
+        self._reminders[reminder_id] = (self._version, user_id, title, time_of_day, reminder_type)
+        return (fire_at, reminder_id, self._version)
+
+    def __len__(self):
+        with self._cond:
+            return len(self._reminders)
+
+    def due(self, now=None):
+        """Pop every reminder due at `now`, rescheduling each for the next day; returns them"""
+        now = self.clock() if now is None else now
+        fired = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                fire_at, reminder_id, version = heapq.heappop(self._heap)
+                reminder = self._reminders.get(reminder_id)
+                if reminder is None or reminder[0] != version:
+                    continue
+                _, user_id, title, time_of_day, reminder_type = reminder
+                fired.append((reminder_id, user_id, title, time_of_day, reminder_type, fire_at))
+                # From now, not fire_at, so a stalled process does not replay missed days
+                heapq.heappush(self._heap, (next_fire(time_of_day, max(fire_at, now)), reminder_id, version))
+            # Deactivated reminders leave entries behind - rebuild once they dominate
+            if len(self._heap) > 2 * len(self._reminders) + 1024:
+                self._heap = [entry for entry in self._heap
+                              if self._reminders.get(entry[1], (None,))[0] == entry[2]]
+                heapq.heapify(self._heap)
+        return fired
+
+    def _deliver(self, fired):
+        for reminder_id, user_id, title, time_of_day, reminder_type, fire_at in fired:
+            self.publish(user_topic(user_id), 'reminder', {
+                'id': reminder_id,
+                'title': title,
+                'time': time_of_day,
+                'type': reminder_type,
+                'due_at': datetime.fromtimestamp(fire_at).isoformat(timespec='minutes'),
+            })
+        self.fired += len(fired)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="reminder-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                wait = self._heap[0][0] - self.clock() if self._heap else None
+                if wait is None or wait > 0:
+                    # Woken early by add(); re-check the heap top either way
+                    self._cond.wait(wait)
+                    continue
+            try:
+                self._deliver(self.due())
+            except Exception as e:
+                print(f"✗ Reminder delivery failed: {e}")
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Shared scheduler, loaded from the database and started on first use"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                scheduler = ReminderScheduler()
+                with storage.connection() as conn:
+                    count = scheduler.load(conn)
+                scheduler.start()
+                print(f"✓ Reminder scheduler started ({count} active reminders)")
+                _scheduler = scheduler
+    return _scheduler
@@ -0,0 +1,117 @@
+"""
+SQLite Storage Layer for ZenMed
+Connections are opened once, tuned, and reused from a small pool instead
+of reconnecting on every request. WAL journaling lets posture-score
+writes proceed while the dashboard and doctor portal are reading.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Resolved once, so the app finds the same file whatever the working directory
+DB_PATH = os.path.abspath(os.environ.get(
+    'ZENMED_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database.db')))
+
+POOL_SIZE = int(os.environ.get('ZENMED_DB_POOL_SIZE', '8'))
+# How long a writer waits for another writer's lock before "database is locked"
+BUSY_TIMEOUT_MS = int(os.environ.get('ZENMED_DB_BUSY_TIMEOUT_MS', '5000'))
+# Page cache per connection
+CACHE_SIZE_KB = int(os.environ.get('ZENMED_DB_CACHE_KB', '8192'))
+# Prepared statements kept per connection
+STATEMENT_CACHE_SIZE = int(os.environ.get('ZENMED_DB_STATEMENT_CACHE', '256'))
+
+def connect(path=DB_PATH):
+    """New connection with ZenMed's pragmas applied"""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000.0,
+                           cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode = WAL")
+    # WAL + NORMAL only syncs at checkpoints - safe against app crashes, not power loss mid-checkpoint
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+class ConnectionPool:
+    """
+    Up to `size` idle connections kept open for reuse
+    A connection belongs to one caller between acquire() and release()
+    """
+
+    def __init__(self, path=DB_PATH, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.opened += 1
+            return connect(self.path)
+
+    def release(self, conn):
+        # Never hand the next caller a half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Shared connection pool for DB_PATH"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+@contextmanager
+def connection():
+    """Pooled connection outside a request (startup, background threads, CLI)"""
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+def get_db():
+    """Connection for the current Flask app context, returned to the pool at teardown"""
+    from flask import g
+
+    conn = g.get('_zenmed_db')
+    if conn is None:
+        conn = g._zenmed_db = get_pool().acquire()
+    return conn
+
+def _release_db(exception=None):
+    from flask import g
+
+    conn = g.pop('_zenmed_db', None)
+    if conn is not None:
+        get_pool().release(conn)
+
+def init_app(app):
+    """Return each request's connection to the pool when its app context ends"""
+    app.teardown_appcontext(_release_db)
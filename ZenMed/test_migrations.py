@@ -0,0 +1,74 @@
+"""
+Index Checks for ZenMed's Hot Queries
+Migrates an empty temp database and asserts EXPLAIN QUERY PLAN serves
+every migrations.HOT_QUERIES entry from an index, never a table scan or
+a temp b-tree sort.
+
+Run:
+  python -m unittest test_migrations
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+import storage
+import migrations
+
+# Index (or primary key) each hot query must be served by
+EXPECTED_INDEX = {
+    'dashboard_exercises': 'idx_exercise_logs_user_date',
+    'dashboard_reminders': 'idx_reminders_user_active',
+    'doctor_portal_alerts': 'idx_alerts_unread_recent',
+    'doctor_portal_unread_count': 'idx_alerts_unread_recent',
+    'doctor_portal_patients': 'idx_patient_summary_minutes_7d',
+    'doctor_portal_stale_summaries': 'idx_patient_summary_window',
+    'alert_rules_last_alerts': 'idx_alerts_patient_type',
+    'alert_rules_inactive_patients': 'idx_patient_summary_last_active',
+    'glucose_raw_series': 'PRIMARY KEY',
+    'glucose_hourly_series': 'PRIMARY KEY',
+    'exercise_trend': 'PRIMARY KEY',
+    'nutrition_latest_plan': 'idx_diet_plans_user',
+}
+
+USES_INDEX = re.compile(r"USING (COVERING INDEX|INDEX|PRIMARY KEY|INTEGER PRIMARY KEY)")
+
+class HotQueryPlanTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.mkdtemp()
+        cls.conn = storage.connect(os.path.join(cls.tmp, 'test.db'))
+        migrations.migrate(cls.conn)
+        cls.plans = migrations.query_plans(cls.conn)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def test_schema_is_latest(self):
+        self.assertEqual(migrations.schema_version(self.conn), migrations.LATEST_VERSION)
+        self.assertEqual(migrations.migrate(self.conn), [])
+
+    def test_every_hot_query_is_checked(self):
+        self.assertEqual(set(self.plans), set(EXPECTED_INDEX))
+
+    def test_hot_queries_use_their_index(self):
+        for name, plan in self.plans.items():
+            with self.subTest(query=name):
+                self.assertTrue(plan, "empty plan")
+                self.assertTrue(any(EXPECTED_INDEX[name] in step for step in plan), plan)
+                for step in plan:
+                    self.assertNotIn("TEMP B-TREE", step)
+                    # Table reads only - subquery headers access nothing themselves
+                    if step.startswith(("SEARCH", "SCAN")):
+                        self.assertRegex(step, USES_INDEX)
+
+    def test_full_scans_reports_nothing(self):
+        self.assertEqual(migrations.full_scans(self.conn), {})
+
+if __name__ == "__main__":
+    unittest.main()